@@ -0,0 +1,81 @@
+""" Airtime and energy per measured minute of the batching mode against one uplink per wake-up (CPython) """
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'node'))
+import codec
+import airtime
+from batch import Batch
+from replay_events import synthetic_levels
+from bench_codec import interval_levels
+
+SFS = (7, 9, 12)                        # spreading factors of the report
+
+
+def time_on_air(payload, sf):
+    """ Time on air (s) of a LoRaWAN uplink at SF/125 kHz """
+    return airtime.time_on_air(payload + airtime.LORAWAN_OVERHEAD, sf) / 1000
+
+
+def uplink_energy(airtime, sf, args):
+    """ Energy (J) of one uplink: transmission, the two receive windows and the awake time waiting for them """
+    t_sym = (1 << sf) / 125000
+    rx = 2 * 8 * t_sym                  # each window stays open ~8 symbols without a downlink
+    wait = 2.0 - rx                     # RECEIVE_DELAY2
+    return args.voltage * (args.tx_ma * airtime + args.rx_ma * rx + args.idle_ma * wait) / 1000
+
+
+def batched_payloads(summaries, size, max_latency, cycle):
+    """ Returns the payload sizes sent by the node's Batch over the summaries """
+    batch = Batch(size, max_latency, key='bench')
+    sizes = []
+    for levels in summaries:
+        batch.add(levels, [], cycle)
+        if batch.due(cycle):
+            sizes.append(len(codec.encode(batch.levels())))
+            batch.reset()
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--hours', type=float, default=24.0, help='length of the synthetic trace')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--interval', type=float, default=10, help='measuring time per wake-up (s)')
+    parser.add_argument('--deepsleep', type=float, default=50, help='deepsleep time between wake-ups (s)')
+    parser.add_argument('--sizes', default='1,2,4,6,12,24', help='batch sizes to compare')
+    parser.add_argument('--max-latency', type=float, default=3600)
+    parser.add_argument('--voltage', type=float, default=3.7)
+    parser.add_argument('--tx-ma', type=float, default=120, help='current while transmitting (14 dBm)')
+    parser.add_argument('--rx-ma', type=float, default=15, help='current of an open receive window')
+    parser.add_argument('--idle-ma', type=float, default=40, help='current while waiting for the receive windows')
+    args = parser.parse_args()
+
+    levels, _ = synthetic_levels(args.hours, 2.0, args.seed)
+    summaries = interval_levels(levels, args.interval)
+    cycle = args.interval + args.deepsleep
+    minutes = len(summaries) * cycle / 60
+
+    print('%i wake-ups of %g s every %g s, uplink cost per measured minute' % (len(summaries), args.interval, cycle))
+    print('%5s %8s %8s' % ('batch', 'uplinks', 'bytes') + ''.join(' %6s ms %6s mJ' % ('SF%i' % sf, '') for sf in SFS))
+    results = {}
+    for size in [1] + [int(s) for s in args.sizes.split(',') if int(s) != 1]:
+        sizes = batched_payloads(summaries, size, args.max_latency, cycle)
+        row = '%5i %8i %8.1f' % (size, len(sizes), sum(sizes) / len(sizes))
+        for sf in SFS:
+            airtime = sum(time_on_air(s, sf) for s in sizes) / minutes
+            energy = sum(uplink_energy(time_on_air(s, sf), sf, args) for s in sizes) / minutes
+            results[size, sf] = (airtime, energy)
+            row += ' %9.1f %9.1f' % (1000 * airtime, 1000 * energy)
+        print(row)
+    size = max(s for s, _ in results)
+    for sf in SFS:
+        (a1, e1), (a, e) = results[1, sf], results[size, sf]
+        print('SF%i, batches of %i: %.0f%% less airtime, %.0f%% less uplink energy than one uplink per wake-up'
+            % (sf, size, 100 * (1 - a / a1), 100 * (1 - e / e1)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+""" Host benchmark of the node's payload codec: bytes per sample and encode/decode speed (CPython) """
+
+import argparse
+import math
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'node'))
+import codec
+from replay_events import synthetic_levels, trace_levels, BLOCK_S
+
+
+def interval_levels(levels, seconds):
+    """ Returns the (LAeq, LAmax, LAmin) of every interval of the 125 ms levels, as sent by the node """
+    n = max(1, int(seconds / BLOCK_S))
+    result = []
+    for i in range(0, len(levels) - n + 1, n):
+        block = levels[i:i + n]
+        energy = sum(10 ** (level / 10) for level in block) / n
+        result.append((10 * math.log10(energy), max(block), min(block)))
+    return result
+
+
+def raw_size(values):
+    """ Size of the values as 16-bit integers (0.1 dB) """
+    return len(struct.pack('>%iH' % len(values), *[int(v * codec.RESOLUTION + 0.5) for v in values]))
+
+
+def delta_size(values):
+    """ Size of plain delta coding: first value in 16 bits, then one signed byte per delta (3 bytes on overflow) """
+    size, prev = 2, None
+    for v in values:
+        value = int(v * codec.RESOLUTION + 0.5)
+        if prev is not None:
+            size += 1 if -128 < value - prev < 128 else 3
+        prev = value
+    return size
+
+
+def series(batches, per_uplink):
+    """ Splits the interval levels into uplink batches, each the concatenated LAeq, LAmax and LAmin series """
+    for i in range(0, len(batches), per_uplink):
+        batch = batches[i:i + per_uplink]
+        yield [b[0] for b in batch] + [b[1] for b in batch] + [b[2] for b in batch]
+
+
+def timed(function, payloads, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for payload in payloads:
+            function(payload)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('trace', nargs='?', help='level trace (.csv, dB per 125 ms) or raw ADC trace (.wav, .csv with --raw)')
+    parser.add_argument('--raw', action='store_true', help='the CSV trace holds raw ADC codes')
+    parser.add_argument('--rate', type=int, default=8000)
+    parser.add_argument('--bias', type=int, default=2048)
+    parser.add_argument('--cal-offset', type=float, default=77.0)
+    parser.add_argument('--hours', type=float, default=24.0, help='length of the synthetic trace')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--interval', type=float, default=10, help='measurement interval of the node (s)')
+    parser.add_argument('--batch', type=int, default=16, help='intervals per uplink')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.trace:
+        levels = trace_levels(args.trace, args.raw, args.rate, args.bias, args.cal_offset)
+    else:
+        levels, _ = synthetic_levels(args.hours, 2.0, args.seed)
+    batches = list(series(interval_levels(levels, args.interval), args.batch))
+    if not batches:
+        sys.exit('trace shorter than one interval')
+
+    values = sum(len(b) for b in batches)
+    payloads = [bytes(codec.encode(b)) for b in batches]
+    for batch, payload in zip(batches, payloads):
+        assert all(abs(a - b) <= 0.05 + 1e-9 for a, b in zip(batch, codec.decode(payload)))
+    print('%i uplinks of %i values (%i intervals of %g s)' % (len(batches), values // len(batches), args.batch, args.interval))
+    print('%-24s %8s %12s' % ('encoding', 'bytes', 'bytes/sample'))
+    for name, size in (('signed byte (1 dB)', values),
+                       ('raw 16-bit (0.1 dB)', sum(raw_size(b) for b in batches)),
+                       ('delta (0.1 dB)', sum(delta_size(b) for b in batches)),
+                       ('delta-of-delta (0.1 dB)', sum(len(p) for p in payloads))):
+        print('%-24s %8i %12.2f' % (name, size, size / values))
+
+    buf = bytearray(codec.encoded_size(codec.MAX_COUNT))
+    encode = timed(lambda b: codec.encode(b, buf), batches, args.repeat)
+    decode = timed(codec.decode, payloads, args.repeat)
+    n = values * args.repeat
+    print('encode %.2f us/sample, decode %.2f us/sample' % (1e6 * encode / n, 1e6 * decode / n))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+""" CPU cost per second of audio of the 1/3-octave filterbank versus the FFT band spectrum
+
+Runs on the MicroPython unix port (micropython bench_filterbank.py, argparse of micropython-lib) as well as on CPython.
+"""
+
+import argparse
+import math
+import sys
+from array import array
+
+_here = __file__.rsplit('/', 1)[0] if '/' in __file__ else '.'
+sys.path.insert(0, _here + '/../node')
+from filterbank import FilterBank
+from spectrum import Spectrum
+
+try:
+    from utime import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1000000)
+
+    def ticks_diff(new, old):
+        return new - old
+
+
+def test_signal(rate, seconds, bias=2048):
+    """ Sweep of tones plus a deterministic pseudo-random noise in 12-bit ADC codes """
+    n = int(rate * seconds)
+    codes = array('H', [0] * n)
+    seed = 12345
+    for i in range(n):
+        seed = (seed * 1103515245 + 12345) & 0x7fffffff
+        f = 50 + 3000 * i / n
+        codes[i] = int(bias + 800 * math.sin(2 * math.pi * f * i / rate) + ((seed >> 16) % 64) - 32)
+    return codes
+
+
+def cost_filterbank(codes, rate, chunk):
+    fb = FilterBank(sample_rate=rate)
+    t0 = ticks_us()
+    for start in range(0, len(codes), chunk):
+        fb.process(codes, start, min(start + chunk, len(codes)))
+    return ticks_diff(ticks_us(), t0) / 1000000, fb
+
+
+def cost_fft(codes, rate, n):
+    sp = Spectrum(n=n, sample_rate=rate)
+    window = array('H', [0] * n)
+    t0 = ticks_us()
+    for start in range(0, len(codes) - n + 1, n):      # contiguous (non-overlapping) transforms
+        for i in range(n):
+            window[i] = codes[start + i]
+        sp.analyse(window)
+    return ticks_diff(ticks_us(), t0) / 1000000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rate', type=int, default=8000, help='sample rate (Hz)')
+    parser.add_argument('--seconds', type=float, default=2.0, help='length of the test signal (s)')
+    args = parser.parse_args()
+    rate, seconds = args.rate, args.seconds
+    codes = test_signal(rate, seconds)
+    print('%s, %i Hz, %.1f s of audio' % (sys.implementation.name, rate, seconds))
+
+    t, fb = cost_filterbank(codes, rate, 256)
+    print('filterbank   %2i bands, %i stages : %8.3f s CPU per s of audio' % (fb.n_bands, fb.n_stages, t / seconds))
+    for n in (256, 512, 1024):
+        t_fft = cost_fft(codes, rate, n)
+        print('FFT N=%-4i   20 bands            : %8.3f s CPU per s of audio (filterbank costs %.1fx)'
+            % (n, t_fft / seconds, t / t_fft))
+    print('band Leq: ' + ' '.join('%s:%.0f' % (f, l) for f, l in zip(fb.nominal, fb.levels())))
+
+
+main()
@@ -0,0 +1,98 @@
+""" Host benchmark of the radio callback latency with print logging versus the ring logger (CPython) """
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'node'))
+from ringlog import RingLog, INFO
+
+
+class Uart:
+    """ Console sink emulating the UART throughput: writing blocks for 10 bits per byte at baud """
+
+    def __init__(self, baud):
+        self.baud = baud
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text)
+        if self.baud:
+            end = time.perf_counter() + 10 * len(text) / self.baud
+            while time.perf_counter() < end:
+                pass
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def make_packet(i):
+    """ The gateway's push-data json of a received uplink """
+    return json.dumps({'rxpk': [{'time': '2022-05-01T12:00:00.000000Z', 'tmst': i * 1000, 'chan': 0, 'rfch': 0,
+        'freq': 868.1, 'stat': 1, 'modu': 'LORA', 'datr': 'SF7BW125', 'codr': '4/5', 'rssi': -97, 'lsnr': 7.5,
+        'size': 20, 'data': 'QDuDCyaAAQACa0xZ6RlvbL8m+Ns='}]})
+
+
+def print_logger(uart):
+    """ The previous _log: formatting and printing in the caller """
+    def log(message, *args):
+        print('[{:>10.3f}] {}'.format(time.perf_counter(), str(message).format(*args)), file=uart)
+    return log
+
+
+def ring_logger(ring):
+    def log(message, *args):
+        ring.log(INFO, message, args if args else None)
+    return log
+
+
+def callback(log, i):
+    """ Work of the gateway's LoRa RX callback """
+    packet = make_packet(i)
+    log('Received packet: {}', packet)
+    log('Push ack')
+
+
+def measure(log, n):
+    latencies = []
+    for i in range(n):
+        start = time.perf_counter()
+        callback(log, i)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies
+
+
+def report(name, latencies):
+    print('%-8s mean %8.1f us   p99 %8.1f us   max %8.1f us' % (name, 1e6 * sum(latencies) / len(latencies),
+        1e6 * latencies[int(0.99 * len(latencies))], 1e6 * latencies[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--callbacks', type=int, default=2000)
+    parser.add_argument('--baud', type=int, default=115200, help='UART speed emulated by the console, 0 for none')
+    parser.add_argument('--size', type=int, default=128, help='ring logger records')
+    args = parser.parse_args()
+
+    uart = Uart(args.baud)
+    report('print', measure(print_logger(uart), args.callbacks))
+
+    ring = RingLog(size=args.size, style='{}', write=lambda line: print(line, file=uart))
+    latencies = []
+    flush = 0.0
+    for i in range(0, args.callbacks, 10):      # the UDP thread flushes every few callbacks
+        latencies += measure(ring_logger(ring), 10)
+        start = time.perf_counter()
+        ring.flush()
+        flush += time.perf_counter() - start
+    latencies.sort()
+    report('ring', latencies)
+    print('ring flush (main loop): %.1f us per record, %i console bytes' % (1e6 * flush / (2 * args.callbacks), uart.bytes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+""" Host benchmark of the node's sound level meter: throughput and A-weighting accuracy (CPython) """
+
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+import wave
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'node'))
+from soundlevel import SoundLevelMeter
+
+THIRD_OCTAVES = (31.5, 63, 125, 250, 500, 1000, 2000, 2500, 3150)
+
+
+def a_weighting_db(f):
+    """ Analog A-weighting (IEC 61672) in dB """
+    f2 = f * f
+    ra = (12194.217 ** 2 * f2 * f2) / ((f2 + 20.598997 ** 2)
+        * math.sqrt((f2 + 107.65265 ** 2) * (f2 + 737.86223 ** 2)) * (f2 + 12194.217 ** 2))
+    return 20 * math.log10(ra) + 2.0
+
+
+def load_trace(path, bias):
+    """ Loads raw ADC codes from a CSV (first column) or a 16-bit mono WAV file (rescaled to 12-bit codes) """
+    if path.lower().endswith('.wav'):
+        with wave.open(path, 'rb') as wav:
+            if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+                raise ValueError('only 16-bit mono WAV files are supported')
+            pcm = array('h', wav.readframes(wav.getnframes()))
+            if sys.byteorder == 'big':
+                pcm.byteswap()
+            return wav.getframerate(), array('H', [(s >> 4) + bias for s in pcm])
+    with open(path, newline='') as fp:
+        codes = array('H', [int(float(row[0])) for row in csv.reader(fp) if row and row[0].strip().lstrip('-').replace('.', '').isdigit()])
+    return None, codes
+
+
+def tone(freq, amplitude, sample_rate, seconds, bias):
+    n = int(sample_rate * seconds)
+    w = 2 * math.pi * freq / sample_rate
+    return array('H', [int(round(bias + amplitude * math.sin(w * i))) for i in range(n)])
+
+
+def run(meter, codes):
+    start = time.perf_counter()
+    meter.feed(codes)
+    return time.perf_counter() - start
+
+
+def accuracy(rate, amplitude, bias):
+    print('A-weighting accuracy @ %i Hz, sine amplitude %i counts' % (rate, amplitude))
+    print('%8s %10s %10s %8s' % ('f [Hz]', 'LAeq', 'expected', 'error'))
+    for f in THIRD_OCTAVES:
+        if f >= rate / 2.5:
+            continue
+        meter = SoundLevelMeter(sample_rate=rate, bias=bias)
+        run(meter, tone(f, amplitude, rate, 2.0, bias))
+        laeq = meter.levels()[0]
+        expected = 20 * math.log10(amplitude / math.sqrt(2)) + a_weighting_db(f)
+        print('%8.1f %10.2f %10.2f %8.2f' % (f, laeq, expected, laeq - expected))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('trace', nargs='?', help='recorded trace (.wav or .csv of raw ADC codes)')
+    parser.add_argument('--rate', type=int, default=8000, help='sample rate of CSV traces and synthetic tones')
+    parser.add_argument('--bias', type=int, default=2048)
+    parser.add_argument('--cal-offset', type=float, default=0.0, help='dB SPL of a 1 count rms signal')
+    parser.add_argument('--amplitude', type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.trace:
+        rate, codes = load_trace(args.trace, args.bias)
+        rate = rate or args.rate
+    else:
+        rate, codes = args.rate, tone(1000, args.amplitude, args.rate, 10.0, args.bias)
+
+    meter = SoundLevelMeter(sample_rate=rate, bias=args.bias, cal_offset=args.cal_offset)
+    elapsed = run(meter, codes)
+    laeq, lamax, lamin = meter.levels()
+    print('%i samples (%.1f s of audio) in %.3f s: %.0f samples/s, %.1fx real time'
+        % (len(codes), len(codes) / rate, elapsed, len(codes) / elapsed, len(codes) / rate / elapsed))
+    if laeq is not None:
+        print('LAeq %.1f dB, LAmax %.1f dB, LAmin %.1f dB' % (laeq, lamax, lamin))
+    if not args.trace:
+        accuracy(rate, args.amplitude, args.bias)
+
+
+if __name__ == '__main__':
+    main()
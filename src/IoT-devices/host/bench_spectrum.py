@@ -0,0 +1,81 @@
+""" Host benchmark of the node's fixed-point FFT: accuracy against numpy.fft and transforms per second (CPython) """
+
+import argparse
+import cmath
+import math
+import os
+import random
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'node'))
+import spectrum
+from spectrum import Spectrum, fft
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def reference_fft(x):
+    """ Floating point DFT of x, numpy.fft when available """
+    if numpy is not None:
+        return list(numpy.fft.fft(x))
+    n = len(x)
+    return [sum(x[t] * cmath.exp(-2j * math.pi * k * t / n) for t in range(n)) for k in range(n)]
+
+
+def test_signal(n, rate, bias):
+    """ Two tones plus noise in 12-bit ADC codes """
+    rnd = random.Random(n)
+    return array('H', [int(bias + 900 * math.sin(2 * math.pi * 440 * i / rate)
+        + 300 * math.sin(2 * math.pi * 2600 * i / rate) + rnd.gauss(0, 20)) for i in range(n)])
+
+
+def accuracy(n, rate, bias):
+    """ Returns the error of the fixed-point FFT relative to the reference, in dB below the signal """
+    codes = test_signal(n, rate, bias)
+    step = spectrum.MAX_N // n
+    re = array('l', [((codes[i] - bias) * spectrum.HANN[i * step]) >> (spectrum.WINDOW_Q - spectrum.INPUT_SHIFT) for i in range(n)])
+    im = array('l', [0] * n)
+    ref = reference_fft(list(re))
+    fft(re, im, n)
+    signal = sum(abs(v) ** 2 for v in ref)
+    error = sum(abs(complex(re[k], im[k]) * n - ref[k]) ** 2 for k in range(n))
+    return 10 * math.log10(signal / error)
+
+
+def throughput(n, rate, bias, seconds):
+    """ Returns full analyses (window, FFT, band binning) per second """
+    sp = Spectrum(n=n, sample_rate=rate, bias=bias)
+    codes = test_signal(n, rate, bias)
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        sp.analyse(codes)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rate', type=int, default=8000)
+    parser.add_argument('--bias', type=int, default=2048)
+    parser.add_argument('--seconds', type=float, default=2.0, help='duration of each throughput run')
+    args = parser.parse_args()
+
+    print('reference: %s' % ('numpy.fft' if numpy is not None else 'pure python DFT (numpy not installed)'))
+    print('%6s %10s %14s %12s' % ('N', 'SNR [dB]', 'transforms/s', 'x real time'))
+    for n in (256, 512, 1024):
+        snr = accuracy(n, args.rate, args.bias)
+        rate = throughput(n, args.rate, args.bias, args.seconds)
+        print('%6i %10.1f %14.1f %12.1f' % (n, snr, rate, rate * n / args.rate))
+
+    sp = Spectrum(n=256, sample_rate=args.rate, bias=args.bias)
+    levels = sp.analyse(test_signal(256, args.rate, args.bias))
+    print('band levels (N=256): ' + ' '.join('%i@%.0fHz' % (l, f) for l, f in zip(levels, sp.band_frequencies())))
+
+
+if __name__ == '__main__':
+    main()
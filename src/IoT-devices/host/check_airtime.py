@@ -0,0 +1,54 @@
+""" Checks the node's time-on-air model against reference values and measured lora.stats() airtimes (CPython)
+
+The optional CSV holds one uplink per row: application payload bytes, datarate, tx_time_on_air (ms) as
+logged by the node ("Transmission ended: tx_time_on_air: ... ms").
+"""
+
+import argparse
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'node'))
+import airtime
+
+# (PHY payload bytes, SF, bandwidth Hz, time on air ms) from the Semtech LoRa calculator (CR 4/5, 8 symbols preamble, explicit header, CRC)
+REFERENCE = (
+    (13, 7, 125000, 46.336), (23, 7, 125000, 61.696), (23, 8, 125000, 113.152), (23, 9, 125000, 205.824),
+    (23, 10, 125000, 370.688), (23, 11, 125000, 823.296), (13, 12, 125000, 1155.072), (23, 12, 125000, 1482.752),
+    (64, 12, 125000, 2793.472), (23, 7, 250000, 30.848),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('measurements', nargs='?', help='CSV of payload,dr,tx_time_on_air rows logged by the node')
+    args = parser.parse_args()
+
+    errors = 0
+    for size, sf, bw, expected in REFERENCE:
+        model = airtime.time_on_air(size, sf, bw)
+        ok = abs(model - expected) < 0.01
+        errors += not ok
+        print('%3i bytes SF%-2i %3i kHz: %9.3f ms (reference %9.3f ms) %s' % (size, sf, bw // 1000, model, expected, 'ok' if ok else 'MISMATCH'))
+
+    if args.measurements:
+        with open(args.measurements, newline='') as fp:
+            rows = [row for row in csv.reader(fp) if row and not row[0].startswith('#')]
+        for payload, dr, measured in rows:
+            model = airtime.uplink_time_on_air(int(payload), int(dr))
+            ok = abs(model - float(measured)) <= 1      # lora.stats() reports whole ms
+            errors += not ok
+            print('%3s bytes DR%s: %9.3f ms (measured %s ms) %s' % (payload, dr, model, measured, 'ok' if ok else 'MISMATCH'))
+
+    print('\nmax. application payload and time on air (ms) per EU868 datarate:')
+    for dr in sorted(airtime.EU868_DATARATES):
+        sf, bw = airtime.EU868_DATARATES[dr]
+        limit = airtime.max_payload(dr)
+        print('DR%i SF%-2i %3i kHz: %3i bytes, %8.1f ms empty, %8.1f ms full' % (
+            dr, sf, bw // 1000, limit, airtime.uplink_time_on_air(0, dr), airtime.uplink_time_on_air(limit, dr)))
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
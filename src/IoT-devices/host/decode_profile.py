@@ -0,0 +1,33 @@
+""" Decodes the node's wake-up profile uplinks (hex payloads of the profile FPort) into phase timings (CPython) """
+
+import argparse
+import binascii
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'node'))
+import profiler
+
+
+def fmt(i):
+    low, high = profiler.bucket_range(i)
+    return '%g-%g ms' % (low, high) if high is not None else '>%g ms' % low
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('payloads', nargs='+', help='hex payloads (or base64 with --base64, as shown by TTN)')
+    parser.add_argument('--base64', action='store_true')
+    args = parser.parse_args()
+
+    for payload in args.payloads:
+        data = binascii.a2b_base64(payload) if args.base64 else binascii.unhexlify(payload)
+        cycles, phases = profiler.decode(data)
+        print('%i wake-up cycles' % cycles)
+        for phase, (count, p50, p90, low, high) in phases.items():
+            if count:
+                print('  %-7s %4i x  median %-14s p90 %-14s min %-14s max %s' % (phase, count, fmt(p50), fmt(p90), fmt(low), fmt(high)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+""" Runs unmodified NoiseNodes (and a single-channel NoiseGateway) on the host emulator, in virtual time (CPython) """
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+import emulator
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--duration', type=float, default=3600, help='virtual time (s)')
+    parser.add_argument('--radius', type=float, default=60, help='nodes placed at random within this distance of the gateway (m)')
+    parser.add_argument('--gateway', action='store_true', help='single-channel NoiseGateway (868.1 MHz, SF7) instead of a multi-channel one')
+    parser.add_argument('--sleep', type=int, default=60, help='DEEPSLEEP_TIME of the nodes (s)')
+    parser.add_argument('--interval', type=int, default=1, help='measuring time of a report (s)')
+    parser.add_argument('--monitor', action='store_true', help='monitoring mode (continuous sampling)')
+    parser.add_argument('--confirmed', action='store_true', help='every uplink confirmed')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--echo', action='store_true', help='printing the consoles of the devices')
+    args = parser.parse_args()
+
+    kernel = emulator.Kernel(echo=args.echo)
+    server = emulator.NetworkServer(kernel, gateways=[] if args.gateway else [(0.0, 0.0)])
+    medium = emulator.Medium(kernel, server, emulator.PathLoss(seed=args.seed))
+    emulator.install(kernel)
+
+    overrides = {'config': {
+        'DEBUG': False,                 # the debug mode enters the REPL instead of measuring
+        'DEEPSLEEP_TIME': args.sleep,
+        'SENSOR_PARAMETERS': {'interval': args.interval},
+        'MONITOR_PARAMETERS': {'enabled': args.monitor},
+        'LORA_PARAMETERS': {'confirmed_tx': args.confirmed},
+        }}
+    if args.gateway:
+        gateway = emulator.Device(kernel, medium, 'gateway', os.path.join(ROOT, 'single-gateway'))
+        gateway.power_on()
+    rnd = random.Random(args.seed)
+    nodes = []
+    for i in range(args.nodes):
+        distance, angle = args.radius * math.sqrt(rnd.random()), 2 * math.pi * rnd.random()
+        node = emulator.Device(kernel, medium, 'node-%i' % (i + 1), os.path.join(ROOT, 'node'),
+            position=(distance * math.cos(angle), distance * math.sin(angle)), overrides=overrides)
+        node.power_on(int(rnd.random() * args.sleep * 1e6) + 3000000)    # after the gateway is online
+        nodes.append(node)
+
+    start = time.perf_counter()
+    kernel.run(int(args.duration * 1e6))
+    elapsed = time.perf_counter() - start
+
+    delivered = {}
+    for _, dev_eui, _, _, _, _, _ in server.uplinks:
+        delivered[dev_eui] = delivered.get(dev_eui, 0) + 1
+    print('%-8s %8s %6s %8s %10s %10s  %s' % ('device', 'dist (m)', 'boots', 'tx', 'delivered', 'fcnt', 'error'))
+    for node in nodes:
+        tx = sum(1 for kind, _, _, _ in node.timeline if kind == 'tx')
+        sessions = node.nvram.get('lora')
+        print('%-8s %8.0f %6i %8i %10i %10s  %s' % (node.name, math.hypot(*node.position), node.boots, tx,
+            delivered.get(node.eui.hex(), 0), sessions[2] if sessions else '-', node.error or ''))
+    if args.gateway:
+        print('gateway: %i frames forwarded, %s' % (server.forwarded, gateway.error or 'running'))
+    print('%i frames on the air, %i receptions lost in collisions, %i joins, %i acks' % (
+        medium.frames, medium.lost, server.joins, server.acks))
+    print('%.0f s of virtual time in %.1f s (%.0fx real time)' % (args.duration, elapsed, args.duration / elapsed))
+    kernel.close()
+
+
+if __name__ == '__main__':
+    main()
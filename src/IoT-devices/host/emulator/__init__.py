@@ -0,0 +1,39 @@
+"""
+Host emulation of the Pycom boards: NoiseNode and NoiseGateway run unmodified on CPython, in virtual time.
+
+    kernel = Kernel()
+    medium = Medium(kernel, NetworkServer(kernel, gateways=[(0, 0)]))
+    install(kernel)                     # network, machine, pycom, utime, ... of the emulation
+    node = Device(kernel, medium, 'node-1', 'node', position=(500, 0), overrides={'config': {'DEBUG': False}})
+    node.power_on()
+    kernel.run(3600 * 10**6)
+    kernel.close()                      # removes the flash directories of the devices
+
+The devices share the interpreter: a boot imports the modules of its source directory anew.
+"""
+
+import builtins
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'node'))  # airtime
+
+from . import runtime
+from .kernel import Kernel, Halt
+from .radio import Medium, NetworkServer, PathLoss, LoRa
+from .device import Device, NoiseSource, PWRON_RESET, DEEPSLEEP_RESET, SOFT_RESET
+
+MODULES = ('machine', 'pycom', 'network', 'utime', 'uos', '_thread', 'micropython', 'usocket', 'ubinascii', 'ujson')
+ALIASES = {'time': 'utime', 'socket': 'usocket'}   # MicroPython names of the same modules
+
+
+def install(kernel):
+    """ Makes the emulated modules importable under their MicroPython names, print() goes to the device consoles """
+    import importlib
+    runtime.kernel = kernel
+    for name in MODULES:
+        sys.modules[name] = importlib.import_module('.' + name, __name__)
+    for alias, name in ALIASES.items():
+        sys.modules[alias] = sys.modules[name]
+    builtins.print = kernel.console
+    builtins.open = runtime.open
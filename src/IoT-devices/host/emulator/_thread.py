@@ -0,0 +1,54 @@
+""" _thread of MicroPython: the threads are tasks of the device, the locks are never contended across a switch """
+
+from . import runtime
+
+
+class LockType:
+    def __init__(self):
+        self.locked_flag = False
+
+    def acquire(self, waitflag=1, timeout=-1):
+        if self.locked_flag:
+            if not waitflag:
+                return False
+            ready = lambda: not self.locked_flag
+            if not runtime.kernel.wait(ready, 1000, None if timeout < 0 else int(timeout * 1000000)):
+                return False
+        self.locked_flag = True
+        return True
+
+    def release(self):
+        if not self.locked_flag:
+            raise RuntimeError('release unlocked lock')
+        self.locked_flag = False
+
+    def locked(self):
+        return self.locked_flag
+
+    __enter__ = acquire
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def allocate_lock():
+    return LockType()
+
+
+def start_new_thread(fn, args, kwargs=None):
+    device = runtime.device()
+    task = runtime.kernel.spawn(device, lambda: fn(*args, **(kwargs or {})), name='%s-thread' % device.name)
+    return id(task)
+
+
+def get_ident():
+    task = runtime.kernel.current()
+    return id(task) if task is not None else 0
+
+
+def stack_size(size=None):
+    return 4096
+
+
+def exit():
+    raise SystemExit()
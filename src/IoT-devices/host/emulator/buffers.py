@@ -0,0 +1,38 @@
+""" str and bytes mixing like MicroPython: its bytes concatenate any object of the buffer protocol, str included """
+
+
+class Bytes(bytes):
+    """ bytes of the emulated modules (ubinascii): + str encodes the str, slices and case changes stay Bytes """
+
+    def __add__(self, other):
+        return Bytes(bytes.__add__(self, other.encode() if isinstance(other, str) else other))
+
+    def __radd__(self, other):
+        return Bytes((other.encode() if isinstance(other, str) else bytes(other)) + bytes(self))
+
+    def __getitem__(self, key):
+        item = bytes.__getitem__(self, key)
+        return Bytes(item) if isinstance(key, slice) else item
+
+    def upper(self):
+        return Bytes(bytes.upper(self))
+
+    def lower(self):
+        return Bytes(bytes.lower(self))
+
+
+class Text(str):
+    """ str of the emulated modules (ujson): bytes + Text gives bytes, slices and sums stay Text """
+
+    def __radd__(self, other):
+        if isinstance(other, (bytes, bytearray)):
+            return Bytes(bytes(other) + self.encode())
+        return Text(str.__add__(other, self))
+
+    def __add__(self, other):
+        if isinstance(other, (bytes, bytearray)):
+            return Bytes(self.encode() + bytes(other))
+        return Text(str.__add__(self, other))
+
+    def __getitem__(self, key):
+        return Text(str.__getitem__(self, key))
@@ -0,0 +1,251 @@
+""" An emulated Pycom board: NVS, nvram, flash, reset cause, console, callbacks and deepsleep-as-reset """
+
+import collections
+import copy
+import importlib
+import math
+import os
+import random
+import sys
+import tempfile
+import traceback
+import zlib
+
+from . import runtime
+from .kernel import Halt
+
+# machine.reset_cause() values of the pycom firmware
+PWRON_RESET, HARD_RESET, WDT_RESET, DEEPSLEEP_RESET, SOFT_RESET, BROWN_OUT_RESET = range(6)
+BOOT_US     = 800000                    # firmware boot until main.py runs
+SAMPLE_GAP_US = 10000                   # ADC reads closer than this belong to the same sampling run of the timeline
+SOURCES     = set()                     # source directories of the devices, their modules are imported per boot
+
+
+class NoiseSource:
+    """ Microphone stand-in: ADC codes of white noise around the bias, at a level (dB SPL) changing over time """
+
+    def __init__(self, level=lambda t: 60.0 + 10.0 * math.sin(2 * math.pi * t / 3600), bias=2048, cal_offset=77.0, seed=1):
+        self.level      = level             # level(t in s) -> dB SPL
+        self.bias       = bias
+        self.cal_offset = cal_offset        # dB SPL of a 1 ADC-count rms signal (config SENSOR_PARAMETERS)
+        self.rnd        = random.Random(seed)
+        self.block      = None
+        self.rms        = 0.0
+
+    def __call__(self, t):
+        block = int(t * 8)                  # the level is updated per 125 ms
+        if block != self.block:
+            self.block = block
+            self.rms = 10 ** ((self.level(t) - self.cal_offset) / 20)
+        return max(0, min(4095, int(self.bias + self.rnd.gauss(0.0, self.rms) + 0.5)))
+
+
+class Device:
+    """
+    A FiPy/LoPy running the scripts of a source directory. Every boot imports the device's modules
+    anew (with the overrides applied to them) and runs main in a task. machine.deepsleep() and
+    machine.reset() unwind all the tasks of the device and boot it again later; NVS, nvram and the
+    flash files survive, like on the board.
+    """
+
+    def __init__(self, kernel, medium, name, source, main='main.py', position=(0.0, 0.0), overrides=None,
+            adc=None, boot_us=BOOT_US, echo=None, trace=True):
+        self.kernel     = kernel
+        self.medium     = medium
+        self.name       = name
+        self.source     = os.path.abspath(source)
+        self.main       = main                          # script of the source directory, or callable(device)
+        self.position   = position                      # (x, y) in m
+        self.overrides  = overrides or {}               # module -> {attribute: value}, dicts are merged
+        self.boot_us    = boot_us
+        self.echo       = kernel.echo if echo is None else echo
+        self.tracing    = trace
+        crc = zlib.crc32(name.encode())
+        self.rng        = random.Random(crc)
+        self.adc        = adc or NoiseSource(seed=crc)
+        self.eui        = bytes.fromhex('70b3d5%010x' % crc)
+        self.uid        = self.eui[:3] + self.eui[5:]
+        self.flash      = tempfile.TemporaryDirectory(prefix='emu-%s-' % name)     # files of the flash, removed by close()
+        self.flash_dir  = self.flash.name
+        self.nvs        = {}
+        self.nvram      = {}
+        self.reset_cause = PWRON_RESET
+        self.generation = 0
+        self.lora       = None
+        self.led        = 0
+        self.radios     = {'LTE': False, 'WLAN': False, 'Bluetooth': False}    # radios drawing their idle current
+        self.on_boot    = {'wifi': True, 'lte': True}   # pycom.wifi_on_boot(), pycom.lte_modem_en_on_boot()
+        self.irq_queue  = collections.deque()
+        self.irq_task   = None
+        self.parked     = set()                         # tasks waiting without a timeout (REPL, idle callback task)
+        self.console    = collections.deque(maxlen=200)
+        self.timeline   = []                            # (kind, start_us, end_us, detail)
+        self.sampling   = None                          # timeline index of the last sampling run
+        self.boots      = 0
+        self.boot_time  = 0
+        self.error      = None
+        SOURCES.add(self.source)
+        kernel.devices.append(self)
+
+    def close(self):
+        """ Removes the flash directory of the device """
+        self.flash.cleanup()
+
+    # --- power ----------------------------------------------------------------------------------
+    def power_on(self, delay_us=0):
+        self.kernel.after(delay_us, self._boot)
+
+    def _boot(self):
+        self.generation += 1
+        self.boots += 1
+        self.boot_time = self.kernel.now
+        # the firmware starts WLAN and powers the LTE modem per its boot settings, the modem keeps its state in deepsleep
+        self.power('WLAN', self.on_boot['wifi'])
+        self.power('LTE', self.on_boot['lte'] or (self.reset_cause == DEEPSLEEP_RESET and self.radios['LTE']))
+        self.kernel.spawn(self, self._run, name='%s-main' % self.name)
+
+    def _run(self):
+        self.trace('boot', self.kernel.now, self.kernel.now + self.boot_us)
+        self.kernel.sleep_us(self.boot_us)
+        self._import()
+        if callable(self.main):
+            self.main(self)
+        else:
+            path = os.path.join(self.source, self.main)
+            with runtime.host_open(path) as f:
+                code = compile(f.read(), path, 'exec')
+            exec(code, {'__name__': '__main__', '__file__': path, 'input': self.input})   # the devices share sys.modules['__main__']
+
+    def _import(self):
+        """ Forgets the modules of the previous boot (of any device) and applies the overrides to fresh imports """
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, '__file__', None) or ''
+            if os.path.dirname(os.path.abspath(path)) in SOURCES:
+                del sys.modules[name]
+        sys.path[:] = [self.source] + [p for p in sys.path if os.path.abspath(p) not in SOURCES]
+        for name, attributes in self.overrides.items():
+            module = importlib.import_module(name)
+            for attribute, value in attributes.items():
+                current = getattr(module, attribute, None)
+                if isinstance(current, dict) and isinstance(value, dict):
+                    current.update(copy.deepcopy(value))
+                else:
+                    setattr(module, attribute, copy.deepcopy(value))
+
+    def _halt(self, cause, delay_us):
+        """ Stops every task of the device, boots again after delay_us (None: stays off) """
+        self.generation += 1
+        self.reset_cause = cause
+        if self.lora is not None:
+            if self.lora in self.medium.radios:
+                self.medium.radios.remove(self.lora)
+            self.lora = None
+        self.power('WLAN', False)
+        self.power('Bluetooth', False)
+        self.irq_queue.clear()
+        self.irq_task = None
+        for task in self.parked:
+            self.kernel.after(0, task.resume)           # raises Halt in the task
+        self.parked.clear()
+        if delay_us is not None:
+            self.trace('sleep', self.kernel.now, self.kernel.now + delay_us)
+            self.kernel.after(delay_us, self._boot)
+
+    def deepsleep(self, ms):
+        self._halt(DEEPSLEEP_RESET, int(ms * 1000))
+        raise Halt()
+
+    def reset(self):
+        self._halt(SOFT_RESET, 0)
+        raise Halt()
+
+    def crashed(self, error):
+        """ An uncaught exception ends main (or a thread) like on the board: traceback on the console, REPL """
+        self.error = error
+        for line in traceback.format_exception(type(error), error, error.__traceback__):
+            self.output(line.rstrip())
+
+    def power(self, radio, on):
+        """ Switches a radio on or off, the timeline keeps the switching times (idle current) """
+        if self.radios[radio] != on:
+            self.radios[radio] = on
+            self.trace('radio', self.kernel.now, self.kernel.now, (radio, on))
+
+    # --- tasks ----------------------------------------------------------------------------------
+    def park(self):
+        """ Suspends the running task until the device halts """
+        task = self.kernel.current()
+        self.parked.add(task)
+        task.park()
+
+    def input(self, prompt=''):
+        """ input() of main.py: the REPL waits forever, the callbacks keep running """
+        if prompt:
+            self.output(prompt)
+        self.park()
+
+    def irq(self, handler, arg):
+        """ Runs handler(arg) in the callback task of the device (pycom runs the callbacks in a thread) """
+        self.irq_queue.append((handler, arg, self.generation))
+        task = self.irq_task
+        if task is None or task.done:
+            self.irq_task = self.kernel.spawn(self, self._irq_loop, name='%s-irq' % self.name)
+        elif task in self.parked:
+            self.parked.discard(task)
+            self.kernel.after(0, task.resume)
+
+    def interrupt(self, handler, arg):
+        """ Runs handler(arg) at once in the kernel thread, like an interrupt handler (it must not block) """
+        self.kernel.context = self
+        try:
+            handler(arg)
+        except Halt:                            # the handler put the device to deepsleep
+            pass
+        except Exception as e:
+            self.crashed(e)
+        finally:
+            self.kernel.context = None
+
+    def _irq_loop(self):
+        while True:
+            while self.irq_queue:
+                handler, arg, generation = self.irq_queue.popleft()
+                if generation != self.generation:
+                    continue
+                try:
+                    handler(arg)
+                except Exception as e:          # printed, the callback task keeps running
+                    self.crashed(e)
+            self.park()
+
+    # --- files and console ------------------------------------------------------------------------
+    def path(self, path):
+        """ Host path of a device path (/flash, /sd) """
+        return os.path.join(self.flash_dir, path.lstrip('/')) if path.startswith('/') else path
+
+    def open(self, path, *args, **kwargs):
+        path = self.path(path)
+        if args and any(m in args[0] for m in 'wa'):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        return runtime.host_open(path, *args, **kwargs)
+
+    def output(self, line):
+        self.console.append(line)
+        if self.echo:
+            self.kernel.print('[%10.3f] %s: %s' % (self.kernel.now / 1e6, self.name, line))
+
+    def sampled(self, now):
+        """ An ADC read at now: extends the last sampling run of the timeline, or starts a new one """
+        if not self.tracing:
+            return
+        i = self.sampling
+        if i is not None and now - self.timeline[i][2] <= SAMPLE_GAP_US:
+            self.timeline[i] = ('sample', self.timeline[i][1], now, None)
+        else:
+            self.sampling = len(self.timeline)
+            self.timeline.append(('sample', now, now, None))
+
+    def trace(self, kind, start, end, detail=None):
+        """ Timeline of the device (boot, join, sample, tx, rx, sleep, radio), e.g. for energy accounting """
+        if self.tracing:
+            self.timeline.append((kind, start, end, detail))
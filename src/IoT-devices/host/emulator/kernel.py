@@ -0,0 +1,167 @@
+""" Virtual clock and cooperative scheduler of the emulated devices """
+
+import builtins
+import heapq
+import sys
+import threading
+
+CPU_TICK_US = 20                        # virtual time of a ticks read: one iteration of a MicroPython busy-wait loop
+STACK_SIZE = 512 * 1024                 # real stack of a task thread
+
+
+class Halt(BaseException):
+    """ Unwinds the tasks of a device going to deepsleep or resetting (not caught by the device's except Exception) """
+
+
+class Task:
+    """
+    A thread of an emulated device (main script, callback handler, _thread). Only one task runs at
+    a time: the task and the kernel hand a token back and forth, so the device code runs in
+    virtual time and the order of the events is deterministic.
+    """
+
+    def __init__(self, kernel, device, fn, args=(), name='task'):
+        self.kernel     = kernel
+        self.device     = device
+        self.fn         = fn
+        self.args       = args
+        self.name       = name
+        self.generation = device.generation if device is not None else 0
+        self.wakeup     = threading.Semaphore(0)
+        self.done       = False
+        self.thread     = None
+
+    def start(self):
+        threading.stack_size(STACK_SIZE)
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        self.wakeup.acquire()
+        self.kernel.tasks[threading.get_ident()] = self
+        try:
+            self.check()
+            self.fn(*self.args)
+        except Halt:
+            pass
+        except SystemExit:
+            pass
+        except BaseException as e:      # a crash of the device code stops the device, not the emulation
+            if self.device is not None:
+                self.device.crashed(e)
+            else:
+                raise
+        finally:
+            self.done = True
+            del self.kernel.tasks[threading.get_ident()]
+            self.kernel.token.release()
+
+    def check(self):
+        """ Raises Halt in a task of a device that went to deepsleep or reset meanwhile """
+        if self.device is not None and self.generation != self.device.generation:
+            raise Halt()
+
+    def park(self):
+        """ Gives the token back to the kernel until the task is resumed """
+        self.kernel.token.release()
+        self.wakeup.acquire()
+        self.check()
+
+    def resume(self):
+        """ Kernel side: runs the task until it parks or ends """
+        if self.done:
+            return
+        if self.thread is None:
+            self.start()
+        self.wakeup.release()
+        self.kernel.token.acquire()
+
+
+class Kernel:
+    """
+    Virtual clock (us) and event heap. Events are callables run by run() in time order; the
+    device tasks sleep by scheduling their own resumption. Reading the ticks costs CPU_TICK_US,
+    so the busy-wait loops of the device code end in virtual time too.
+    """
+
+    def __init__(self, echo=False):
+        self.now        = 0                             # virtual time (us)
+        self.heap       = []
+        self.seq        = 0                             # insertion order of the events of the same time
+        self.token      = threading.Semaphore(0)
+        self.tasks      = {}                            # thread ident -> running task
+        self.context    = None                          # device of the event run by the kernel thread
+        self.echo       = echo                          # printing the console output of the devices
+        self.print      = builtins.print
+        self.devices    = []                            # devices of the emulation, closed by close()
+
+    # --- events -------------------------------------------------------------------------------
+    def at(self, time_us, fn, *args):
+        """ Runs fn(*args) at time_us (in the kernel thread) """
+        self.seq += 1
+        heapq.heappush(self.heap, (max(time_us, self.now), self.seq, fn, args))
+
+    def after(self, delay_us, fn, *args):
+        self.at(self.now + int(delay_us), fn, *args)
+
+    def spawn(self, device, fn, args=(), name='task', delay_us=0):
+        """ Starts fn(*args) in a new task of device """
+        task = Task(self, device, fn, args, name)
+        self.after(delay_us, task.resume)
+        return task
+
+    def run(self, until_us):
+        """ Processes the events up to until_us """
+        while self.heap and self.heap[0][0] <= until_us:
+            time_us, _, fn, args = heapq.heappop(self.heap)
+            if time_us > self.now:
+                self.now = time_us
+            fn(*args)
+        self.now = max(self.now, until_us)
+
+    def close(self):
+        """ Removes the flash directories of the devices, after the last run() """
+        for device in self.devices:
+            device.close()
+
+    # --- task side ----------------------------------------------------------------------------
+    def current(self):
+        """ Returns the running task, None in the kernel thread """
+        return self.tasks.get(threading.get_ident())
+
+    def device(self):
+        """ Returns the device whose code is running """
+        task = self.current()
+        return task.device if task is not None else self.context
+
+    def sleep_us(self, us):
+        """ Suspends the running task for us of virtual time """
+        task = self.current()
+        if task is None:
+            raise RuntimeError('blocking call outside of a device task')
+        self.after(max(0, us), task.resume)
+        task.park()
+
+    def wait(self, ready, poll_us=1000, timeout_us=None):
+        """ Suspends the running task until ready() is true, returns False after timeout_us """
+        start = self.now
+        while not ready():
+            if timeout_us is not None and self.now - start >= timeout_us:
+                return False
+            self.sleep_us(poll_us)
+        return True
+
+    def cpu(self, us=CPU_TICK_US):
+        """ Lets us of virtual time pass in the running task, without giving the token away """
+        self.now += us
+        task = self.current()
+        if task is not None:
+            task.check()
+
+    # --- console ------------------------------------------------------------------------------
+    def console(self, *args, **kwargs):
+        """ print() of the emulation: the device output goes to its console, prefixed with the virtual time """
+        device = self.device()
+        if device is None or kwargs.get('file') not in (None, sys.stdout):
+            return self.print(*args, **kwargs)
+        device.output(kwargs.get('sep', ' ').join(str(a) for a in args))
@@ -0,0 +1,187 @@
+""" machine of the pycom firmware: reset cause, deepsleep, ADC, Timer.Alarm and RTC of the emulated device """
+
+from . import runtime
+from .device import PWRON_RESET, HARD_RESET, WDT_RESET, DEEPSLEEP_RESET, SOFT_RESET, BROWN_OUT_RESET
+
+PIN_WAKE, RTC_WAKE, ULP_WAKE = 1, 2, 3
+IDLE_US     = 1000                      # machine.idle(): until the next tick of the RTOS
+
+
+def reset_cause():
+    return runtime.device().reset_cause
+
+
+def wake_reason():
+    device = runtime.device()
+    return (RTC_WAKE if device.reset_cause == DEEPSLEEP_RESET else 0), []
+
+
+def deepsleep(ms=0):
+    runtime.device().deepsleep(ms)
+
+
+def reset():
+    runtime.device().reset()
+
+
+def idle():
+    runtime.kernel.sleep_us(IDLE_US)
+
+
+def unique_id():
+    return runtime.device().uid
+
+
+def disable_irq():
+    return 0                            # the device code is never preempted between two blocking calls
+
+
+def enable_irq(state=0):
+    pass
+
+
+def freq():
+    return 160000000
+
+
+class Pin:
+    IN, OUT, OPEN_DRAIN = 1, 2, 7
+    PULL_UP, PULL_DOWN = 1, 2
+
+    def __init__(self, id, mode=IN, pull=None, value=None):
+        self.id, self._value = id, value or 0
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = value
+
+    __call__ = value
+
+
+class ADCChannel:
+    """ Channel of the microphone: value() returns the ADC code of the device's source at the virtual time """
+
+    def __init__(self, device, pin):
+        self.device = device
+        self.pin = pin
+
+    def value(self):
+        kernel = runtime.kernel
+        kernel.cpu()
+        self.device.sampled(kernel.now)
+        return self.device.adc(kernel.now / 1e6)
+
+    __call__ = value
+
+    def voltage(self):
+        return self.value() * 3300 // 4095
+
+    def init(self):
+        pass
+
+    def deinit(self):
+        pass
+
+
+class ADC:
+    ATTN_0DB, ATTN_2_5DB, ATTN_6DB, ATTN_11DB = 0, 1, 2, 3
+
+    def __init__(self, id=0, bits=12):
+        self.device = runtime.device()
+
+    def channel(self, id=None, pin=None, attn=ATTN_0DB):
+        return ADCChannel(self.device, pin)
+
+    def init(self, bits=12):
+        pass
+
+    def deinit(self):
+        pass
+
+
+class Alarm:
+    """ Timer.Alarm: the handler runs in interrupt context at the virtual time of the alarm, it must not block """
+
+    def __init__(self, handler, s=None, *, ms=None, us=None, arg=None, periodic=False):
+        self.device     = runtime.device()
+        self.kernel     = runtime.kernel
+        self.handler    = handler
+        self.arg        = self if arg is None else arg
+        self.period     = int(us if us is not None else (ms * 1000 if ms is not None else s * 1000000))
+        self.periodic   = periodic
+        self.generation = self.device.generation
+        self.active     = True
+        self.next       = self.kernel.now + self.period
+        self.kernel.at(self.next, self._fire)
+
+    def _fire(self):
+        if not self.active or self.generation != self.device.generation:
+            return
+        self.device.interrupt(self.handler, self.arg)
+        if self.periodic:
+            self.next += self.period
+            self.kernel.at(self.next, self._fire)
+        else:
+            self.active = False
+
+    def callback(self, handler, arg=None):
+        self.handler, self.arg = handler, self if arg is None else arg
+
+    def cancel(self):
+        self.active = False
+
+
+class Timer:
+    Alarm = Alarm
+
+    class Chrono:
+        def __init__(self):
+            self.start_us, self.total = None, 0
+
+        def start(self):
+            self.start_us = runtime.kernel.now
+
+        def stop(self):
+            if self.start_us is not None:
+                self.total += runtime.kernel.now - self.start_us
+                self.start_us = None
+
+        def reset(self):
+            self.start_us, self.total = (runtime.kernel.now if self.start_us is not None else None), 0
+
+        def read_us(self):
+            running = runtime.kernel.now - self.start_us if self.start_us is not None else 0
+            return self.total + running
+
+        def read_ms(self):
+            return self.read_us() / 1000
+
+        def read(self):
+            return self.read_us() / 1e6
+
+
+class RTC:
+    def __init__(self, id=0):
+        pass
+
+    def init(self, datetime=None):
+        pass
+
+    def ntp_sync(self, server, update_period=3600):
+        pass
+
+    def synced(self):
+        return True
+
+    def now(self):
+        from . import utime
+        return utime.localtime()[:6] + (runtime.kernel.now % 1000000, None)
+
+
+class WDT:
+    def __init__(self, id=0, timeout=5000):
+        pass
+
+    def feed(self):
+        pass
@@ -0,0 +1,30 @@
+""" micropython: the code emitters are no-ops on CPython """
+
+from . import runtime
+
+
+def const(value):
+    return value
+
+
+def native(fn):
+    return fn
+
+
+viper = native
+
+
+def schedule(fn, arg):
+    runtime.device().irq(fn, arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def mem_info(verbose=None):
+    pass
+
+
+def opt_level(level=None):
+    return 0
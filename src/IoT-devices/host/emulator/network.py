@@ -0,0 +1,95 @@
+""" network of the pycom firmware: the LoRa radio on the virtual medium, WLAN/LTE/Bluetooth as power states with their costs """
+
+from . import runtime
+from .radio import LoRa
+
+# virtual time of the calls (FiPy, firmware 1.20): the LTE modem answers slowly over its UART
+LTE_INIT_US         = 1000000
+LTE_DEINIT_US       = 2200000
+WLAN_INIT_US        = 40000
+WLAN_DEINIT_US      = 80000
+WLAN_CONNECT_US     = 1500000
+BT_INIT_US          = 60000
+BT_DEINIT_US        = 30000
+
+
+class _Radio:
+    """ A radio of the device drawing its idle current while it is on (device.radios) """
+
+    NAME = None
+    INIT_US = DEINIT_US = 0
+
+    def __init__(self, *args, **kwargs):
+        self.device = runtime.device()
+        self.init(*args, **kwargs)
+
+    def init(self, *args, **kwargs):
+        runtime.kernel.sleep_us(self.INIT_US)
+        self.device.power(self.NAME, True)
+
+    def deinit(self, *args, **kwargs):
+        runtime.kernel.sleep_us(self.DEINIT_US)
+        self.device.power(self.NAME, False)
+
+    def isconnected(self):
+        return False
+
+
+class WLAN(_Radio):
+    NAME = 'WLAN'
+    INIT_US, DEINIT_US = WLAN_INIT_US, WLAN_DEINIT_US
+    STA, AP, STA_AP = 1, 2, 3
+    WEP, WPA, WPA2, WPA2_ENT = 1, 2, 3, 5
+    INT_ANT, EXT_ANT = 0, 1
+
+    def init(self, mode=AP, *args, **kwargs):
+        self.mode = mode
+        self.connected_at = None
+        super().init()
+
+    def connect(self, ssid, auth=None, bssid=None, timeout=None, ca_certs=None, keyfile=None, certfile=None, identity=None):
+        self.connected_at = runtime.kernel.now + WLAN_CONNECT_US
+
+    def disconnect(self):
+        self.connected_at = None
+
+    def isconnected(self):
+        return self.connected_at is not None and runtime.kernel.now >= self.connected_at
+
+    def ifconfig(self, *args, **kwargs):
+        return ('192.168.1.10', '255.255.255.0', '192.168.1.1', '192.168.1.1')
+
+    def mac(self):
+        return self.device.uid, self.device.uid
+
+    def scan(self):
+        return []
+
+
+class LTE(_Radio):
+    NAME = 'LTE'
+    INIT_US, DEINIT_US = LTE_INIT_US, LTE_DEINIT_US
+
+    def deinit(self, detach=True, reset=False, dettach=True):
+        super().deinit()
+
+    def isattached(self):
+        return False
+
+
+class Bluetooth(_Radio):
+    NAME = 'Bluetooth'
+    INIT_US, DEINIT_US = BT_INIT_US, BT_DEINIT_US
+
+
+class Server:
+    """ Telnet/FTP server of the firmware """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def deinit(self):
+        pass
+
+    def isrunning(self):
+        return False
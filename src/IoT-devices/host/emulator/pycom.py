@@ -0,0 +1,51 @@
+""" pycom of the firmware: NVS, heartbeat and RGB led, radio settings of the boot """
+
+from . import runtime
+
+
+def heartbeat(state=None):
+    device = runtime.device()
+    if state is None:
+        return getattr(device, 'heartbeat', True)
+    device.heartbeat = bool(state)
+
+
+def rgbled(color):
+    runtime.device().led = color
+
+
+def nvs_set(key, value):
+    if len(key) > 15:
+        raise ValueError('key too long')
+    runtime.device().nvs[key] = value
+
+
+def nvs_get(key, default=None):
+    return runtime.device().nvs.get(key, default)
+
+
+def nvs_erase(key):
+    try:
+        del runtime.device().nvs[key]
+    except KeyError:
+        raise KeyError(key)
+
+
+def nvs_erase_all():
+    runtime.device().nvs.clear()
+
+
+def wifi_on_boot(enable=None):
+    """ WLAN started by the firmware at boot (kept in the config partition, like NVS) """
+    device = runtime.device()
+    if enable is None:
+        return device.on_boot['wifi']
+    device.on_boot['wifi'] = bool(enable)
+
+
+def lte_modem_en_on_boot(enable=None):
+    """ LTE modem powered by the firmware at boot """
+    device = runtime.device()
+    if enable is None:
+        return device.on_boot['lte']
+    device.on_boot['lte'] = bool(enable)
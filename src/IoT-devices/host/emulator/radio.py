@@ -0,0 +1,435 @@
+""" Virtual LoRa medium: time on air, path loss, collisions with capture, a LoRaWAN network server and the pycom LoRa radio """
+
+import errno
+import math
+import random
+import struct
+from collections import namedtuple
+
+import airtime
+from . import runtime
+
+NOISE_FLOOR     = -174 + 10 * math.log10(125000) + 6   # thermal noise of a 125 kHz channel + 6 dB noise figure (dBm)
+SNR_FLOOR       = {7: -7.5, 8: -10.0, 9: -12.5, 10: -15.0, 11: -17.5, 12: -20.0}  # SX1276 demodulation floor (dB)
+CAPTURE_DB      = 6.0                   # a frame survives a collision (same channel and SF) when this much stronger
+TX_POWER        = 14                    # dBm
+RX1_DELAY_US    = 1000000               # LoRaWAN RECEIVE_DELAY1
+RX2_DELAY_US    = 2000000               # LoRaWAN RECEIVE_DELAY2
+JOIN_DELAY_US   = 5000000               # LoRaWAN JOIN_ACCEPT_DELAY1
+RX_WINDOW_US    = 100000                # time the receiver stays open without preamble
+ACK_TIMEOUT_US  = 2000000               # delay of the retransmission of a confirmed uplink without ack
+DECISION_US     = 200000                # the network server answers this long before RX1 (forwarders had time to push)
+BANDWIDTHS      = (125000, 250000, 500000)
+EU868_CHANNELS  = (868100000, 868300000, 868500000)
+
+Stats = namedtuple('Stats', ('rx_timestamp', 'rssi', 'snr', 'sfrx', 'sftx', 'tx_trials', 'tx_power',
+    'tx_time_on_air', 'tx_counter', 'tx_frequency'))
+
+
+class PathLoss:
+    """ Log-distance path loss with log-normal shadowing (defaults of the LoRaSim measurements, Bor et al. 2016) """
+
+    def __init__(self, pl0=127.41, d0=40.0, gamma=2.08, sigma=3.57, seed=1):
+        self.pl0, self.d0, self.gamma, self.sigma = pl0, d0, gamma, sigma
+        self.rnd = random.Random(seed)
+
+    def loss(self, distance):
+        return self.pl0 + 10 * self.gamma * math.log10(max(distance, 1.0) / self.d0) + self.rnd.gauss(0, self.sigma)
+
+
+class Transmission:
+    """ A frame on the air """
+
+    __slots__ = ('sender', 'start', 'end', 'frequency', 'sf', 'bw', 'power', 'phy', 'kind', 'info', 'rssi', 'heard')
+
+    def __init__(self, sender, start, end, frequency, sf, bw, phy, kind, info=None):
+        self.sender     = sender                # radio
+        self.start      = start                 # us
+        self.end        = end
+        self.frequency  = frequency
+        self.sf         = sf
+        self.bw         = bw
+        self.power      = TX_POWER
+        self.phy        = phy                   # PHY payload (bytes)
+        self.kind       = kind                  # 'join', 'uplink' or 'raw'
+        self.info       = info                  # LoRaWAN fields of the uplink (dict)
+        self.rssi       = {}                    # receiver -> rssi, drawn once per link
+        self.heard      = []                    # (rssi, snr, gateway) of the network server's receptions
+
+
+def distance(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+class Medium:
+    """
+    Keeps the frames on the air. When a frame ends it is received by every listening radio (same
+    frequency and SF) and network server gateway with an SNR above the demodulation floor, unless
+    a frame overlapping it on the same channel and SF is not CAPTURE_DB weaker. Frames of another
+    SF do not collide (orthogonal).
+    """
+
+    def __init__(self, kernel, server=None, pathloss=None):
+        self.kernel     = kernel
+        self.server     = server
+        self.pathloss   = pathloss or PathLoss()
+        self.radios     = []                    # raw LoRa radios (gateways)
+        self.air        = []                    # recent frames, for the collisions
+        self.frames     = 0
+        self.lost       = 0                     # receptions lost by collision
+
+    def transmit(self, tx):
+        self.air.append(tx)
+        self.frames += 1
+        if self.server is not None and tx.kind != 'raw':
+            self.server.started(tx)
+        self.kernel.at(tx.end, self._end, tx)
+
+    def rssi(self, tx, key, position):
+        if key not in tx.rssi:
+            tx.rssi[key] = tx.power - self.pathloss.loss(distance(tx.sender.device.position, position))
+        return tx.rssi[key]
+
+    def _received(self, tx, key, position):
+        """ Returns (rssi, snr) of tx at a receiver, None when it is too weak or lost in a collision """
+        rssi = self.rssi(tx, key, position)
+        snr = rssi - NOISE_FLOOR
+        if snr < SNR_FLOOR[tx.sf]:
+            return None
+        for other in self.air:
+            if (other is not tx and other.frequency == tx.frequency and other.sf == tx.sf
+                    and other.start < tx.end and other.end > tx.start
+                    and self.rssi(other, key, position) > rssi - CAPTURE_DB):
+                self.lost += 1
+                return None
+        return rssi, snr
+
+    def _end(self, tx):
+        for radio in self.radios:
+            if radio is not tx.sender and radio.listening(tx):
+                reception = self._received(tx, radio, radio.device.position)
+                if reception is not None:
+                    radio.receive(tx, *reception)
+        if self.server is not None and tx.kind != 'raw':
+            for i, position in enumerate(self.server.gateways):
+                reception = self._received(tx, ('gw', i), position)
+                if reception is not None:
+                    tx.heard.append(reception + (i,))
+        horizon = self.kernel.now - 10000000    # longer than the longest frame
+        self.air = [other for other in self.air if other.end > horizon]
+
+
+class NetworkServer:
+    """
+    LoRaWAN network server behind multi-channel gateways at fixed positions (and the packet
+    forwarders of emulated gateways): accepts the joins it hears, acks the confirmed uplinks and
+    sends the queued downlinks in RX1.
+    """
+
+    def __init__(self, kernel, gateways=((0.0, 0.0),)):
+        self.kernel     = kernel
+        self.gateways   = list(gateways)
+        self.sessions   = {}                    # dev_eui -> devaddr
+        self.fcnt       = {}                    # devaddr -> last frame counter
+        self.queue      = {}                    # dev_eui -> [(port, payload)]
+        self.pending    = {}                    # phy -> transmission waiting for the decision
+        self.uplinks    = []                    # (time_us, dev_eui, fcnt, port, payload, rssi, snr)
+        self.joins      = 0
+        self.acks       = 0
+        self.forwarded  = 0
+
+    def send(self, dev_eui, port, payload):
+        """ Queues a downlink for the next uplink of dev_eui (hex) """
+        self.queue.setdefault(dev_eui, []).append((port, bytes(payload)))
+
+    def started(self, tx):
+        self.pending[tx.phy] = tx
+        self.kernel.at(tx.end + (JOIN_DELAY_US if tx.kind == 'join' else RX1_DELAY_US) - DECISION_US, self._decide, tx)
+
+    def forward(self, phy, rssi, snr, gateway):
+        """ PUSH_DATA of a packet forwarder """
+        tx = self.pending.get(bytes(phy))
+        if tx is not None:
+            self.forwarded += 1
+            tx.heard.append((rssi, snr, gateway))
+
+    def _decide(self, tx):
+        self.pending.pop(tx.phy, None)
+        if not tx.heard:
+            return
+        rssi, snr, _ = max(tx.heard, key=lambda heard: heard[0])
+        info = tx.info
+        time_us = tx.end + (JOIN_DELAY_US if tx.kind == 'join' else RX1_DELAY_US)
+        if tx.kind == 'join':
+            devaddr = self.sessions.get(info['dev_eui'])
+            if devaddr is None:
+                devaddr = 0x26000000 | (len(self.sessions) + 1)
+                self.sessions[info['dev_eui']] = devaddr
+            self.fcnt[devaddr] = -1
+            self.joins += 1
+            self.kernel.at(time_us, tx.sender.downlink, tx, rssi, snr, devaddr, None, None, False)
+            return
+        devaddr = info['devaddr']
+        if info['fcnt'] <= self.fcnt.get(devaddr, -1):
+            return                              # retransmission of a received uplink: answered already
+        self.fcnt[devaddr] = info['fcnt']
+        self.uplinks.append((tx.end, info['dev_eui'], info['fcnt'], info['port'], info['payload'], rssi, snr))
+        queued = self.queue.get(info['dev_eui'])
+        port, payload = queued.pop(0) if queued else (None, None)
+        if info['confirmed'] or port is not None:
+            self.acks += info['confirmed']
+            self.kernel.at(time_us, tx.sender.downlink, tx, rssi, snr, None, port, payload, info['confirmed'])
+
+
+class LoRa:
+    """ network.LoRa of the pycom firmware: one radio per device, LoRaWAN (class A) or raw LoRa mode """
+
+    LORA, LORAWAN                   = 0, 1
+    OTAA, ABP                       = 0, 1
+    CLASS_A, CLASS_B, CLASS_C       = 0, 1, 2
+    AS923, AU915, EU868, US915      = 0, 1, 5, 6
+    BW_125KHZ, BW_250KHZ, BW_500KHZ = 0, 1, 2
+    CODING_4_5, CODING_4_6, CODING_4_7, CODING_4_8 = 1, 2, 3, 4
+    ALWAYS_ON, TX_ONLY, SLEEP       = 0, 1, 2
+    RX_PACKET_EVENT                 = 0x01
+    TX_PACKET_EVENT                 = 0x02
+    TX_FAILED_EVENT                 = 0x04
+
+    def __new__(cls, *args, **kwargs):
+        device = runtime.device()
+        if device.lora is None:
+            device.lora = super().__new__(cls)
+            device.lora._setup(device)
+        return device.lora
+
+    def __init__(self, mode=LORAWAN, region=EU868, frequency=868100000, tx_power=TX_POWER, bandwidth=BW_125KHZ,
+            sf=7, preamble=8, coding_rate=CODING_4_5, power_mode=ALWAYS_ON, tx_iq=False, rx_iq=False, adr=False,
+            public=True, tx_retries=2, device_class=CLASS_A):
+        self.init(mode, region, frequency, tx_power, bandwidth, sf, preamble, coding_rate, power_mode, tx_iq, rx_iq,
+            adr, public, tx_retries, device_class)
+
+    def _setup(self, device):
+        self.device         = device
+        self.medium         = device.medium
+        self.handler        = None
+        self.trigger        = 0
+        self.pending        = 0                 # events not read yet
+        self.channels       = dict(enumerate(EU868_CHANNELS))
+        self.joined         = False
+        self.join_start     = 0                 # time of the OTAA join() (us)
+        self.devaddr        = 0
+        self.fcnt           = 0
+        self.rx_frames      = []                # received (payload, port)
+        self.cycle          = None              # uplink waiting for the end of its RX windows
+        self.busy_until     = 0                 # end of the frame being sent
+        self.stats_values   = dict(rx_timestamp=0, rssi=0, snr=0.0, sfrx=0, sftx=0, tx_trials=0, tx_power=TX_POWER,
+            tx_time_on_air=0, tx_counter=0, tx_frequency=0)
+        self.medium.radios.append(self)
+
+    def init(self, mode=LORAWAN, region=EU868, frequency=868100000, tx_power=TX_POWER, bandwidth=BW_125KHZ, sf=7,
+            preamble=8, coding_rate=CODING_4_5, power_mode=ALWAYS_ON, tx_iq=False, rx_iq=False, adr=False,
+            public=True, tx_retries=2, device_class=CLASS_A):
+        self.mode           = mode
+        self.frequency_hz   = frequency
+        self.sf_value       = sf
+        self.bw             = BANDWIDTHS[bandwidth]
+        self.power          = power_mode
+        self.adr            = adr
+        self.tx_retries     = tx_retries
+        self.device_class   = device_class
+
+    # --- configuration ------------------------------------------------------------------------
+    def frequency(self, frequency=None):
+        if frequency is None:
+            return self.frequency_hz
+        self.frequency_hz = frequency
+
+    def sf(self, sf=None):
+        if sf is None:
+            return self.sf_value
+        self.sf_value = sf
+
+    def power_mode(self, mode=None):
+        if mode is None:
+            return self.power
+        self.power = mode
+
+    def mac(self):
+        return self.device.eui
+
+    def add_channel(self, index, frequency, dr_min=0, dr_max=5):
+        self.channels[index] = frequency
+
+    def remove_channel(self, index):
+        self.channels.pop(index, None)
+
+    def callback(self, trigger, handler=None, arg=None):
+        self.trigger, self.handler = (trigger or 0), handler
+
+    def events(self):
+        events, self.pending = self.pending, 0
+        return events
+
+    def stats(self):
+        return Stats(**self.stats_values)
+
+    def has_joined(self):
+        return self.joined
+
+    def nvram_save(self):
+        self.device.nvram['lora'] = (self.joined, self.devaddr, self.fcnt, dict(self.channels))
+
+    def nvram_restore(self):
+        saved = self.device.nvram.get('lora')
+        if saved is not None:
+            self.joined, self.devaddr, self.fcnt, channels = saved
+            self.channels = dict(channels)
+
+    def nvram_erase(self):
+        self.device.nvram.pop('lora', None)
+
+    # --- radio --------------------------------------------------------------------------------
+    def listening(self, tx):
+        return (self.mode == self.LORA and self.power == self.ALWAYS_ON and self.frequency_hz == tx.frequency
+            and self.sf_value == tx.sf and self.busy_until <= tx.start)
+
+    def receive(self, tx, rssi, snr):
+        """ Raw LoRa mode: a frame heard by the radio """
+        self.rx_frames.append((tx.phy, None))
+        self.stats_values.update(rx_timestamp=runtime.kernel.now & 0xffffffff, rssi=int(rssi), snr=round(snr, 1),
+            sfrx=tx.sf)
+        self.device.trace('rx', tx.start, tx.end)
+        self.fire(self.RX_PACKET_EVENT)
+
+    def fire(self, events):
+        self.pending |= events
+        if self.handler is not None and self.trigger & events:
+            self.device.irq(self.handler, self)
+
+    def _frame(self, size, sf, frequency, phy, kind, info=None):
+        kernel = runtime.kernel
+        toa = airtime.time_on_air(size, sf, self.bw)
+        tx = Transmission(self, kernel.now, kernel.now + int(toa * 1000), frequency, sf, self.bw, phy, kind, info)
+        self.busy_until = tx.end
+        self.stats_values.update(sftx=sf, tx_time_on_air=int(toa), tx_frequency=frequency)
+        self.device.trace('tx', tx.start, tx.end, sf)
+        self.medium.transmit(tx)
+        return tx
+
+    def send_raw(self, data):
+        """ Raw LoRa mode: sends data now, TX_PACKET_EVENT at its end """
+        tx = self._frame(len(data), self.sf_value, self.frequency_hz, bytes(data), 'raw')
+        runtime.kernel.at(tx.end, self.fire, self.TX_PACKET_EVENT)
+        return tx
+
+    # --- LoRaWAN ------------------------------------------------------------------------------
+    def join(self, activation=OTAA, auth=None, timeout=None, dr=None):
+        kernel = runtime.kernel
+        if activation == self.ABP:
+            devaddr = auth[0]
+            self.devaddr = int(devaddr, 16) if isinstance(devaddr, str) else struct.unpack('>I', bytes(devaddr))[0]
+            self.joined = True
+            return
+        self.joined = False
+        dr = 0 if dr is None else dr
+        self.join_tx = None
+        self.join_start = kernel.now
+        self._join_request(dr)
+        if timeout is None:
+            return                              # joining in the background, has_joined() tells
+        if not kernel.wait(lambda: self.joined, 50000, timeout * 1000):
+            raise OSError('timeout')
+
+    def _join_request(self, dr):
+        sf, bw = airtime.EU868_DATARATES[dr]
+        nonce = self.device.rng.getrandbits(16)
+        phy = b'\x00' + bytes(8) + self.device.eui + struct.pack('<H', nonce) + bytes(4)
+        self.join_tx = self._frame(len(phy), sf, self._channel(), phy, 'join', {'dev_eui': self.device.eui.hex()})
+        self._windows(self.join_tx, JOIN_DELAY_US)
+        # no join-accept in RX1/RX2: the stack sends a new join-request
+        runtime.kernel.at(self.join_tx.end + JOIN_DELAY_US + RX1_DELAY_US + RX_WINDOW_US + ACK_TIMEOUT_US,
+            self._join_retry, self.join_tx, dr, self.device.generation)
+
+    def _windows(self, tx, delay_us):
+        """ Traces the receive windows of tx (RX1 after delay_us, RX2 a second later), open without a downlink """
+        for start in (tx.end + delay_us, tx.end + delay_us + RX2_DELAY_US - RX1_DELAY_US):
+            self.device.trace('rx', start, start + RX_WINDOW_US)
+
+    def _join_retry(self, tx, dr, generation):
+        if generation == self.device.generation and not self.joined and self.join_tx is tx:
+            self._join_request(dr)
+
+    def _channel(self):
+        return self.device.rng.choice(list(self.channels.values()))
+
+    def send_uplink(self, data, port, dr, confirmed, blocking):
+        """ LoRaWAN uplink from the socket, the events follow the RX windows """
+        if not self.joined:
+            raise OSError('not joined')
+        if len(data) > airtime.max_payload(dr):
+            raise OSError(90, 'EMSGSIZE')
+        kernel = runtime.kernel
+        if self.cycle is not None:              # the stack is busy with the previous uplink
+            if not blocking:
+                raise OSError(errno.EAGAIN)     # like the stack: a non-blocking socket does not wait
+            kernel.wait(lambda: self.cycle is None, 10000)
+        self.cycle = {'data': bytes(data), 'port': port, 'dr': dr, 'confirmed': confirmed, 'trials': 0,
+            'fcnt': self.fcnt}
+        self.fcnt += 1
+        self._uplink()
+        if blocking:                            # like the stack: until the confirmation at the end of the RX windows
+            kernel.wait(lambda: self.cycle is None, 10000)
+
+    def _uplink(self):
+        cycle = self.cycle
+        sf, _ = airtime.EU868_DATARATES[cycle['dr']]
+        mhdr = 0x80 if cycle['confirmed'] else 0x40
+        phy = struct.pack('<BIBHB', mhdr, self.devaddr, 0, cycle['fcnt'] & 0xffff, cycle['port']) + cycle['data'] + bytes(4)
+        info = {'dev_eui': self.device.eui.hex(), 'devaddr': self.devaddr, 'fcnt': cycle['fcnt'], 'port': cycle['port'],
+            'payload': cycle['data'], 'confirmed': cycle['confirmed']}
+        cycle['trials'] += 1
+        tx = self._frame(len(phy), sf, self._channel(), phy, 'uplink', info)
+        self._windows(tx, RX1_DELAY_US)
+        self.stats_values.update(tx_trials=cycle['trials'], tx_counter=cycle['fcnt'])
+        cycle['tx'] = tx
+        runtime.kernel.at(tx.end + RX2_DELAY_US + RX_WINDOW_US, self._windows_closed, tx, self.device.generation)
+        return tx
+
+    def downlink(self, tx, rssi, snr, devaddr, port, payload, ack):
+        """ Network server side: a downlink (join-accept, ack and/or data) received in RX1 of tx """
+        if tx.sender is not self:
+            return
+        self.stats_values.update(rx_timestamp=runtime.kernel.now & 0xffffffff, rssi=int(rssi), snr=round(snr, 1),
+            sfrx=tx.sf)
+        if tx.kind == 'join':
+            if self.join_tx is tx:
+                self.joined, self.devaddr, self.fcnt = True, devaddr, 0
+                self.device.trace('join', self.join_start, runtime.kernel.now)
+            return
+        cycle = self.cycle
+        if cycle is None or cycle.get('tx') is not tx:
+            return
+        events = self.TX_PACKET_EVENT
+        if port is not None:
+            self.rx_frames.append((payload, port))
+            events |= self.RX_PACKET_EVENT
+        self.cycle = None
+        self.fire(events)
+
+    def _windows_closed(self, tx, generation):
+        """ RX2 closed without downlink """
+        cycle = self.cycle
+        if generation != self.device.generation or cycle is None or cycle.get('tx') is not tx:
+            return
+        if cycle['confirmed'] and cycle['trials'] <= self.tx_retries:
+            runtime.kernel.after(ACK_TIMEOUT_US, self._retransmit, tx)
+            return
+        self.cycle = None
+        self.fire(self.TX_FAILED_EVENT if cycle['confirmed'] else self.TX_PACKET_EVENT)
+
+    def _retransmit(self, tx):
+        if self.cycle is not None and self.cycle.get('tx') is tx:
+            self._uplink()
+
+    def recv_frame(self):
+        return self.rx_frames.pop(0) if self.rx_frames else None
@@ -0,0 +1,19 @@
+""" The kernel the emulated MicroPython modules run against, set by install() """
+
+import builtins
+
+kernel = None
+host_open = builtins.open               # open() of the host, install() replaces the builtin
+
+
+def device():
+    """ Returns the device whose code is running """
+    return kernel.device()
+
+
+def open(path, *args, **kwargs):
+    """ open() of the emulation: the /flash and /sd paths of a device are in its own directory """
+    current = kernel.device() if kernel is not None else None
+    if current is None or not isinstance(path, str):
+        return host_open(path, *args, **kwargs)
+    return current.open(path, *args, **kwargs)
@@ -0,0 +1,24 @@
+""" ubinascii of MicroPython (the bytes of b2a_base64 end with a newline) """
+
+import binascii as _binascii
+
+from .buffers import Bytes
+
+
+def hexlify(data, sep=None):
+    return Bytes(_binascii.hexlify(data) if sep is None else _binascii.hexlify(data, sep))
+
+
+def unhexlify(data):
+    return Bytes(_binascii.unhexlify(data))
+
+
+def b2a_base64(data):
+    return Bytes(_binascii.b2a_base64(data))
+
+
+def a2b_base64(data):
+    return Bytes(_binascii.a2b_base64(data))
+
+
+crc32 = _binascii.crc32
@@ -0,0 +1,27 @@
+""" ujson of MicroPython """
+
+import json as _json
+
+from .buffers import Text
+
+
+def _default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode()
+    raise TypeError(repr(value))
+
+
+def dumps(value):
+    return Text(_json.dumps(value, separators=(',', ':'), default=_default))
+
+
+def loads(text):
+    return _json.loads(bytes(text).decode() if isinstance(text, (bytes, bytearray, memoryview)) else text)
+
+
+def dump(value, stream):
+    stream.write(dumps(value))
+
+
+def load(stream):
+    return loads(stream.read())
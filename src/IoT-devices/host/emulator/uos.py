@@ -0,0 +1,34 @@
+""" uos of MicroPython: random bytes of the device, the files of /flash in the device's directory """
+
+import os as _os
+
+from . import runtime
+
+
+def urandom(n):
+    return bytes(runtime.device().rng.getrandbits(8) for _ in range(n))
+
+
+def remove(path):
+    _os.remove(runtime.device().path(path))
+
+
+def listdir(path='/flash'):
+    path = runtime.device().path(path)
+    return sorted(_os.listdir(path)) if _os.path.isdir(path) else []
+
+
+def mkdir(path):
+    _os.makedirs(runtime.device().path(path), exist_ok=True)
+
+
+def stat(path):
+    return tuple(_os.stat(runtime.device().path(path)))[:10]
+
+
+def uname():
+    return ('FiPy', 'FiPy', '1.20.2.r4', 'v1.11', 'FiPy with ESP32', '1.20.2.r4')
+
+
+def dupterm(stream=None, index=0):
+    return None
@@ -0,0 +1,150 @@
+""" usocket of the pycom firmware: LoRa sockets on the device's radio, UDP to a Semtech packet forwarder endpoint """
+
+import base64
+import errno
+import json
+
+from . import runtime
+
+AF_INET, AF_LORA                = 2, 160
+SOCK_STREAM, SOCK_DGRAM, SOCK_RAW = 1, 2, 3
+IPPROTO_TCP, IPPROTO_UDP        = 6, 17
+SOL_SOCKET, SOL_LORA            = 0xfff, 0x1ff
+SO_REUSEADDR                    = 4
+SO_CONFIRMED, SO_DR             = 0x100, 0x101
+UDP_LATENCY_US                  = 30000     # gateway <-> network server
+SERVER_ADDRESS                  = '10.0.0.1'
+
+# Semtech UDP protocol (packet forwarder <-> network server)
+PUSH_DATA, PUSH_ACK, PULL_DATA, PULL_RESP, PULL_ACK, TX_ACK = 0, 1, 2, 3, 4, 5
+
+
+class timeout(OSError):
+    pass
+
+
+error = OSError
+
+
+def getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+    return [(AF_INET, SOCK_DGRAM, IPPROTO_UDP, '', (SERVER_ADDRESS, port))]
+
+
+def socket(family=AF_INET, type=SOCK_STREAM, proto=0):
+    if family == AF_LORA:
+        return LoRaSocket()
+    if type == SOCK_DGRAM:
+        return UDPSocket()
+    raise OSError(errno.EOPNOTSUPP, 'only LoRa and UDP sockets are emulated')
+
+
+class _Socket:
+    def __init__(self):
+        self.device     = runtime.device()
+        self.blocking   = True
+        self.timeout_us = None
+
+    def setblocking(self, flag):
+        self.blocking, self.timeout_us = bool(flag), None
+
+    def settimeout(self, value):
+        if value is None:
+            self.setblocking(True)
+        else:
+            self.blocking, self.timeout_us = value > 0, int(value * 1000000)
+
+    def _wait(self, ready):
+        """ Blocks per the socket mode until ready(), raises EAGAIN or timeout """
+        if ready():
+            return
+        if not self.blocking:
+            raise OSError(errno.EAGAIN)
+        if not runtime.kernel.wait(ready, 10000, self.timeout_us):
+            raise timeout('timed out')
+
+    def close(self):
+        pass
+
+
+class LoRaSocket(_Socket):
+    """ LoRaWAN uplinks and downlinks (FPort, SO_DR, SO_CONFIRMED), or raw LoRa frames """
+
+    def __init__(self):
+        super().__init__()
+        self.lora       = self.device.lora
+        self.port       = 2
+        self.dr         = 5
+        self.confirmed  = False
+
+    def setsockopt(self, level, option, value):
+        if option == SO_DR:
+            self.dr = int(value)
+        elif option == SO_CONFIRMED:
+            self.confirmed = bool(value)
+
+    def bind(self, port):
+        self.port = port
+
+    def send(self, data):
+        data = bytes(data, 'utf-8') if isinstance(data, str) else bytes(data)
+        if self.lora.mode == self.lora.LORAWAN:
+            self.lora.send_uplink(data, self.port, self.dr, self.confirmed, self.blocking)
+        else:
+            self.lora.send_raw(data)
+        return len(data)
+
+    def recvfrom(self, size):
+        frame = self.lora.recv_frame()
+        if frame is None:
+            return b'', None
+        payload, port = frame
+        return payload[:size], port
+
+    def recv(self, size):
+        return self.recvfrom(size)[0]
+
+
+class UDPSocket(_Socket):
+    """
+    UDP socket of a packet forwarder: PUSH_DATA (rxpk) is handed to the network server of the
+    medium and acked, PULL_DATA is acked. The server sends its downlinks itself.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.inbox      = []                    # (datagram, address)
+
+    def setsockopt(self, level, option, value):
+        pass
+
+    def bind(self, address):
+        pass
+
+    def sendto(self, data, address):
+        data = bytes(data)
+        version, token, kind = data[0], data[1:3], data[3]
+        kernel = runtime.kernel
+        if kind == PUSH_DATA:
+            document = json.loads(data[12:].decode())
+            server = self.device.medium.server
+            for rxpk in document.get('rxpk', ()):
+                if server is not None:
+                    server.forward(base64.b64decode(rxpk['data']), rxpk['rssi'], rxpk['lsnr'], data[4:12].hex())
+            self._answer(kernel, bytes([version]) + token + bytes([PUSH_ACK]), address)
+        elif kind == PULL_DATA:
+            self._answer(kernel, bytes([version]) + token + bytes([PULL_ACK]), address)
+        return len(data)
+
+    def _answer(self, kernel, datagram, address):
+        kernel.after(UDP_LATENCY_US, self.inbox.append, (datagram, address))
+
+    def recvfrom(self, size):
+        self._wait(lambda: self.inbox)
+        datagram, address = self.inbox.pop(0)
+        return datagram[:size], address
+
+    def recv(self, size):
+        return self.recvfrom(size)[0]
+
+    def send(self, data):
+        return self.sendto(data, (SERVER_ADDRESS, 1700))
@@ -0,0 +1,58 @@
+""" utime of MicroPython on the virtual clock: the ticks cost CPU time, the sleeps suspend the task """
+
+import time as _time
+
+from . import runtime
+
+TICKS_PERIOD    = 1 << 30               # the MicroPython ticks wrap at 2**30
+EPOCH           = 1609459200            # time() at the start of the emulation (2021-01-01, after an NTP sync)
+
+
+def ticks_us():
+    kernel = runtime.kernel
+    kernel.cpu()
+    return kernel.now & (TICKS_PERIOD - 1)
+
+
+def ticks_ms():
+    kernel = runtime.kernel
+    kernel.cpu()
+    return (kernel.now // 1000) & (TICKS_PERIOD - 1)
+
+
+ticks_cpu = ticks_us
+
+
+def ticks_diff(new, old):
+    return ((new - old + TICKS_PERIOD // 2) & (TICKS_PERIOD - 1)) - TICKS_PERIOD // 2
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & (TICKS_PERIOD - 1)
+
+
+def sleep_us(us):
+    runtime.kernel.sleep_us(int(us))
+
+
+def sleep_ms(ms):
+    runtime.kernel.sleep_us(int(ms * 1000))
+
+
+def sleep(s):
+    runtime.kernel.sleep_us(int(s * 1000000))
+
+
+def time():
+    return EPOCH + runtime.kernel.now // 1000000
+
+
+def localtime(secs=None):
+    return _time.gmtime(time() if secs is None else secs)[:8]
+
+
+gmtime = localtime
+
+
+def __getattr__(name):                  # the modules imported as time by CPython code (e.g. perf_counter)
+    return getattr(_time, name)
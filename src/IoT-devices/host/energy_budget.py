@@ -0,0 +1,283 @@
+""" Energy per reported LAeq and battery life of NoiseNode configurations, from profile uplinks, the emulator or defaults (CPython) """
+
+import argparse
+import binascii
+import os
+import struct
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'node'))
+import airtime
+import energy
+import profiler
+from energy import Energy
+from bench_batching import batched_payloads
+from replay_events import synthetic_levels
+from bench_codec import interval_levels
+
+PRIORITY = ('tx', 'rx', 'sample', 'join', 'boot', 'sleep')     # phase of overlapping timeline segments, else 'cpu'
+
+
+def bucket_time(i):
+    """ Typical duration (s) of a profiler bucket: geometric middle of its range """
+    low, high = profiler.bucket_range(i)
+    if high is None:
+        return 1.5 * low / 1000
+    return (max(low, 1) * high) ** 0.5 / 1000
+
+
+def profile_timings(payloads):
+    """ Returns the average time (s) per wake-up cycle of the profiler phases, from the median bucket of the uplinks """
+    cycles, totals = 0, {}
+    for data in payloads:
+        n, phases = profiler.decode(data)
+        cycles += n
+        for phase, (count, p50, p90, low, high) in phases.items():
+            totals[phase] = totals.get(phase, 0.0) + count * bucket_time(p50)
+    return {phase: total / max(cycles, 1) for phase, total in totals.items()}
+
+
+def timeline_energy(device, end_us, account):
+    """
+    Accounts the timeline of an emulated device: the segments (boot, join, sample, tx per SF, rx, sleep)
+    by PRIORITY where they overlap, 'cpu' for the awake time outside them, with the radios powered.
+    """
+    points = []
+    for kind, start, end, detail in device.timeline:
+        if start > end_us:
+            continue
+        if kind == 'radio':
+            points.append((start, kind, detail))
+        else:
+            name = 'tx SF%i' % detail if kind == 'tx' else kind
+            points.append((start, name, 1))
+            points.append((min(end, end_us), name, -1))
+    points.sort(key=lambda point: point[0])
+    active, radios, previous = {}, set(), None
+    for t, name, value in points + [(end_us, None, None)]:
+        if previous is not None and t > previous:
+            phase = 'cpu'
+            for kind in PRIORITY:
+                names = [n for n, count in active.items() if count > 0 and n.split()[0] == kind]
+                if names:
+                    phase = names[0]
+                    break
+            account.add(phase, (t - previous) / 1e6, sorted(radios))
+        if name == 'radio':
+            radio, on = value
+            (radios.add if on else radios.discard)(radio)
+        elif name is not None:
+            active[name] = active.get(name, 0) + value
+            if previous is None and name == 'boot':
+                previous = t                # the device draws from its first boot
+        if previous is not None:
+            previous = t
+    account.cycles = device.boots
+    account.uplinks = sum(1 for kind, start, _, _ in device.timeline if kind == 'tx' and start <= end_us)
+    account.reports = sum(1 for kind, start, end, _ in device.timeline
+        if kind == 'sample' and start <= end_us and end - start >= 500000)   # measurements of a LAeq
+
+
+def emulated(args, deinits):
+    """ Runs a node per RADIO_PARAMETERS deinit setting on the emulator, returns their (Energy, Device) """
+    import emulator
+    kernel = emulator.Kernel()
+    server = emulator.NetworkServer(kernel, gateways=[(0.0, 0.0)])
+    medium = emulator.Medium(kernel, server, emulator.PathLoss(seed=args.seed))
+    emulator.install(kernel)
+    nodes = []
+    for i, deinit in enumerate(deinits):
+        overrides = {'config': {
+            'DEBUG': False,
+            'DEEPSLEEP_TIME': int(args.sleep),
+            'SENSOR_PARAMETERS': {'interval': args.interval},
+            'LORA_PARAMETERS': {'dr': args.dr},
+            'BATCH_PARAMETERS': {'enabled': args.batch > 1, 'size': args.batch, 'max_latency': args.max_latency},
+            'RADIO_PARAMETERS': {'deinit': deinit},
+            }}
+        node = emulator.Device(kernel, medium, 'node-%i' % (i + 1), os.path.join(ROOT, 'node'),
+            position=(args.distance, 0.0), overrides=overrides)
+        node.power_on(i * 1000000)
+        nodes.append(node)
+    end_us = int(args.duration * 1e6)
+    kernel.run(end_us)
+    results = []
+    for node in nodes:
+        account = Energy()
+        timeline_energy(node, end_us, account)
+        if node.error:
+            print('%s: %s' % (node.name, node.error))
+        results.append((account, node))
+    kernel.close()
+    return results
+
+
+def deinit_costs(node):
+    """ Returns the deinit time (s) of every radio the node switched off, from its NVS record """
+    import radios
+    data = persist_entry(node, 'radios_off')
+    if data is None:
+        return {}
+    entry = struct.unpack(radios.ENTRY, data)
+    return {radios.RADIOS[i]: entry[1 + i] / 1e6 for i in range(len(radios.RADIOS)) if entry[0] & (1 << i)}
+
+
+def persist_entry(node, key):
+    """ Bytes persist.save() stored in the NVS of an emulated device """
+    value = node.nvs.get(key)
+    return binascii.unhexlify(value) if isinstance(value, str) else None
+
+
+def overheads(args, source):
+    """ Returns (boot, awake) s per wake-up besides sampling and the uplink, from the source of the timings """
+    if isinstance(source, Energy):
+        waiting = source.uplinks * (energy.RX_DELAYS[1] - energy.window(args.dr))
+        cycles = max(source.cycles, 1)
+        return source.time.get('boot', 0.0) / cycles, max(0.0, source.time.get('cpu', 0.0) - waiting) / cycles
+    if source:
+        uplink = energy.RX_DELAYS[1] + energy.window(energy.RX2_DR) + airtime.uplink_time_on_air(args.payload, args.dr) / 1000
+        return args.boot, source.get('radio', 0.0) + source.get('sleep', 0.0) + max(0.0, source.get('uplink', 0.0) - uplink)
+    return args.boot, args.awake
+
+
+def profiled(args, timings):
+    """ Energy of one wake-up cycle of the profiled phases """
+    account = Energy()
+    radios, sleep_radios = args.radios, args.sleep_radios
+    account.add('boot', args.boot, radios)
+    account.add('cpu', timings.get('radio', 0.0) + timings.get('sleep', 0.0) + timings.get('radios', 0.0), radios)
+    if timings.get('join'):
+        account.add('join', timings['join'], radios)
+    account.add('sample', timings.get('sensor', 0.0), radios)
+    account.uplink(args.payload, args.dr, radios)
+    _, awake = overheads(args, timings)
+    account.add('cpu', awake - timings.get('radio', 0.0) - timings.get('sleep', 0.0), radios)
+    account.add('sleep', args.sleep, sleep_radios)
+    account.cycles = account.reports = 1
+    return account
+
+
+def batch_summaries(size, max_latency, cycle):
+    """ Summaries per uplink of a batch of size, Batch.due() sending it before its oldest summary exceeds max_latency """
+    count = 1
+    while count < size and (count + 1) * cycle <= max_latency:
+        count += 1
+    return count
+
+
+def ranking(args, boot, awake):
+    """ Returns rows (J per LAeq, dr, batch, interval, payload, uplinks/h, mA, days, duty ok, capped) of the configurations,
+    cheapest first. The batch sizes that max_latency caps to the same number of summaries per uplink are ranked once,
+    as the capped batch """
+    levels, _ = synthetic_levels(args.hours, 2.0, args.seed)
+    rows = []
+    for interval in args.intervals:
+        summaries = interval_levels(levels, interval)
+        cycle = interval + args.sleep
+        ranked = set()
+        for requested in sorted(args.batches):
+            size = batch_summaries(requested, args.max_latency, cycle)
+            if size in ranked:
+                continue
+            ranked.add(size)
+            sizes = batched_payloads(summaries, size, args.max_latency, cycle)
+            payload = sum(sizes) / len(sizes)
+            for dr in args.drs:
+                if max(sizes) > airtime.max_payload(dr):
+                    continue
+                account = Energy()
+                for _ in summaries:
+                    account.wake_up(interval, args.sleep, None, dr, boot, awake, args.radios, args.sleep_radios)
+                for bytes_ in sizes:
+                    account.uplink(bytes_, dr, args.radios)
+                duty = airtime.uplink_time_on_air(max(sizes), dr) / 1000 / airtime.DUTY_CYCLE
+                rows.append((account.per_report(args.voltage), dr, size, interval, payload,
+                    3600 * len(sizes) / (len(summaries) * cycle), account.current(),
+                    account.battery_life(args.capacity), duty <= cycle * size, size < requested))
+    rows.sort()
+    return rows
+
+
+def print_account(account, args):
+    print('%-9s %10s %10s %7s' % ('phase', 'time (s)', 'mAs', 'charge'))
+    for phase, seconds, charge, share in account.report():
+        print('%-9s %10.2f %10.1f %6.1f%%' % (phase, seconds, charge, 100 * share))
+    print('%i wake-ups, %i LAeq reports: %.1f mJ per LAeq, %.3f mA on average, battery of %i mAh: %.0f days' % (
+        account.cycles, account.reports, 1000 * (account.per_report(args.voltage) or 0), account.current(),
+        args.capacity, account.battery_life(args.capacity)))
+
+
+def numbers(text, kind=int):
+    return [kind(value) for value in text.split(',') if value]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--profile', nargs='+', default=[], help='profile uplinks (hex, or base64 with --base64)')
+    parser.add_argument('--base64', action='store_true')
+    parser.add_argument('--emulate', action='store_true', help='timings of a node run on the host emulator')
+    parser.add_argument('--duration', type=float, default=3600, help='virtual time of the emulation (s)')
+    parser.add_argument('--distance', type=float, default=50, help='node to gateway in the emulation (m)')
+    parser.add_argument('--sleep', type=float, default=600, help='DEEPSLEEP_TIME (s)')
+    parser.add_argument('--interval', type=float, default=10, help='measuring time per wake-up (s)')
+    parser.add_argument('--dr', type=int, default=5)
+    parser.add_argument('--batch', type=int, default=1, help='summaries per uplink of the emulated node')
+    parser.add_argument('--max-latency', type=float, default=3600)
+    parser.add_argument('--payload', type=int, default=7, help='payload of the profiled uplinks (bytes)')
+    parser.add_argument('--boot', type=float, default=0.8, help='firmware boot, not timed by the profiler (s)')
+    parser.add_argument('--awake', type=float, default=0.5, help='awake time besides sampling and the uplink, without timings (s)')
+    parser.add_argument('--radios', default='LTE,WLAN', help='radios left on while awake (the firmware starts both)')
+    parser.add_argument('--sleep-radios', default='LTE', help='radios powered during deepsleep')
+    parser.add_argument('--deinit', action='store_true', help='RADIO_PARAMETERS deinit: no radio left on in the model, '
+        'the emulation compares a node with and without it')
+    parser.add_argument('--voltage', type=float, default=energy.VOLTAGE)
+    parser.add_argument('--capacity', type=float, default=energy.CAPACITY, help='battery (mAh)')
+    parser.add_argument('--drs', default='0,1,2,3,4,5')
+    parser.add_argument('--batches', default='1,3,6,12')
+    parser.add_argument('--intervals', default='5,10,30')
+    parser.add_argument('--hours', type=float, default=6, help='synthetic trace of the batch payload sizes')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+    args.radios, args.sleep_radios = tuple(numbers(args.radios, str)), tuple(numbers(args.sleep_radios, str))
+    if args.deinit:
+        args.radios = args.sleep_radios = ()
+    args.drs, args.batches, args.intervals = numbers(args.drs), numbers(args.batches), numbers(args.intervals, float)
+
+    if args.profile:
+        data = [binascii.a2b_base64(p) if args.base64 else binascii.unhexlify(p) for p in args.profile]
+        source = profile_timings(data)
+        print('profiled phases per wake-up: %s' % ', '.join('%s %.3f s' % item for item in source.items()))
+        print_account(profiled(args, source), args)
+    elif args.emulate:
+        results = emulated(args, (False, True) if args.deinit else (False,))
+        source = results[-1][0]
+        for account, node in results:
+            print('emulated %s%s, %g s of virtual time' % (node.name, ' (radios switched off)' if node is not results[0][1] else '',
+                args.duration))
+            print_account(account, args)
+        if args.deinit:
+            costs = deinit_costs(results[1][1])
+            once = sum(costs.values()) * energy.CURRENTS['cpu']
+            saved = results[0][0].current() - results[1][0].current()
+            print('\nradio deinit: %s once (%.0f mAs), saving %.3f mA on average: paid back after %.0f s, battery %.0f -> %.0f days' % (
+                ', '.join('%s %.2f s' % item for item in costs.items()), once, saved, once / saved if saved > 0 else float('inf'),
+                results[0][0].battery_life(args.capacity), results[1][0].battery_life(args.capacity)))
+    else:
+        source = None
+    boot, awake = overheads(args, source)
+
+    print('\nconfigurations by energy per LAeq (boot %.2f s, awake %.2f s, radios on: %s, in deepsleep: %s)' % (
+        boot, awake, ','.join(args.radios) or '-', ','.join(args.sleep_radios) or '-'))
+    print('%3s %6s %9s %8s %10s %9s %9s %8s %5s' % ('dr', 'batch', 'interval', 'payload', 'uplinks/h', 'mJ/LAeq', 'mA', 'days', 'duty'))
+    rows = ranking(args, boot, awake)[:args.top]
+    for joules, dr, size, interval, payload, rate, current, days, duty, capped in rows:
+        print('%3i %5i%s %8gs %7.1fB %10.2f %9.1f %9.3f %8.0f %5s' % (dr, size, '*' if capped else ' ', interval, payload, rate,
+            1000 * joules, current, days, 'ok' if duty else 'over'))
+    if any(row[-1] for row in rows):
+        print('* larger batches capped by --max-latency %g s' % args.max_latency)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+""" Builds the node's calibration tables (calibration.py) from reference measurements in CSV (CPython)
+
+CSV rows (no header):
+    adc,<reference code>,<measured code>      ADC linearity, e.g. a DC sweep measured with a voltmeter
+    level,<reference dB SPL>,<measured dB>    reference sound level against the node's uncalibrated level (cal_offset 0)
+    bias,<code>                               ADC code of the microphone's dc-bias in silence
+Upload the resulting file to the node as /flash/cal.bin.
+"""
+
+import argparse
+import csv
+import os
+import sys
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'node'))
+from calibration import Calibration, N_CODES, N_LEVELS, LEVEL_BASE, LEVEL_STEP
+
+
+def interpolate(points, x):
+    """ Piecewise-linear interpolation through sorted (x, y) points, extrapolating with the end segments """
+    if len(points) == 1:
+        return points[0][1] + (x - points[0][0])
+    for i in range(1, len(points) - 1):
+        if x < points[i][0]:
+            break
+    else:
+        i = len(points) - 1
+    (x0, y0), (x1, y1) = points[i - 1], points[i]
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+def read_points(path):
+    adc, level, bias = [], [], None
+    with open(path, newline='') as fp:
+        for row in csv.reader(fp):
+            if not row or row[0].startswith('#'):
+                continue
+            kind = row[0].strip()
+            if kind == 'adc':
+                adc.append((float(row[2]), float(row[1])))          # measured -> reference
+            elif kind == 'level':
+                level.append((float(row[2]), float(row[1])))        # uncalibrated -> reference dB SPL
+            elif kind == 'bias':
+                bias = float(row[1])
+            else:
+                raise ValueError('unknown row type: %s' % kind)
+    return sorted(adc), sorted(level), bias
+
+
+def fit(adc, level, bias):
+    """ Returns the dense Calibration tables of the measured points """
+    if adc:
+        codes = [int(round(interpolate(adc, raw) - bias)) for raw in range(N_CODES)]
+    else:
+        codes = [int(round(raw - bias)) for raw in range(N_CODES)]
+    codes = array('h', [max(-32768, min(32767, c)) for c in codes])
+    levels = array('h', [int(round(100 * interpolate(level, (LEVEL_BASE + i * LEVEL_STEP) / 100))) for i in range(N_LEVELS)])
+    return Calibration(codes, levels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('measurements', help='CSV file of reference measurements')
+    parser.add_argument('-o', '--output', default='cal.bin')
+    parser.add_argument('--bias', type=float, default=2048, help='dc-bias code when the CSV has no bias row')
+    args = parser.parse_args()
+
+    adc, level, bias = read_points(args.measurements)
+    if not level:
+        sys.exit('at least one level row is needed')
+    bias = args.bias if bias is None else bias
+    if adc:
+        bias = interpolate(adc, bias)               # bias in linearised codes
+    cal = fit(adc, level, bias)
+    if sys.byteorder == 'big':                      # the node reads the tables as little-endian int16
+        cal.codes.byteswap()
+        cal.levels.byteswap()
+    cal.save(args.output)
+
+    offsets = [ref - unc for unc, ref in level]
+    print('%i adc points, %i level points, dc-bias %.1f' % (len(adc), len(level), bias))
+    print('sensitivity offset %.2f dB (spread %.2f dB over %.1f - %.1f dB SPL)'
+        % (sum(offsets) / len(offsets), max(offsets) - min(offsets), level[0][1], level[-1][1]))
+    print('wrote %s (%i bytes)' % (args.output, len(cal.to_bytes())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+""" Builds the command downlinks of the nodes (hex and base64 for the network server console), decodes config dumps (CPython) """
+
+import argparse
+import base64
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'node'))
+import commands
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seq', type=int, default=1, help='sequence number, a frame repeating the last one is ignored')
+    parser.add_argument('--interval', type=int, help='deepsleep time between two measurements (s)')
+    parser.add_argument('--dr', type=int, help='uplink datarate (0..5)')
+    parser.add_argument('--confirmed', type=int, choices=(0, 1), help='confirmed uplinks')
+    parser.add_argument('--batch', type=int, help='summaries per batched uplink')
+    parser.add_argument('--profile', action='store_true', help='requesting the wake-up profile')
+    parser.add_argument('--config', action='store_true', help='requesting a dump of the settings')
+    parser.add_argument('--decode-config', metavar='HEX', help='decodes a config dump uplink instead')
+    args = parser.parse_args()
+
+    if args.decode_config:
+        print(commands.decode_config(bytes.fromhex(args.decode_config)))
+        return
+    frame = []
+    for opcode, value in ((commands.SET_INTERVAL, args.interval), (commands.SET_DR, args.dr),
+            (commands.SET_CONFIRMED, args.confirmed), (commands.SET_BATCH, args.batch)):
+        if value is not None:
+            frame.append((opcode, value))
+    if args.profile:
+        frame.append((commands.REQ_PROFILE, None))
+    if args.config:
+        frame.append((commands.REQ_CONFIG, None))
+    try:
+        data = commands.encode(args.seq, frame)
+    except ValueError as e:
+        parser.error(str(e))
+    print('hex:    %s' % data.hex())
+    print('base64: %s' % base64.b64encode(data).decode())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+""" Trace replay of the node's monitoring mode: event detection latency and uplinks saved (CPython) """
+
+import argparse
+import csv
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'node'))
+from events import EventDetector, EVENT_START, EVENT_END, encode_event, decode_event
+from soundlevel import SoundLevelMeter, BLOCK_MS
+from bench_soundlevel import load_trace
+
+BLOCK_S = BLOCK_MS / 1000
+
+
+def synthetic_levels(hours, events_per_hour, seed):
+    """ Returns 125 ms levels of a quiet background with loud events, and the true (onset, offset) block of each event """
+    rnd = random.Random(seed)
+    n = int(hours * 3600 / BLOCK_S)
+    levels, truth = [], []
+    background = 50.0
+    while len(levels) < n:
+        if rnd.random() < events_per_hour * BLOCK_S / 3600:
+            length = int(rnd.uniform(3, 60) / BLOCK_S)
+            peak = rnd.uniform(72, 92)
+            truth.append((len(levels), len(levels) + length))
+            levels += [peak - 3 * abs(rnd.gauss(0, 1)) for _ in range(length)]
+        background = min(60.0, max(40.0, background + rnd.gauss(0, 0.2)))
+        levels.append(background + rnd.gauss(0, 1.5))
+    return levels[:n], truth
+
+
+def trace_levels(path, raw, rate, bias, cal_offset):
+    """ Returns the 125 ms levels of a CSV level trace (dB per line) or of a raw WAV/CSV trace (--raw) """
+    if path.lower().endswith('.wav') or raw:
+        file_rate, codes = load_trace(path, bias)
+        meter = SoundLevelMeter(sample_rate=file_rate or rate, bias=bias, cal_offset=cal_offset)
+        levels = []
+        meter.listener = levels.append
+        meter.feed(codes)
+        return levels
+    with open(path, newline='') as fp:
+        return [float(row[0]) for row in csv.reader(fp) if row and row[0].replace('.', '').replace('-', '').isdigit()]
+
+
+def replay(levels, detector):
+    """ Returns the (block, event, uplink payload) transitions of the detector over the levels """
+    transitions = []
+    for i, level in enumerate(levels):
+        event = detector.update(level)
+        if event:
+            transitions.append((i, event, encode_event(event == EVENT_START, detector.peak, detector.duration)))
+    return transitions
+
+
+def start_latency(levels, block, on_level):
+    """ Time between the first level of the run above on_level and its detection at block """
+    j = block
+    while j > 0 and levels[j - 1] >= on_level:
+        j -= 1
+    return (block - j + 1) * BLOCK_S
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('trace', nargs='?', help='level trace (.csv, dB per 125 ms) or raw ADC trace (.wav, .csv with --raw)')
+    parser.add_argument('--raw', action='store_true', help='the CSV trace holds raw ADC codes')
+    parser.add_argument('--rate', type=int, default=8000)
+    parser.add_argument('--bias', type=int, default=2048)
+    parser.add_argument('--cal-offset', type=float, default=77.0)
+    parser.add_argument('--hours', type=float, default=24.0, help='length of the synthetic trace')
+    parser.add_argument('--events', type=float, default=2.0, help='events per hour of the synthetic trace')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--on', type=float, default=70.0)
+    parser.add_argument('--off', type=float, default=65.0)
+    parser.add_argument('--attack', type=float, default=0.5)
+    parser.add_argument('--release', type=float, default=2.0)
+    parser.add_argument('--heartbeat', type=float, default=900, help='heartbeat interval of the monitoring mode (s)')
+    parser.add_argument('--interval', type=float, default=60, help='uplink interval of the fixed-interval mode (s)')
+    args = parser.parse_args()
+
+    truth = None
+    if args.trace:
+        levels = trace_levels(args.trace, args.raw, args.rate, args.bias, args.cal_offset)
+    else:
+        levels, truth = synthetic_levels(args.hours, args.events, args.seed)
+    seconds = len(levels) * BLOCK_S
+
+    detector = EventDetector(args.on, args.off, args.attack, args.release, BLOCK_S)
+    transitions = replay(levels, detector)
+    starts = [b for b, e, _ in transitions if e == EVENT_START]
+    ends = [b for b, e, _ in transitions if e == EVENT_END]
+    durations = [decode_event(payload)[2] for _, e, payload in transitions if e == EVENT_END]
+    latencies = sorted(start_latency(levels, b, args.on) for b in starts)
+
+    fixed = int(seconds // args.interval)
+    monitoring = len(starts) + len(ends) + int(seconds // args.heartbeat)
+    print('%.1f h trace, %i events detected' % (seconds / 3600, len(starts)))
+    if truth is not None:
+        print('true events: %i (missed %i)' % (len(truth), len(truth) - len(starts)))
+    if latencies:
+        print('detection latency: mean %.2f s, median %.2f s, max %.2f s (fixed interval: ~%.0f s on average)'
+            % (sum(latencies) / len(latencies), latencies[len(latencies) // 2], latencies[-1], args.interval / 2))
+    if durations:
+        print('event durations (end uplinks): median %i s, max %i s, %i over the former 127 s limit'
+            % (sorted(durations)[len(durations) // 2], max(durations), sum(1 for d in durations if d > 127)))
+    print('uplinks: fixed interval %i, monitoring %i (%i events + %i heartbeats), %.1f%% saved'
+        % (fixed, monitoring, len(starts) + len(ends), int(seconds // args.heartbeat), 100 * (1 - monitoring / max(1, fixed))))
+
+
+if __name__ == '__main__':
+    main()
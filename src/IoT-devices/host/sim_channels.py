@@ -0,0 +1,110 @@
+""" Simulation of the node's channel selector under skewed interference, against a fixed channel and random hopping (CPython) """
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'node'))
+import persist
+import channels
+
+LORA_CHANNELS = (868100000, 868300000, 868500000, 867100000, 867300000, 867500000, 867700000, 867900000, 868800000)
+
+
+def interference(args):
+    """ Delivery probability of every channel: a few clean channels, the others (incl. the default) jammed """
+    clean = set(range(len(LORA_CHANNELS) - args.clean, len(LORA_CHANNELS)))
+    return [args.p_clean if i in clean else args.p_jammed for i in range(len(LORA_CHANNELS))]
+
+
+class Fixed:
+    """ The previous behaviour: every uplink on the configured channel """
+
+    def __init__(self, rnd):
+        pass
+
+    def select(self):
+        return LORA_CHANNELS[0]
+
+    def record(self, frequency, delivered):
+        pass
+
+
+class Hopping(Fixed):
+    """ Uniform random channel hopping """
+
+    def __init__(self, rnd):
+        self.rnd = rnd
+
+    def select(self):
+        return self.rnd.choice(LORA_CHANNELS)
+
+
+class Thompson(Fixed):
+    """ The node's ChannelSelector, re-created from NVS after every deepsleep like on the node """
+
+    def select(self):
+        selector = channels.ChannelSelector(LORA_CHANNELS, key='sim_chan')
+        selector.restore()
+        return selector.select()
+
+    def record(self, frequency, delivered):
+        selector = channels.ChannelSelector(LORA_CHANNELS, key='sim_chan')
+        selector.restore()
+        selector.record(delivered, frequency)
+        selector.save()
+
+
+def run(strategy, rnd, args):
+    """ Returns the delivery ratio of every window of uplinks """
+    p = interference(args)
+    ratios = []
+    delivered = 0
+    for n in range(1, args.uplinks + 1):
+        if n == args.shift:                 # the interference moves to other channels
+            p = p[args.clean:] + p[:args.clean]
+        frequency = strategy.select()
+        ok = rnd.random() < p[LORA_CHANNELS.index(frequency)]
+        if rnd.random() < args.confirmed:   # the outcome of an unconfirmed uplink is unknown to the node
+            strategy.record(frequency, ok)
+        delivered += ok
+        if n % args.window == 0:
+            ratios.append(delivered / args.window)
+            delivered = 0
+    return ratios
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--uplinks', type=int, default=400, help='uplinks per run')
+    parser.add_argument('--confirmed', type=float, default=0.2,
+        help='fraction of confirmed uplinks (alerts, retries), the only outcomes the selector counts')
+    parser.add_argument('--window', type=int, default=50, help='uplinks per reported delivery ratio')
+    parser.add_argument('--clean', type=int, default=2, help='channels without interference')
+    parser.add_argument('--p-clean', type=float, default=0.95, help='delivery ratio of a clean channel')
+    parser.add_argument('--p-jammed', type=float, default=0.4, help='delivery ratio of a jammed channel')
+    parser.add_argument('--shift', type=int, default=200, help='uplink at which the interference moves, 0 for never')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as flash:   # the NVS of the simulated node
+        persist.FILE_DIR = flash
+        print('%i runs, %i of %i channels clean (%.0f%%), the others %.0f%%, interference moving at uplink %i, %.0f%% confirmed' % (
+            args.runs, args.clean, len(LORA_CHANNELS), 100 * args.p_clean, 100 * args.p_jammed, args.shift, 100 * args.confirmed))
+        print('%-9s %s %8s' % ('strategy', ' '.join('%6s' % ('<%i' % ((i + 1) * args.window))
+            for i in range(args.uplinks // args.window)), 'total'))
+        for name, strategy in (('fixed', Fixed), ('hopping', Hopping), ('thompson', Thompson)):
+            rnd = random.Random(args.seed)
+            total = [0.0] * (args.uplinks // args.window)
+            for _ in range(args.runs):
+                persist.erase('sim_chan')
+                for i, ratio in enumerate(run(strategy(rnd), rnd, args)):
+                    total[i] += ratio / args.runs
+            print('%-9s %s %7.1f%%' % (name, ' '.join('%5.1f%%' % (100 * r) for r in total), 100 * sum(total) / len(total)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+""" Discrete-event simulation of a fleet of noise nodes against the single-channel gateway or PyGate gateways (CPython, NumPy) """
+
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'node'))
+import airtime
+import codec
+from batch import Batch
+from dutycycle import DutyCycle, SUB_BANDS, sub_band
+from ratecontrol import SNR_FLOOR
+from emulator.radio import NOISE_FLOOR, CAPTURE_DB, TX_POWER, PathLoss
+from replay_events import synthetic_levels
+from bench_codec import interval_levels
+
+NODE_CHANNELS   = (868100000, 868300000, 868500000, 867100000, 867300000, 867500000, 867700000, 867900000, 868800000)  # config.LORA_CHANNELS
+SINGLE_CHANNEL  = (868100000, 7)        # single-gateway/config_TTN.py: LORA_FREQUENCY, LORA_GW_DR (SF7BW125)
+SINGLE_PATHS    = 1                     # the SX1276 of the single-channel gateway demodulates one frame at a time
+PYGATE_CONF     = os.path.join(ROOT, 'multi-gateway', 'global_conf.json')
+PYGATE_PATHS    = 8                     # demodulators of the PyGate's SX1308 concentrator
+WAKE_S          = 1.5                   # boot and radio resume before the measurement starts (s)
+RX_WINDOWS_S    = 2.2                   # end of the uplink until the TX event (RX1, RX2), then deepsleep (s)
+PERCENTILES     = [55.0, 50.0, 46.0, 45.0]  # L10, L50, L90, L95 appended once per stats interval
+HOUR            = 3600
+
+
+def pygate_channels(path=PYGATE_CONF):
+    """ Returns the frequencies of the enabled multi-SF channels of the PyGate's concentrator configuration """
+    with open(path) as f:
+        conf = json.load(f)['SX1301_conf']
+    frequencies = []
+    for i in range(8):
+        chan = conf.get('chan_multiSF_%i' % i, {})
+        if chan.get('enable'):
+            frequencies.append(conf['radio_%i' % chan['radio']]['freq'] + chan['if'])
+    return sorted(frequencies)
+
+
+def payload_sizes(batch_size, interval, seeds=4):
+    """ Returns {(summaries, statistical levels): [payload bytes]} of the node's codec over synthetic traces """
+    sizes = {}
+    for seed in range(seeds):
+        levels, _ = synthetic_levels(1.0, 2.0, seed)
+        batch = Batch(batch_size, key='sim_fleet')
+        for summary in interval_levels(levels, interval):
+            batch.add(summary, [], interval)
+            for percentiles in (False, True):
+                payload = batch.levels() + (PERCENTILES if percentiles else [])
+                sizes.setdefault((batch.count, percentiles), []).append(len(codec.encode(payload)))
+            if batch.count == batch_size:
+                batch.reset()
+    return sizes
+
+
+class Setup:
+    """ Gateways of a scenario: positions, channels and spreading factors they listen to, demodulation paths """
+
+    def __init__(self, name, positions, frequencies, sfs, paths, node_channels):
+        self.name           = name
+        self.positions      = np.asarray(positions, dtype=float)
+        self.paths          = paths
+        self.node_channels  = node_channels             # indexes of NODE_CHANNELS the nodes hop over
+        self.listen         = np.zeros((len(NODE_CHANNELS), 13), dtype=bool)   # channel, SF -> heard
+        for c, frequency in enumerate(NODE_CHANNELS):
+            if frequency in frequencies:
+                self.listen[c, list(sfs)] = True
+
+
+def link_rssi(nodes, gateways, pathloss, rng):
+    """ Mean received power (dBm) of every node -> gateway link, the log-normal shadowing drawn once per link """
+    d = np.hypot(nodes[:, None, 0] - gateways[None, :, 0], nodes[:, None, 1] - gateways[None, :, 1])
+    loss = pathloss.pl0 + 10 * pathloss.gamma * np.log10(np.maximum(d, 1.0) / pathloss.d0)
+    return TX_POWER - loss - rng.normal(0.0, pathloss.sigma, loss.shape)
+
+
+def datarates(rssi, setup, args):
+    """ Datarate of every node: the config's, or the fastest one the node's rate controller keeps with its margin """
+    if setup.paths == SINGLE_PATHS:
+        return np.full(len(rssi), 12 - SINGLE_CHANNEL[1], dtype=np.int8)    # the gateway only hears its SF
+    if not args.rate:
+        return np.full(len(rssi), args.dr, dtype=np.int8)
+    snr = rssi.max(axis=1) - NOISE_FLOOR
+    dr = np.zeros(len(rssi), dtype=np.int8)
+    for d in range(1, 6):
+        dr[snr >= SNR_FLOOR[d] + args.margin] = d
+    return dr
+
+
+def generate(drs, setup, sizes, args):
+    """
+    Runs the wake-up cycles of the nodes on a heap of wake-up times: measuring, batching (the node's
+    Batch), the payload size of the node's codec, the duty-cycle budget (the node's DutyCycle, where it
+    can bind) and deepsleep with the drift of the RTC. Returns the uplinks as NumPy arrays.
+    """
+    rnd = random.Random(args.seed)
+    n = len(drs)
+    end = args.hours * HOUR
+    drift = [1 + rnd.uniform(-args.drift, args.drift) for _ in range(n)]
+    batches = [Batch(args.batch, args.max_latency, key='sim_fleet') for _ in range(n)] if args.batch > 1 else None
+    stats = [rnd.uniform(0, args.stats_interval) for _ in range(n)]    # seconds of the statistics interval
+    pending = [False] * n                                               # statistical levels waiting for the next uplink
+    cycle = args.interval + args.sleep
+    toa = {}                                                            # (size, dr) -> time on air (s)
+    now = [0.0]
+    duty = [None] * n                                                   # DutyCycle where the budget can bind
+    largest = max(max(v) for v in sizes.values())
+    strictest = min(SUB_BANDS[sub_band(NODE_CHANNELS[c])][2] for c in setup.node_channels)
+    for i in range(n):      # off-time of the largest uplink longer than the sleep
+        if airtime.uplink_time_on_air(largest, int(drs[i])) * (1 / strictest - 1) / 1000 > args.sleep:
+            duty[i] = DutyCycle(key='sim_fleet', clock=lambda: now[0])
+    channels = setup.node_channels
+    heap = [(rnd.uniform(0, cycle), i) for i in range(n)]               # the first wake-ups spread over a cycle
+    heapq.heapify(heap)
+    out_node, out_start, out_toa, out_dr, out_chan, out_size = [], [], [], [], [], []
+    summary = (55.0, 60.0, 50.0)
+    while heap:
+        t, i = heapq.heappop(heap)
+        if t >= end:
+            continue
+        start = t + WAKE_S + args.interval
+        stats[i] += args.interval
+        if stats[i] >= args.stats_interval:
+            stats[i] = 0
+            pending[i] = True
+        count = 1
+        if batches is not None:
+            batch = batches[i]
+            batch.add(summary, (), cycle)
+            if not batch.due(cycle):
+                heapq.heappush(heap, (start + args.sleep * drift[i], i))
+                continue
+            count = batch.count
+            batch.reset()
+        dr = int(drs[i])
+        size = rnd.choice(sizes[count, pending[i]])
+        pending[i] = False
+        key = size, dr
+        if key not in toa:
+            toa[key] = airtime.uplink_time_on_air(size, dr) / 1000
+        duration = toa[key]
+        channel = rnd.choice(channels)
+        if duty[i] is not None:
+            now[0] = start
+            frequency = NODE_CHANNELS[channel]
+            wait = duty[i].wait(frequency, duration * 1000)
+            if wait:                                    # the node sleeps until the sub-band allows the uplink
+                start += wait
+                now[0] = start
+            duty[i].charge(frequency, duration * 1000)
+        out_node.append(i)
+        out_start.append(start)
+        out_toa.append(duration)
+        out_dr.append(dr)
+        out_chan.append(channel)
+        out_size.append(size)
+        heapq.heappush(heap, (start + duration + RX_WINDOWS_S + args.sleep * drift[i], i))
+    order = np.argsort(np.asarray(out_start))
+    return {
+        'node':     np.asarray(out_node, dtype=np.int32)[order],
+        'start':    np.asarray(out_start)[order],
+        'toa':      np.asarray(out_toa)[order],
+        'sf':       (12 - np.asarray(out_dr, dtype=np.int8))[order],
+        'chan':     np.asarray(out_chan, dtype=np.int8)[order],
+        'size':     np.asarray(out_size, dtype=np.int16)[order],
+        }
+
+
+def overlaps(tx):
+    """ Returns the (victim, interferer) index pairs of the uplinks overlapping in time on the same channel and SF """
+    key = tx['chan'].astype(np.int64) * 16 + tx['sf']
+    span = tx['start'].max() + 10.0
+    t = key * span + tx['start']                       # the groups one after the other on a single time axis
+    order = np.argsort(t, kind='stable')
+    ts, toa = t[order], tx['toa'][order]
+    window = np.zeros(int(key.max()) + 1)
+    np.maximum.at(window, key, tx['toa'])              # longest frame of every group
+    lo = np.searchsorted(ts, ts - window[key[order]], 'left')
+    hi = np.searchsorted(ts, ts + toa, 'left')
+    counts = hi - lo
+    victim = np.repeat(np.arange(len(ts)), counts)
+    other = lo[victim] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    keep = (other != victim) & (ts[other] + toa[other] > ts[victim])   # the earlier frames still on the air
+    return order[victim[keep]], order[other[keep]]
+
+
+def evaluate(tx, rssi_links, setup, n):
+    """ Receptions of the uplinks of the first n nodes at the gateways of setup: sensitivity, capture, free demodulators """
+    mask = tx['node'] < n
+    tx = {k: v[mask] for k, v in tx.items()}
+    rssi = rssi_links[tx['node']]                                       # uplink x gateway (dBm)
+    floor = np.zeros(13)
+    floor[7:13] = SNR_FLOOR[::-1]
+    heard = (rssi - NOISE_FLOOR >= floor[tx['sf']][:, None]) & setup.listen[tx['chan'], tx['sf']][:, None]
+    victim, other = overlaps(tx)
+    collided = np.zeros_like(heard)
+    busy = np.zeros_like(heard)
+    end = tx['start'] + tx['toa']
+    for g in range(rssi.shape[1]):
+        killed = rssi[other, g] > rssi[victim, g] - CAPTURE_DB
+        collided[:, g] = np.bincount(victim[killed], minlength=len(end)) > 0
+        # frames locked by the demodulators when the frame starts (heard frames started before and still on the air)
+        h = heard[:, g]
+        starts, ends = tx['start'][h], np.sort(end[h])
+        active = np.searchsorted(starts, tx['start'], 'left') - np.searchsorted(ends, tx['start'], 'right')
+        busy[:, g] = active >= setup.paths
+    received = heard & ~collided & ~busy
+    return tx, heard, received
+
+
+def curves(tx, heard, received, hours):
+    """ Hourly offered uplinks, delivery ratio, airtime of the busiest channel (%) and receptions per gateway """
+    hour = np.minimum((tx['start'] // HOUR).astype(np.int64), hours - 1)
+    offered = np.bincount(hour, minlength=hours)
+    delivered = np.bincount(hour, weights=received.any(axis=1), minlength=hours)
+    occupancy = np.bincount(hour * len(NODE_CHANNELS) + tx['chan'], weights=tx['toa'],
+        minlength=hours * len(NODE_CHANNELS)).reshape(hours, -1)
+    load = np.stack([np.bincount(hour, weights=received[:, g], minlength=hours) for g in range(received.shape[1])], axis=1)
+    return offered, delivered / np.maximum(offered, 1), 100 * occupancy.max(axis=1) / HOUR, load
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nodes', default='100,500,1000,2000,5000,10000', help='fleet sizes (the smaller fleets are subsets)')
+    parser.add_argument('--hours', type=int, default=24)
+    parser.add_argument('--radius', type=float, default=150, help='nodes placed uniformly within this distance of the centre (m)')
+    parser.add_argument('--gateways', type=int, default=1, help='PyGate gateways, on a circle of half the radius when several')
+    parser.add_argument('--sleep', type=float, default=600, help='DEEPSLEEP_TIME (s)')
+    parser.add_argument('--interval', type=float, default=10, help='measuring time per wake-up (s)')
+    parser.add_argument('--batch', type=int, default=1, help='summaries per uplink (batching mode when > 1)')
+    parser.add_argument('--max-latency', type=float, default=900)
+    parser.add_argument('--stats-interval', type=float, default=3600, help='statistical levels appended once per interval (s)')
+    parser.add_argument('--dr', type=int, default=5, help='uplink datarate of the PyGate fleet (config dr)')
+    parser.add_argument('--rate', action='store_true', help='PyGate fleet: datarate of the rate controller for the link SNR')
+    parser.add_argument('--margin', type=float, default=5.0, help='SNR margin of the rate controller (dB)')
+    parser.add_argument('--drift', type=float, default=0.02, help='tolerance of the deepsleep RTC (fraction)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--csv', help='writes the hourly curves of every fleet size and setup to this file')
+    args = parser.parse_args()
+
+    counts = sorted(int(n) for n in args.nodes.split(','))
+    n = counts[-1]
+    rng = np.random.default_rng(args.seed)
+    radius = args.radius * np.sqrt(rng.random(n))
+    angle = 2 * np.pi * rng.random(n)
+    nodes = np.stack([radius * np.cos(angle), radius * np.sin(angle)], axis=1)
+    if args.gateways == 1:
+        pygates = [(0.0, 0.0)]
+    else:
+        pygates = [(args.radius / 2 * math.cos(2 * math.pi * k / args.gateways),
+            args.radius / 2 * math.sin(2 * math.pi * k / args.gateways)) for k in range(args.gateways)]
+    frequencies = pygate_channels()
+    setups = (
+        Setup('single', [(0.0, 0.0)], [SINGLE_CHANNEL[0]], [SINGLE_CHANNEL[1]], SINGLE_PATHS,
+            [NODE_CHANNELS.index(SINGLE_CHANNEL[0])]),  # the nodes are configured to the gateway's channel
+        Setup('pygate', pygates, frequencies, range(7, 13), PYGATE_PATHS,
+            [c for c, frequency in enumerate(NODE_CHANNELS) if frequency in frequencies]),  # the nodes hop over the channels the gateways listen to
+        )
+    sizes = payload_sizes(args.batch, args.interval)
+    pathloss = PathLoss()
+
+    print('%i nodes within %g m, %g h, a measurement of %g s every %g s, %i summaries per uplink' % (
+        n, args.radius, args.hours, args.interval, args.interval + args.sleep, args.batch))
+    print('single: NoiseGateway at %.1f MHz SF%i; pygate: %i gateway(s), %i channels (%s), SF7-12, %i demodulators' % (
+        SINGLE_CHANNEL[0] / 1e6, SINGLE_CHANNEL[1], len(pygates), len(frequencies),
+        ', '.join('%.1f' % (f / 1e6) for f in frequencies), PYGATE_PATHS))
+    off_plan = [f for f in NODE_CHANNELS if f not in frequencies]
+    if off_plan:
+        print('pygate: the nodes use config.PYGATE_CHANNELS, leaving out %s MHz of config.LORA_CHANNELS' % (
+            ', '.join('%.1f' % (f / 1e6) for f in off_plan)))
+    rows, hourly = {}, {}
+    for setup in setups:
+        start = time.perf_counter()
+        rssi_links = link_rssi(nodes, setup.positions, pathloss, rng)
+        drs = datarates(rssi_links, setup, args)
+        tx = generate(drs, setup, sizes, args)
+        generated = time.perf_counter() - start
+        for count in counts:
+            sub, heard, received = evaluate(tx, rssi_links, setup, count)
+            delivered = received.any(axis=1)
+            in_range = heard.any(axis=1)
+            rows[setup.name, count] = (len(sub['start']), delivered.mean(), 1 - in_range.mean(),
+                (in_range & ~delivered).mean(), sub['toa'].sum() / len(setup.node_channels) / (args.hours * HOUR))
+            hourly[setup.name, count] = curves(sub, heard, received, args.hours)
+        print('%s: %i uplinks generated in %.1f s, evaluated in %.1f s' % (setup.name, len(tx['start']), generated,
+            time.perf_counter() - start - generated))
+
+    print('\n%7s %-7s %9s %9s %10s %10s %9s' % ('nodes', 'setup', 'uplinks', 'delivery', 'unheard', 'collision', 'airtime'))
+    for count in counts:
+        for setup in setups:
+            uplinks, delivery, out, lost, air = rows[setup.name, count]
+            print('%7i %-7s %9i %8.1f%% %9.1f%% %9.1f%% %8.2f%%' % (count, setup.name, uplinks, 100 * delivery, 100 * out,
+                100 * lost, 100 * air))
+
+    print('\nhourly curves of %i nodes (airtime of the busiest channel, receptions per gateway)' % n)
+    print('%4s' % 'hour' + ''.join(' %8s %8s %8s %10s' % (s.name, 'deliv.', 'airtime', 'gw load') for s in setups))
+    for h in range(args.hours):
+        row = '%4i' % h
+        for setup in setups:
+            offered, delivery, air, load = hourly[setup.name, n]
+            row += ' %8i %7.1f%% %7.2f%% %10s' % (offered[h], 100 * delivery[h], air[h], '/'.join('%i' % l for l in load[h]))
+        print(row)
+
+    if args.csv:
+        with open(args.csv, 'w') as f:
+            f.write('setup,nodes,hour,offered,delivery,busiest_channel_airtime,gateway_receptions\n')
+            for (name, count), (offered, delivery, air, load) in sorted(hourly.items()):
+                for h in range(args.hours):
+                    f.write('%s,%i,%i,%i,%.4f,%.3f,%s\n' % (name, count, h, offered[h], delivery[h], air[h],
+                        ' '.join('%i' % l for l in load[h])))
+        print('curves written to %s' % args.csv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+""" Simulation of the node's OTAA join backoff against resetting after every timeout, with a fake LoRa stack (CPython) """
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'node'))
+import airtime
+import persist
+import join
+
+JOIN_REQUEST = 23                       # PHY bytes of a join-request
+
+
+class FakeLoRa:
+    """ LoRa stack whose join() times out, unless the gateway hears the datarate and the network answers """
+
+    def __init__(self, rnd, max_dr, p_accept, outage):
+        self.rnd = rnd
+        self.max_dr = max_dr            # fastest datarate reaching the gateway
+        self.p_accept = p_accept        # probability of a join-accept when the request is heard
+        self.outage = outage            # seconds without network server (e.g. gateway down at deployment)
+        self.now = 0.0                  # simulated time (s)
+        self.airtime = 0.0              # join-request airtime (ms)
+        self.requests = 0
+
+    def join(self, dr, timeout):
+        self.requests += 1
+        self.airtime += airtime.time_on_air(JOIN_REQUEST, *airtime.EU868_DATARATES[dr])
+        if self.now >= self.outage and dr <= self.max_dr and self.rnd.random() < self.p_accept:
+            self.now += 6               # join-accept in RX2
+            return
+        self.now += timeout / 1000
+        raise OSError('timeout')
+
+
+def run_backoff(lora, args):
+    """ The node's JoinBackoff, re-created after every deepsleep like on the node """
+    awake = 0.0
+    while True:
+        backoff = join.JoinBackoff(args.dr_start, args.join_dr, 2, args.base, args.cap, key='sim_join')
+        lora.now += args.wake
+        awake += args.wake
+        start = lora.now
+        try:
+            lora.join(backoff.datarate(), args.timeout)
+        except OSError:
+            awake += lora.now - start
+            lora.now += backoff.failed()            # deepsleep
+            continue
+        awake += lora.now - start
+        backoff.joined()
+        return awake
+
+
+def run_reset(lora, args):
+    """ The previous behaviour: machine.reset() after every timeout, joining at join_dr """
+    awake = 0.0
+    while True:
+        lora.now += args.boot
+        awake += args.boot
+        start = lora.now
+        try:
+            lora.join(args.join_dr, args.timeout)
+        except OSError:
+            awake += lora.now - start
+            continue
+        awake += lora.now - start
+        return awake
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-dr', type=int, default=3, help='fastest datarate reaching the gateway')
+    parser.add_argument('--accept', type=float, default=0.7, help='probability of a join-accept when the request is heard')
+    parser.add_argument('--outage', type=float, default=1800, help='network unreachable during the first seconds')
+    parser.add_argument('--timeout', type=float, default=25000, help='join_timeout (ms)')
+    parser.add_argument('--join-dr', type=int, default=0)
+    parser.add_argument('--dr-start', type=int, default=5)
+    parser.add_argument('--base', type=int, default=15)
+    parser.add_argument('--cap', type=int, default=3600)
+    parser.add_argument('--boot', type=float, default=4.0, help='boot and radio init after a reset (s)')
+    parser.add_argument('--wake', type=float, default=1.5, help='wake-up and radio init after deepsleep (s)')
+    parser.add_argument('--awake-ma', type=float, default=45, help='current while awake')
+    parser.add_argument('--voltage', type=float, default=3.7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as flash:   # the NVS of the simulated node
+        persist.FILE_DIR = flash
+        print('%i runs, gateway reached at <= DR%i, network down during the first %g s' % (args.runs, args.max_dr, args.outage))
+        print('%-8s %12s %10s %14s %12s' % ('strategy', 'time to join', 'requests', 'airtime (s)', 'energy (J)'))
+        for name, strategy in (('reset', run_reset), ('backoff', run_backoff)):
+            rnd = random.Random(args.seed)
+            total = [0.0] * 4
+            for _ in range(args.runs):
+                persist.erase('sim_join')
+                lora = FakeLoRa(rnd, args.max_dr, args.accept, args.outage)
+                awake = strategy(lora, args)
+                energy = args.voltage * args.awake_ma / 1000 * awake
+                for i, value in enumerate((lora.now, lora.requests, lora.airtime / 1000, energy)):
+                    total[i] += value / args.runs
+            print('%-8s %10.0f s %10.1f %14.1f %12.1f' % (name, total[0], total[1], total[2], total[3]))
+
+
+if __name__ == '__main__':
+    main()
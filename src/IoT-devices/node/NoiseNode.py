@@ -7,9 +7,32 @@ from binascii import unhexlify as uhex
 import struct
 import time
 import utime
-import uos
 import machine
 import pycom
+from array import array
+from soundlevel import SoundLevelMeter, sample_into
+from spectrum import Spectrum
+from filterbank import FilterBank
+from percentiles import LevelHistogram
+from calibration import Calibration
+from sampler import Sampler
+from events import EventDetector, EVENT_NONE, EVENT_START, encode_event
+import codec
+import persist
+from batch import Batch
+import airtime
+from dutycycle import DutyCycle
+from join import JoinBackoff
+from profiler import Profiler
+from led import Led
+from ringlog import RingLog, INFO
+from ratecontrol import RateControl
+from channels import ChannelSelector
+from commands import Commands, SET_INTERVAL, SET_DR, SET_CONFIRMED, SET_BATCH, REQ_PROFILE, REQ_CONFIG
+from uplinks import UplinkTracker, ROUTINE, ALERT, PENDING, ACKED, FAILED
+from radios import RadioPower
+
+EAGAIN      = 11                        # errno of a send() the LoRa stack refuses while it is busy (non-blocking socket)
 
 
 class NoiseNode:
@@ -17,30 +40,180 @@ class NoiseNode:
     LoRa(WAN) node reporting sound
     """
 
-    def __init__(self, debug, lora_params, lora_session_keys, deepsleep_time):
+    def __init__(self, debug, lora_params, lora_session_keys, deepsleep_time, sensor_params=None, monitor_params=None,
+            batch_params=None, profile_params=None, rate_params=None,
+            command_params=None, uplink_params=None, radio_params=None):
         # disabling unuseful background processes, saving power-consumtion
         pycom.heartbeat(False)      # stopping internal led pulse
-        #LTE().deinit()              # disabling cellular radio , takes to much time...
-        #WLAN().deinit()             # disabling wifi radio, takes to much time...
-        #Bluetooth().deinit()        # disabling bluetooth radio, takes to much time...
+        # LTE, WLAN and Bluetooth are switched off once after a cold boot, see disable_radios()
         # properties
         self.debug              = debug
+        self.led                = Led()         # non-blocking status led of the debug-mode
+        self.logger             = RingLog()     # debug log records, printed by flush_log() from the main loop
+        self.log_alarm          = None          # alarm printing the log records in the REPL (print_log)
         self.lora_session_keys  = lora_session_keys
         self.lora_params        = lora_params
         self.lora               = None          # LoRa-object
         self.lora_socket        = None          # networking-endpoint, bound to IP-adress and port-nr
+        self.fport              = None          # LoRaWAN FPort the socket is bound to
         self.deepsleep_time     = deepsleep_time
-        self.tx_stats           = {"tx_conf": 0, "tx_consecutive_fails": 0} # transmission stats
+        self.command_params     = command_params
+        self.commands           = None          # settings changed by downlink commands, None when disabled
+        if command_params is not None and command_params["enabled"]:
+            self.commands = Commands()
+            self.commands.restore()             # the settings of the commands override the config after every reset
+            self.batch = None                   # created below, with the commanded size
+            self.apply_settings()
+        self.uplinks            = UplinkTracker(  # state of the last uplink, acks and retries, kept in NVS
+            confirm_priority    = ALERT if uplink_params is None else uplink_params["confirm_priority"],
+            retries             = 2 if uplink_params is None else uplink_params["retries"],
+            )
+        self.uplinks.restore()
+        self.socket_confirmed   = False         # SO_CONFIRMED of the socket, switched per uplink priority
+        self.socket_blocking    = True          # send() returns after the TX/RX windows (False in the monitoring mode)
+        self.tx_airtime         = 0             # modelled time on air of the last uplink (ms)
+        self.channel            = lora_params["channel"]  # frequency of the default channels (Hz)
+        self.phases             = [('boot', utime.ticks_us())]  # (phase, ticks_us) of the wake-up, see mark()
+        self.radio_params       = radio_params
+        self.profile_params     = profile_params
+        self.profiler           = None          # timing histograms of the wake-up phases, None when disabled
+        if profile_params is not None and profile_params["enabled"]:
+            self.profiler = Profiler(profile_params["every"])
+            # timing the phases by wrapping the methods, a disabled profiler costs nothing
+            for phase, method in (('radio', 'resume'), ('radio', 'init_lora_radio'), ('join', 'join_network_server'),
+                    ('sensor', 'collect_sensor_data'), ('uplink', 'send_uplink'), ('radios', 'disable_radios')):
+                setattr(self, method, self.profiler.wrap(phase, getattr(self, method)))
+        self.dutycycle          = DutyCycle()   # airtime budget of the EU868 sub-bands
+        self.channels           = ChannelSelector(lora_params["channels"].values())  # delivery counts per channel
+        self.channels.restore()                 # kept in NVS across resets, the interference does not change with a reset
+        self.rate               = None          # link-quality datarate controller, None when disabled or with ADR
+        if rate_params is not None and rate_params["enabled"] and not lora_params["adr"]:
+            self.rate = RateControl(
+                dr          = lora_params["dr"],
+                dr_min      = rate_params["dr_min"],
+                dr_max      = rate_params["dr_max"],
+                window      = rate_params["window"],
+                margin      = rate_params["margin"],
+                hysteresis  = rate_params["hysteresis"],
+                fail_limit  = rate_params["fail_limit"],
+                )
+            if machine.reset_cause() == machine.DEEPSLEEP_RESET:
+                self.rate.restore()
+        self.join_backoff       = JoinBackoff(  # failed OTAA joins, kept in NVS across the deepsleeps between attempts
+            dr_start    = lora_params["join_dr_start"],
+            dr_min      = lora_params["join_dr"],
+            base        = lora_params["join_backoff"],
+            cap         = lora_params["join_backoff_max"],
+            )
+        if machine.reset_cause() == machine.DEEPSLEEP_RESET:
+            self.dutycycle.restore()            # the off-times and budgets of the previous wake-ups still apply
+            self.channel = persist.load_int('channel', self.channel)  # channel plan of the nvram session
         self.sensor_data        = {}
+        self.sensor_params      = sensor_params
+        self.meter              = None          # A-weighted sound level meter
+        self.spectrum           = None          # fixed-point FFT band spectrum
+        self.filterbank         = None          # 1/3-octave filterbank
+        self.adc                = None          # analog channel of the microphone
+        self.fft_samples        = None          # raw ADC codes of one spectrum analysis
+        self.histogram          = None          # short-term level histogram of the statistical levels (L10..L95)
+        self.sampler            = None          # timer-driven double-buffered sampler of the monitoring mode
+        self.monitor_params     = monitor_params
+        self.detector           = None          # noise event detector of the monitoring mode
+        self.event              = EVENT_NONE    # last event transition, waiting to be sent
+        self.payload            = bytearray(codec.encoded_size(codec.MAX_COUNT))  # encoding buffer of the sensor uplinks
+        self.batch              = None          # summaries of several wake-ups, sent in one uplink
+        if batch_params is not None and batch_params["enabled"]:
+            size = batch_params["size"] if self.commands is None else self.commands.get(SET_BATCH, batch_params["size"])
+            self.batch = Batch(size, batch_params["max_latency"])
+            if machine.reset_cause() == machine.DEEPSLEEP_RESET:
+                self.batch.restore()
+        if monitor_params is not None:
+            self.detector = EventDetector(
+                on_level    = monitor_params["on_level"],
+                off_level   = monitor_params["off_level"],
+                attack      = monitor_params["attack"],
+                release     = monitor_params["release"],
+                )
+        if sensor_params is not None:
+            # calibration tables of the front end, read from flash (cal_offset is used without them)
+            calibration = Calibration.load(sensor_params["calibration"])
+            self.meter = SoundLevelMeter(
+                sample_rate = sensor_params["sample_rate"],
+                ring_size   = sensor_params["ring_size"],
+                bias        = sensor_params["bias"],
+                cal_offset  = sensor_params["cal_offset"],
+                calibration = calibration,
+                )
+            self.histogram = LevelHistogram()
+            self.meter.listener = self.short_term_level # called with every 125ms level
+            if machine.reset_cause() == machine.DEEPSLEEP_RESET:
+                self.histogram.restore()                # continuing the statistics interval of the previous wake-ups
+            if sensor_params["spectrum"] == 'fft':
+                self.spectrum = Spectrum(
+                    n           = sensor_params["fft_size"],
+                    sample_rate = sensor_params["sample_rate"],
+                    bias        = sensor_params["bias"],
+                    cal_offset  = sensor_params["cal_offset"],
+                    calibration = calibration,
+                    )
+            else:
+                self.filterbank = FilterBank(
+                    sample_rate = sensor_params["sample_rate"],
+                    bias        = sensor_params["bias"],
+                    cal_offset  = sensor_params["cal_offset"],
+                    calibration = calibration,
+                    )
+            self.fft_samples = array('H', [0] * sensor_params["fft_size"])
 
     def start(self):
-        self._log("Starting Noise Node with id: %s" % self.lora_session_keys['app_eui'])
+        self._log("Starting Noise Node with id: %s", args=(self.lora_session_keys['app_eui'],))
         self.init_lora_radio()
         self.join_network_server()
 
+    def disable_radios(self):
+        """ Switches the unused radios off after a cold boot, the deepsleep wake-ups find them off (see radios.py) """
+
+        if (self.radio_params is None or not self.radio_params["deinit"]
+                or machine.reset_cause() == machine.DEEPSLEEP_RESET):
+            return
+        power = RadioPower(self.radio_params["radios"])
+        cost = power.disable()
+        self.mark('radios')
+        if cost:
+            # awake per wake-up: the measurement plus ~3 s of boot, radio and receive windows
+            awake = self.sensor_params["interval"] + 3 if self.sensor_params is not None else 3
+            payback = power.payback(awake / (awake + self.deepsleep_time) if self.deepsleep_time else 1.0,
+                self.radio_params["currents"])
+            self._log("Radios switched off (%s, %i ms once), paid back by the idle current after %i s",
+                args=(power.report(), cost // 1000, payback or 0))
+
+    def resume(self):
+        """ Fast wake-up path after deepsleep: restores the session and channel plan from nvram, skipping the channel
+        configuration. Returns False when the radio must be initialised and joined the normal way, also when the
+        restored session went stale (repeated confirmed uplinks without ack). """
+
+        if (machine.reset_cause() != machine.DEEPSLEEP_RESET) or (self.join_backoff.attempts > 0) or self.uplinks.stale():
+            return False
+        self.create_lora()
+        self.lora.nvram_restore()   # session, frame counters and channel plan of the previous wake-up
+        if not self.lora.has_joined():
+            return False
+        self.init_socket()
+        self.mark('resumed')
+        return True
+
     def init_lora_radio(self):
         """ Initialises the lora radio by configuring the LoRa-object and socket. """
 
+        self.create_lora()
+        self.init_channels()        # adding & removing the right LoRa channels
+        self.init_socket()          # configuring the LoRa parameters and setting up the socket
+        self.mark('radio')
+        self._log('LoRa radio is configured with:\n %s', args=(self.lora_params,))
+
+    def create_lora(self):
+        """ Creates the LoRa-object. """
+
         self.lora = LoRa(
             mode            = self.lora_params["mode"],        # raw LoRa or LoRaWAN
             region          = self.lora_params["region"],      # Choosing freq. band depending on country
@@ -49,23 +222,28 @@ class NoiseNode:
             coding_rate     = self.lora_params["cr"],          # Adds a forward error correction (FEC) in every data transmission, implementation is done by encoding 4-bit data with redundancies into 5/6/7/8bit.
             #tx_retries      = self.lora_params["retries"]     # Number of tx_trials, can not be changed... , unnecessary action
             )
-        self.init_channels()        # adding & removing the right LoRa channels
-        self.init_socket()          # configuring the LoRa parameters and setting up the socket
-        self._log('LoRa radio is configured with:\n %s' % str(self.lora_params))
 
     def join_network_server(self):
         """ Joining network server with keys in ABP/OTAA. """
 
-        if (machine.reset_cause() == machine.DEEPSLEEP_RESET) and (self.tx_stats["tx_consecutive_fails"] <= 2):
+        if ((machine.reset_cause() == machine.DEEPSLEEP_RESET) and not self.uplinks.stale()
+                and (self.join_backoff.attempts == 0)):
             # restoring lora join-session (appeui, appkey, framecounter) and erasing from ram
             self.lora.nvram_restore()
-            self._log("lora settings restored with nvram")
-            # saving lora join-session in the nvram
-            self.lora.nvram_save()
+            if self.lora.has_joined():
+                self._log("lora settings restored with nvram")
+                # saving lora join-session in the nvram
+                self.lora.nvram_save()
+                self.mark('session')
+                return
+            self._log("no lora session in nvram, joining")
 
         # joining through OTAA
-        elif self.lora_params["activation"] == 'OTAA':
-            self._log('Joining the network server...', status="joining")
+        if self.lora_params["activation"] == 'OTAA':
+            dr = self.join_backoff.datarate()
+            self._log('Joining the network server (attempt %i @dr %i)...', "joining", args=(self.join_backoff.attempts + 1, dr))
+            # join-request: MHDR, AppEUI, DevEUI, DevNonce and MIC (23 bytes)
+            self.dutycycle.charge(self.channel, airtime.time_on_air(23, *airtime.EU868_DATARATES[dr]))
             try:
                 # join-procedure for OTAA (sending a join-request and waiting till reception of a join-accept)
                 self.lora.join(
@@ -73,19 +251,24 @@ class NoiseNode:
                     auth        = (uhex(self.lora_session_keys['app_eui']), # uhex: hexadecimal string to binary data
                         uhex(self.lora_session_keys['app_key'])),
                     timeout     = self.lora_params['join_timeout'],         # max. time for the join-procedure, in ms
-                    dr          = self.lora_params['join_dr']               # datarate of the join-accept, (0:SF12BW125)
+                    dr          = dr                                        # datarate of the join-request, stepped down after failed attempts
                     )
 
             except OSError as os_e:
                 self._log(os_e)         # most frequent error => "timeout"
-                self.reset()            # resetting board,  we must implement dynamic deepsleep instead... further work
-
-            finally:
+                self.channels.record(False, self.channel)
+                # sleeping instead of resetting, the next attempt follows a growing delay at a more robust datarate
+                delay = self.join_backoff.failed()
+                self._log("Join failed, attempt %i in %i s @dr %i", args=(
+                    self.join_backoff.attempts + 1, delay, self.join_backoff.datarate()))
+                self.deepsleep(delay*1000)
+
+            else:
                 self._log('Node joined the network', status="joined")
-                self.tx_stats["tx_consecutive_fails"] = 0
-
-            #if not self.lora.has_joined():
-            #    self.reset()
+                self.uplinks.fails = 0
+                self.join_backoff.joined()
+                self.channels.record(True, self.channel)
+                self.mark('session')
 
         # joining through ABP
         elif self.lora_params["activation_mode"] == 'ABP':
@@ -106,6 +289,7 @@ class NoiseNode:
         self.datarate = self.lora_params['dr']
         # setting transmission-confirmation (asking handshake)
         self.confirmed_tx = self.lora_params["confirmed_tx"]
+        self.socket_confirmed = self.lora_params["confirmed_tx"]
 
         self.lora.callback(trigger=(                # lora event handler for transmission/reception/transmission_fail
             LoRa.RX_PACKET_EVENT
@@ -117,13 +301,10 @@ class NoiseNode:
     def init_channels(self):
         """ Removes and adds the right LoRa channels. """
 
-        # random channel-hopping
-        channel = self.lora_params["channel"][int((uos.urandom(1)[0] / 256)*5)]
+        # the OTAA join stays on the configured channel, the uplinks choose theirs in send_uplink
         # setting the 3 default channels to the same frequency (must be before sending the OTAA join request) this is also removing the other channels
-        [self.lora.add_channel(
-            i, frequency=channel, dr_min=0, dr_max=5) for i in range(3)]
+        self.set_channel(self.lora_params["channel"])
         #[self.lora.remove_channel(i) for i in range(3, 16)]                         # removing all the non-default channels
-        #(struct.unpack('B',uos.urandom(1))[0] % 7) + 1 #random channel hopping
 
 
     def lora_callback(self, lora: LoRa):
@@ -135,81 +316,213 @@ class NoiseNode:
         if events & LoRa.RX_PACKET_EVENT:
             if self.lora_socket is not None:
                 frame, port = self.lora_socket.recvfrom(512)
-                self._log("Packet reception:\n\tport: %s, frame:%s" %
-                          (port, frame), 'reception')
+                self._log("Packet reception:\n\tport: %s, frame:%s", 'reception', args=(port, frame))
+                if self.commands is not None and port == self.command_params["port"]:
+                    self.handle_command(frame)
+            self.channels.record(True)                  # a downlink answered the (confirmed) uplink
+            if self.rate is not None:
+                self.rate.record(self.lora.stats())     # link quality of the downlink
 
         # raised as soon as the packet transmission cycle ends
         if events & LoRa.TX_PACKET_EVENT:
-            self._log("Transmission ended:\n\ttx_time_on_air: %s ms, @dr %s" %
-                      (self.lora.stats().tx_time_on_air, self.lora.stats().sftx))
-            if self.lora_params["confirmed_tx"]:
-                self._log("Reception of confirmed downlink",
-                          "confirmed_downlink")
-                self.tx_stats["tx_conf"] += 1
-                self.tx_stats["tx_consecutive_fails"] = 0
-            #self._log("Transmission stats:\n%s" % str(self.lora.stats()))
-            if self.deepsleep_time > 0:
+            self.mark('tx_done')
+            if self.debug:
+                stats = self.lora.stats()
+                self._log("Transmission ended:\n\ttx_time_on_air: %s ms (model: %i ms), @dr %s",
+                          args=(stats.tx_time_on_air, self.tx_airtime, stats.sftx))
+                self._log("Wake phases (ms since boot): %s", args=(self.phase_report(),))
+            self.phases = []
+            state = self.uplinks.tx_done(self.lora.stats())
+            if state == ACKED:
+                self._log("Reception of confirmed downlink (rtt %i ms)", "confirmed_downlink", args=(self.uplinks.rtt,))
+                if self.rate is not None:
+                    self.rate.record(self.lora.stats())     # link quality of the ack
+                self.channels.record(True)
+            elif state == FAILED:
+                self.tx_failed()                            # the windows ended without ack
+            #self._log("Transmission stats:\n%s", args=(self.lora.stats(),))
+            if self.uplinks_pending():
+                pass                        # staying awake for the profile or config uplink (send_profile, send_config)
+            elif self.deepsleep_time > 0:
                 self.deepsleep(self.deepsleep_time*1000)
 
         # raised after the number of tx_retries configured have been performed and no ack is received
         if events & LoRa.TX_FAILED_EVENT:
-            self._log("sending Failed")
-            self.tx_stats["tx_consecutive_fails"] += 1
-            self._log("Transmission fail:\n\t tx_stats: confirmed_packets:%i, consecutive_fails:%i" % (
-                self.tx_stats["tx_conf"], self.tx_stats["tx_consecutive_fails"]))
-            if ((self.tx_stats["tx_consecutive_fails"] >= 2) and (self.lora_params['confirmed_tx'])):
-                self.join_network_server()
-
-    def send_uplink(self, pkt='a'):
-        """ Sends a packet via LoRa. """
-
+            if self.uplinks.tx_failed() == FAILED:      # None when TX_PACKET_EVENT already counted the missing ack
+                self.tx_failed()
+            if not self.uplinks_pending() and self.deepsleep_time > 0:
+                self.deepsleep(self.deepsleep_time*1000)    # retried at the next wake-up
+
+    def tx_failed(self):
+        """ Handles a confirmed uplink without ack: link statistics and a new join after repeated failures """
+        self._log("sending Failed")
+        if self.rate is not None:
+            self.rate.failed()                          # stepping down after consecutive failures
+        self.channels.record(False)
+        self._log("Transmission fail:\n\t %s", args=(self.uplinks.summary(),))
+        if self.uplinks.stale():
+            self.join_network_server()
+
+    def send_uplink(self, pkt='a', port=None, priority=ROUTINE, retry=False):
+        """ Sends a packet via LoRa, on the given LoRaWAN FPort (default: the sound level port), confirmed when
+        its priority asks for it. Returns False when the uplink is deferred: the duty-cycle budget of every
+        channel is exhausted, or the non-blocking socket is still busy with the previous uplink. """
+
+        if self.tx_busy():
+            self._log("Previous uplink still in its TX/RX windows, uplink deferred")
+            return False
+        if port is None:
+            port = self.lora_params["fport"]
+        self.adapt_datarate()
+        self.tx_airtime = airtime.uplink_time_on_air(len(pkt), self.datarate)
+        # channel with the best sampled delivery among the channels with duty-cycle budget left
+        frequency = self.channels.select(f for f in self.lora_params["channels"].values()
+            if self.dutycycle.wait(f, self.tx_airtime) == 0)
+        if frequency is None:
+            self._log("Duty-cycle budget exhausted, uplink deferred (next in %i s)", args=(self.uplink_delay(len(pkt)),))
+            return False
+        if frequency != self.channel:
+            self._log("Uplink channel %i -> %i Hz", args=(self.channel, frequency))
+            self.set_channel(frequency)
         try:
             self._log('Sending packet...', status="sending")
+            if port != self.fport:
+                self.lora_socket.bind(port)     # selecting the FPort of the uplink
+                self.fport = port
+            self.dutycycle.charge(frequency, self.tx_airtime)
+            confirmed = self.uplinks.confirm(priority, self.lora_params["confirmed_tx"])
+            # outcome recorded by lora_callback; an unconfirmed uplink has none (no ack expected), it is left out
+            self.channels.sent(frequency if confirmed else None)
+            if confirmed != self.socket_confirmed:
+                self.lora_socket.setsockopt(socket.SOL_LORA, socket.SO_CONFIRMED, confirmed)
+                self.socket_confirmed = confirmed
+            self.uplinks.sent(pkt, port, priority, confirmed, self.lora.stats(), retry)
             # sending packet with LoRa chip <sx1276>
+            self.mark('tx')
             self.lora_socket.send(pkt)
 
-        except Exception as e:          # maybe add function to catch when payload is to large
+        except Exception as e:          # payloads are sized to the datarate beforehand (fit_batch)
+            if isinstance(e, OSError) and e.args and e.args[0] == EAGAIN:
+                # non-blocking socket: the stack still runs the windows or retries of the previous uplink
+                self._log("LoRa stack busy (EAGAIN), uplink deferred")
+                self.uplinks.unsent()
+                self.channels.sent(None)
+                return False
             self._log(e)
             self.reset()                # resetting board if error occurs while sending packet
+        return True
 
-    def _log(self, message: str, status=""):
-        """ Outputs a time-stamped log message to console and blinks internal led according status. """
+    def tx_busy(self):
+        """ True while the non-blocking socket cannot take an uplink: the previous one is still in its TX/RX windows """
+        return not self.socket_blocking and self.uplinks.state == PENDING
+
+    def send_retry(self):
+        """ Sends again the last confirmed uplink that was not acked, before the new data """
+        retry = self.uplinks.pending_retry()
+        if retry is None:
+            return
+        pkt, port, priority = retry
+        self._log("Retrying uplink on port %i (attempt %i)", args=(port, self.uplinks.attempts + 1))
+        self.send_uplink(pkt, port, priority, retry=True)
+
+    def handle_command(self, frame):
+        """ Applies a command frame of the command port: all its settings at once, or none when it is invalid """
+        dr = self.datarate
+        if not self.commands.apply(frame):
+            self._log("Command frame rejected (invalid or repeated): %s", args=(frame,))
+            return
+        self.apply_settings()
+        if self.rate is not None and self.datarate != dr:
+            self.rate.dr = self.datarate        # the rate controller continues from the commanded datarate
+            self.rate.reset_window()
+        self._log("Command frame %i applied: interval %i s, dr %i, confirmed %s", args=(
+            self.commands.seq, self.deepsleep_time, self.datarate, self.confirmed_tx))
+
+    def apply_settings(self):
+        """ Applies the settings changed by commands on top of the config """
+        self.deepsleep_time = self.commands.get(SET_INTERVAL, self.deepsleep_time)
+        dr = self.commands.get(SET_DR, self.lora_params["dr"])
+        confirmed = bool(self.commands.get(SET_CONFIRMED, self.lora_params["confirmed_tx"]))
+        if self.lora_socket is None:            # applied by init_socket
+            self.lora_params["dr"], self.lora_params["confirmed_tx"] = dr, confirmed
+        else:
+            self.datarate, self.confirmed_tx = dr, confirmed
+        if self.batch is not None:
+            self.batch.resize(self.commands.get(SET_BATCH, self.batch.size))
+
+    def uplinks_pending(self):
+        """ True when another uplink (new data, profile or config) follows the uplink that just ended (no deepsleep yet) """
+        if (self.profiler is not None and self.fport != self.profile_params["port"]
+                and (self.profiler.due() or self.requested(REQ_PROFILE))):
+            return True
+        if self.uplinks.retry:
+            return True                 # the new data follows the retried uplink
+        return self.commands is not None and self.fport != self.command_params["port"] and self.requested(REQ_CONFIG)
+
+    def requested(self, request):
+        """ True when a command frame requested an uplink that was not sent yet """
+        return self.commands is not None and self.commands.pending(request)
+
+    def adapt_datarate(self):
+        """ Applies the datarate chosen by the rate controller from the link quality of the last downlinks """
+        if self.rate is None:
+            return
+        dr = self.rate.datarate()
+        if dr != self.datarate:
+            self._log("Datarate %i -> %i (mean downlink SNR %s dB)", args=(self.datarate, dr, self.rate.mean_snr()))
+            self.datarate = dr
+
+    def uplink_delay(self, size):
+        """ Returns the time (s) until an uplink of size bytes is allowed on one of the channels, 0 if it is allowed now """
+        return self.dutycycle.next_uplink(self.lora_params["channels"].values(), airtime.uplink_time_on_air(size, self.datarate))
+
+    def set_channel(self, frequency):
+        """ Moves the default channels to frequency (Hz) """
+        for i in range(3):
+            self.lora.add_channel(i, frequency=frequency, dr_min=0, dr_max=5)
+        self.channel = frequency
+        persist.save_int('channel', frequency)  # the channel plan is restored from nvram after deepsleep
+
+    def _log(self, message: str, status="", args=None):
+        """ Stores a time-stamped log message in the ring logger and blinks internal led according status.
+        The message is only formatted with args when it is flushed, keeping callbacks and the wake path free of
+        string formatting and UART writes. """
 
         if self.debug == False:         # escape function if not in debug-mode
             return
 
-        print('[%.3f] %s' % ((utime.ticks_ms() / 1000), message)) # print time-stamped log
+        self.logger.log(INFO, message, args)
 
         if status != "":
             self.status_led(status)
 
+    def flush_log(self):
+        """ Prints the waiting log messages (main loop, before deepsleep and in the REPL) """
+        if self.debug:
+            self.logger.flush()
+
+    def print_log(self, period_ms=500):
+        """ Keeps printing the log messages of the callbacks in debug-mode, when no main loop flushes them (REPL) """
+        if self.debug and self.log_alarm is None:
+            self.log_alarm = machine.Timer.Alarm(handler=lambda alarm: self.flush_log(), ms=period_ms, periodic=True)
+
     def status_led(self, mode: str):
-        """ Blinks internal led based on status. """
+        """ Shows the led pattern of a status, without blocking (patterns are played by a timer alarm). """
 
         if self.debug:
-            if mode == 'joining':
-                self.blink_led('red')
-            elif mode == 'joined':
-                self.blink_led('green', 1)
-            elif mode == 'sending':
-                for i in range(3):
-                    self.blink_led('blue', 0.2)
-            elif mode == 'confirmed_downlink':
-                self.blink_led('green', 0.5)
-            elif mode == 'reception':
-                for i in range(3):
-                    self.blink_led('yellow', 0.2)
-
-    def blink_led(self, color: str, delay=0):
-        """ Blinks internal led with color during x time. """
-
-        colors = {'red': 0xff0000, 'green': 0x00ff00,
-                  'blue': 0x0000ff, 'yellow': 0x7f7f00}  # RGBY
-        pycom.rgbled(colors[color])
-        if time:
-            time.sleep(delay)
-            pycom.rgbled(False)
-            time.sleep(delay)
+            self.led.show(mode)
+
+    def mark(self, phase: str):
+        """ Records the time of a wake-up phase (cheap: no formatting until phase_report) """
+        self.phases.append((phase, utime.ticks_us()))
+
+    def phase_report(self):
+        """ Formats the recorded phases: time since boot and duration of each phase (ms) """
+        report, previous = [], 0
+        for phase, ticks in self.phases:
+            report.append('%s %.1f (+%.1f)' % (phase, ticks / 1000, utime.ticks_diff(ticks, previous) / 1000))
+            previous = ticks
+        return ', '.join(report)
 
     def array2packet(self, array: list) -> list:
         """ Converts int array to binaries """
@@ -219,9 +532,23 @@ class NoiseNode:
     def deepsleep(self, time: int):
         """ Enters deep-sleep modus and saving lora join-session beforehands """
 
+        start = utime.ticks_us()
         # saving lora join-session (appeui, appkey, framecounter), important to save just before sleep, otherwise framecounter may be incorrect !
         self.lora.nvram_save()
+        if self.histogram is not None:
+            self.histogram.save()   # the statistics interval spans several wake-ups
+        self.dutycycle.save()       # the budgets are refilled with the time slept
+        if self.rate is not None:
+            self.rate.save()        # link quality window of the previous wake-ups
+        self.channels.save()
+        self.uplinks.save()         # frame counter, acks and the uplink to retry
+        if self.profiler is not None:
+            self.profiler.add_phase('sleep', utime.ticks_diff(utime.ticks_us(), start))
+            self.profiler.cycles += 1
+            self.profiler.save()
         self._log("Start deepsleep...")
+        self.flush_log()
+        self.led.stop()
         machine.deepsleep(time)
 
     def reset(self):
@@ -260,27 +587,162 @@ class NoiseNode:
 #--------------- IN DEVELOPMENT -----------------------------------------------------------------------------#
 
     def collect_sensor_data(self):
-        """Making 5 analog reads"""
-        adc = machine.ADC().channel(pin='P16')
-        readings = []
-        for i in range(5):
-            time.sleep(0.001)
-            readings.append(adc())
-        readings += list(range(35))   # just increasing payload...
-        self._log("Readings of %s were read from the analog pin." % str(readings))
-        self.sensor_data['ppm']=readings
+        """Measuring the A-weighted sound levels (LAeq, LAmax, LAmin) during the sensor interval"""
+        self.meter.reset()
+        self.meter.acquire(self.sensor_adc().value, self.sensor_params["interval"] * self.sensor_params["sample_rate"])
+        self.mark('sensor')
+        self.summarise_sensor_data(self.sensor_params["interval"])
+
+    def summarise_sensor_data(self, seconds):
+        """Storing the sound levels measured during the last seconds in sensor_data"""
+        levels = list(self.meter.levels())      # dB, sent at 0.1 dB resolution by the codec
+        self._log("Sound levels LAeq:%.1f LAmax:%.1f LAmin:%.1f dB were measured on the analog pin.", args=tuple(levels))
+        self.sensor_data['levels'] = levels
+        self.histogram.seconds += seconds
+        if self.histogram.seconds >= self.sensor_params["stats_interval"]:
+            # statistical levels of the interval (L10, L50, L90, L95), appended to the payload
+            self.sensor_data['percentiles'] = list(self.histogram.percentiles())
+            self._log("Statistical levels L10:%.1f L50:%.1f L90:%.1f L95:%.1f dB over %i s.",
+                args=tuple(self.sensor_data['percentiles']) + (self.histogram.seconds,))
+            self.histogram.reset()
+        else:
+            self.sensor_data['percentiles'] = []
+
+    def short_term_level(self, level):
+        """Counts a short-term (125ms) level in the histogram and the event detector"""
+        self.histogram.add(level)
+        if self.detector is not None:
+            event = self.detector.update(level)
+            if event != EVENT_NONE:
+                self.event = event
+
+    def monitor(self):
+        """Samples continuously, sending an uplink as soon as a noise event starts or ends and a heartbeat otherwise"""
+        self._log("Starting monitoring mode")
+        self.deepsleep_time = 0                 # sampling continuously, no deepsleep after transmissions
+        chunk = self.sensor_params["sample_rate"] * self.monitor_params["chunk_ms"] // 1000
+        if self.sensor_params["timer_sampling"]:
+            # the alarm keeps filling the buffers while the main loop processes and transmits
+            self.sampler = Sampler(self.sensor_adc().value, self.sensor_params["sample_rate"], self.sensor_params["buffer_size"])
+            self.lora_socket.setblocking(False) # send_uplink returns before the end of the TX/RX windows
+            self.socket_blocking = False
+            self.sampler.start()
+        start = utime.ticks_ms()
+        self.meter.reset()
+        while True:
+            if self.sampler is None:
+                self.meter.acquire(self.sensor_adc().value, chunk)
+            else:
+                buf = self.sampler.poll()
+                if buf is None:
+                    machine.idle()
+                    continue
+                self.meter.integrate(buf)
+                self.sampler.release()
+            if self.event != EVENT_NONE and not self.tx_busy():
+                self.send_event()               # kept for the next chunk when the uplink is deferred
+            self.send_retry()                   # an event uplink without ack
+            self.flush_log()
+            elapsed = utime.ticks_diff(utime.ticks_ms(), start)
+            if elapsed >= self.monitor_params["heartbeat"] * 1000 and not self.tx_busy():
+                self.summarise_sensor_data(elapsed // 1000)
+                self.send_sensor_data()
+                self.meter.reset()
+                start = utime.ticks_ms()
+                if self.sampler is not None:
+                    self._log("Sampler: %i samples, %i buffer overruns, ISR jitter max %i us, mean %i us", args=self.sampler.stats())
+
+    def send_event(self):
+        """Sending a noise event transition (start/end, peak level and duration) on the event port"""
+        started = self.event == EVENT_START
+        pkt = encode_event(started, self.detector.peak, self.detector.duration)
+        self._log("Noise event %s: peak %.0f dB, %.0f s", args=('started' if started else 'ended', self.detector.peak, self.detector.duration))
+        if self.send_uplink(pkt, port=self.monitor_params["event_port"], priority=ALERT):
+            self.event = EVENT_NONE
+
+    def sensor_adc(self):
+        """Returns the analog channel of the microphone, configured once"""
+        if self.adc is None:
+            self.adc = machine.ADC().channel(pin=self.sensor_params["pin"], attn=machine.ADC.ATTN_11DB)
+        return self.adc
 
     def send_sensor_data(self):
-        """Sending sensor data through LoRa"""                               # over-size detection....
-        pkt = self.array2packet(self.sensor_data['ppm'])
-        self.send_uplink(pkt)
+        """Sending sensor data through LoRa, or adding it to the batch until the batch is due"""
+        levels = self.sensor_data['levels'] + self.sensor_data['percentiles']
+        if self.batch is not None and self.deepsleep_time > 0:
+            cycle = self.sensor_params["interval"] + self.deepsleep_time
+            self.batch.add(self.sensor_data['levels'], self.sensor_data['percentiles'], cycle)
+            if not self.batch.due(cycle):
+                self._log("Batched %i/%i summaries (oldest %i s), not sending", args=(self.batch.count, self.batch.size, self.batch.age))
+                self.batch.save()
+                self.deepsleep(self.deepsleep_time*1000)
+                return
+            count = self.fit_batch()
+            delay = self.uplink_delay(len(codec.encode(self.batch.levels(count), self.payload)))
+            if delay > 0:
+                # keeping the summaries until the duty cycle allows the uplink
+                self._log("Duty-cycle budget exhausted, sending the batch in %i s", args=(delay,))
+                self.batch.save()
+                self.deepsleep(max(delay, self.deepsleep_time)*1000)
+                return
+            levels = self.batch.levels(count)
+            self.batch.drop(count)              # summaries not fitting are sent by the next uplinks
+            self.batch.save()
+        pkt = codec.encode(levels, self.payload)
+        if not self.send_uplink(pkt) and self.deepsleep_time > 0:
+            self.deepsleep(max(self.uplink_delay(len(pkt)), self.deepsleep_time)*1000)   # no TX event will follow
+
+    def send_profile(self):
+        """Sending the timing histograms of the wake-up phases on the profile port, every N wake-up cycles"""
+        if self.profiler is None:
+            if self.requested(REQ_PROFILE):
+                self._log("Profile requested, but the profiler is disabled")
+                self.commands.done(REQ_PROFILE)
+            return
+        if not (self.profiler.due() or self.requested(REQ_PROFILE)):
+            return
+        pkt = self.profiler.payload()
+        if self.commands is not None:
+            self.commands.done(REQ_PROFILE)
+        self.profiler.reset()                   # saved at deepsleep
+        self._log("Sending wake-up profile (%i bytes)", args=(len(pkt),))
+        if not self.send_uplink(pkt, port=self.profile_params["port"]) and self.deepsleep_time > 0:
+            self.deepsleep(self.deepsleep_time*1000)   # no TX event will follow
+
+    def send_config(self):
+        """Sending the settings in use on the command port, when a command frame requested them"""
+        if not self.requested(REQ_CONFIG):
+            return
+        pkt = self.commands.config_dump(self.deepsleep_time, self.datarate, self.confirmed_tx,
+            0 if self.batch is None else self.batch.size)
+        self.commands.done(REQ_CONFIG)
+        self._log("Sending config dump (%i bytes)", args=(len(pkt),))
+        if not self.send_uplink(pkt, port=self.command_params["port"]) and self.deepsleep_time > 0:
+            self.deepsleep(self.deepsleep_time*1000)   # no TX event will follow
+
+    def fit_batch(self):
+        """Returns the number of batched summaries of the largest payload allowed by the datarate and the duty-cycle budget"""
+        self.adapt_datarate()
+        # airtime (ms) left in the sub-band bucket of the best channel, the one send_uplink can still choose
+        budget = max(self.dutycycle.budget(f) for f in self.lora_params["channels"].values())
+        for count in range(self.batch.count, 1, -1):
+            if airtime.fits(len(codec.encode(self.batch.levels(count), self.payload)), self.datarate, budget):
+                break
+        else:
+            count = 1
+        if count < self.batch.count:
+            self._log("Sending %i of %i batched summaries (max. %i bytes @dr %i, budget %i ms)",
+                args=(count, self.batch.count, airtime.max_payload(self.datarate), self.datarate, budget))
+        return count
 
     def SpreadFactorRangeTest(self):
         """Sending 20bytes packets at all SF's(DR0-5)"""
         for i in range(0,6):
             self.datarate = i
-            self.send_uplink(self.array2packet(list(range(20))))
-            time.sleep(10)
+            pkt = self.array2packet(list(range(20)))
+            self.send_uplink(pkt)
+            self.flush_log()
+            time.sleep(max(10, self.uplink_delay(len(pkt))))
 
 
     def simulate_dB_transmission(self, delay=25):
@@ -290,7 +752,8 @@ class NoiseNode:
             data = self.sensor_data_dB(sound_level=data)
             pkt = self.array2packet([data])
             self.send_uplink(pkt)
-            time.sleep(delay)
+            self.flush_log()
+            time.sleep(max(delay, self.uplink_delay(len(pkt))))
 
     def sensor_data_dB(self, sound_level):
         """
@@ -302,34 +765,50 @@ class NoiseNode:
 
     def simulate_fft_transmission(self, delay=20):
         while True:
-            data = self.sensor_data_fft()
+            if self.filterbank is None:
+                data = self.sensor_data_fft()
+            else:
+                data = self.sensor_data_bands()
             pkt = self.array2packet(data)
             self.send_uplink(pkt)
-            time.sleep(delay)  # implement non blocking
+            self.flush_log()
+            time.sleep(max(delay, self.uplink_delay(len(pkt))))  # implement non blocking
 
     def sensor_data_fft(self):
         """
-        Return sound-spectrum-analysis from micro. (dummy test)
+        Return sound-spectrum-analysis from micro (20 band levels in dB).
         """
-        self._log('Recolting dummy sensor data (fft)...')
-        # pass sensor implementation...
-        data = [uos.urandom(1)[0] for i in range(20)]
-        return data
+        self._log('Recolting sensor data (fft)...')
+        sample_into(self.fft_samples, self.sensor_adc().value, self.sensor_params["sample_rate"])
+        return self.spectrum.analyse(self.fft_samples)
+
+    def sensor_data_bands(self):
+        """
+        Return the 1/3-octave band levels (Leq in dB) from micro during the sensor interval.
+        """
+        self._log('Recolting sensor data (1/3-octave bands)...')
+        self.filterbank.reset()
+        remaining = self.sensor_params["interval"] * self.sensor_params["sample_rate"]
+        while remaining > 0:
+            n = min(remaining, len(self.fft_samples))
+            sample_into(self.fft_samples, self.sensor_adc().value, self.sensor_params["sample_rate"], 0, n)
+            self.filterbank.process(self.fft_samples, 0, n)
+            remaining -= n
+        return [max(0, min(127, int(level + 0.5))) for level in self.filterbank.levels()]
 
     def simulate_packetloss(self, count=5, delay=20):
         self._log("Node configuration")
-        self._log("Starting packet-loss test (count: %i, delay: %i)" %
-                  (count, delay))
+        self._log("Starting packet-loss test (count: %i, delay: %i)", args=(count, delay))
         self.deepsleep_time = 0
         data = 0
-        self.tx_stats["tx_conf"] = 0
+        acked = self.uplinks.acked
         for i in range(count):
             data = self.sensor_data_dB(sound_level=data)
             pkt = self.array2packet([data])
             self.send_uplink(pkt)
-            time.sleep(delay)
-        self._log("%i/%i packets were succesfully sent & confirmed" %
-                  (self.tx_stats["tx_conf"], count))
+            self.flush_log()
+            time.sleep(max(delay, self.uplink_delay(len(pkt))))
+        self._log("%i/%i packets were succesfully sent & confirmed", args=(self.uplinks.acked - acked, count))
 
 #--------------- OLD CODE -----------------------------------------------------------------------------#
     # def simulate_sensor_data_transmission_v2(self):
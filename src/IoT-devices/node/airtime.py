@@ -0,0 +1,42 @@
+""" LoRa time on air (SX1276 datasheet formulas) and the EU868 payload limits of the LoRaWAN datarates """
+
+LORAWAN_OVERHEAD    = 13                # MHDR (1), FHDR without FOpts (7), FPort (1) and MIC (4) bytes of an uplink
+PREAMBLE            = 8                 # preamble symbols of LoRaWAN
+DUTY_CYCLE          = 0.01              # EU868 duty cycle of the default channels (g1 sub-band, 1%)
+
+# EU868 datarates: (spreading factor, bandwidth Hz) and max. application payload without FOpts (bytes)
+EU868_DATARATES     = {0: (12, 125000), 1: (11, 125000), 2: (10, 125000), 3: (9, 125000), 4: (8, 125000), 5: (7, 125000), 6: (7, 250000)}
+EU868_MAX_PAYLOAD   = {0: 51, 1: 51, 2: 51, 3: 115, 4: 222, 5: 222, 6: 222}
+
+
+def time_on_air(size, sf, bw=125000, cr=1, preamble=PREAMBLE, header=True, crc=True, ldro=None):
+    """
+    Returns the time on air (ms) of a LoRa frame of size PHY payload bytes. cr is the coding rate
+    index (1: 4/5 .. 4: 4/8), header the explicit header mode; low data rate optimisation is on when
+    a symbol lasts longer than 16 ms, as set by the LoRaWAN stack, unless ldro is given.
+    """
+    t_sym = (1 << sf) * 1000 / bw
+    if ldro is None:
+        ldro = t_sym > 16
+    de = 1 if ldro else 0
+    bits = 8 * size - 4 * sf + 28 + (16 if crc else 0) - (0 if header else 20)
+    symbols = 8
+    if bits > 0:
+        symbols += -(-bits // (4 * (sf - 2 * de))) * (cr + 4)  # ceiling division
+    return (preamble + 4.25 + symbols) * t_sym
+
+
+def uplink_time_on_air(payload, dr, cr=1):
+    """ Returns the time on air (ms) of a LoRaWAN uplink of payload application bytes at the EU868 datarate dr """
+    sf, bw = EU868_DATARATES[dr]
+    return time_on_air(payload + LORAWAN_OVERHEAD, sf, bw, cr)
+
+
+def max_payload(dr):
+    """ Returns the max. application payload (bytes) of the EU868 datarate dr """
+    return EU868_MAX_PAYLOAD[dr]
+
+
+def fits(payload, dr, budget):
+    """ True when an uplink of payload bytes is allowed at dr and takes at most budget ms on air """
+    return payload <= EU868_MAX_PAYLOAD[dr] and uplink_time_on_air(payload, dr) <= budget
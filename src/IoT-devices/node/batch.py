@@ -0,0 +1,112 @@
+""" Interval summaries batched across deepsleep wake-ups, sent as a single uplink """
+
+import struct
+from array import array
+import persist
+import codec
+
+HEADER      = '>BBHB'                   # summaries, capacity, age (s), statistical levels present
+
+
+class Batch:
+    """
+    Stores the (LAeq, LAmax, LAmin) summaries of up to size wake-ups in NVS. The batch is due when
+    it is full or when the oldest summary would be older than max_latency at the next wake-up.
+    The payload holds the LAeq, LAmax and LAmin series one after the other (small deltas for the
+    codec), followed by the last statistical levels (L10..L95) when there are any.
+    """
+
+    def __init__(self, size=6, max_latency=900, key='lvl_batch'):
+        self.key            = key                           # persistent storage key
+        self.size           = size                          # summaries per uplink
+        self.max_latency    = max_latency                   # max. age of the oldest summary when it is sent (s)
+        self.values         = array('H', [0] * (3 * size))  # summaries in 0.1 dB, one series per level
+        self.percentiles    = array('H', [0] * 4)
+        self.reset()
+
+    def reset(self):
+        """ Empties the batch after it was sent """
+        self.count = 0
+        self.age = 0                                        # seconds since the start of the oldest summary
+        self.has_percentiles = False
+
+    def add(self, levels, percentiles, seconds):
+        """ Appends a summary (LAeq, LAmax, LAmin) measured seconds after the previous one """
+        if self.count == self.size:                         # never sent (e.g. failed transmissions), dropping the oldest
+            for s in range(3):
+                base = s * self.size
+                for i in range(self.size - 1):
+                    self.values[base + i] = self.values[base + i + 1]
+            self.age -= self.age // self.count              # the interval of the dropped summary (evenly spaced)
+            self.count -= 1
+        for s in range(3):
+            self.values[s * self.size + self.count] = codec.quantise(levels[s])
+        self.count += 1
+        self.age = min(0xffff, self.age + seconds)
+        if percentiles:
+            for i in range(4):
+                self.percentiles[i] = codec.quantise(percentiles[i])
+            self.has_percentiles = True
+
+    def due(self, cycle):
+        """ True when the batch must be sent now, cycle being the time (s) until the next summary """
+        return self.count >= self.size or self.age + cycle > self.max_latency
+
+    def levels(self, count=None):
+        """ Returns the payload levels (dB) of the oldest count summaries (all by default): LAeq series,
+        LAmax series, LAmin series and the statistical levels """
+        if count is None:
+            count = self.count
+        levels = []
+        for s in range(3):
+            base = s * self.size
+            levels += [self.values[base + i] / codec.RESOLUTION for i in range(count)]
+        if self.has_percentiles:
+            levels += [value / codec.RESOLUTION for value in self.percentiles]
+        return levels
+
+    def drop(self, count):
+        """ Removes the oldest count summaries (and the statistical levels) after they were sent """
+        for s in range(3):
+            base = s * self.size
+            for i in range(self.count - count):
+                self.values[base + i] = self.values[base + count + i]
+        if count >= self.count:
+            self.reset()
+            return
+        self.age = self.age * (self.count - count) // self.count   # summaries are evenly spaced
+        self.count -= count
+        self.has_percentiles = False
+
+    def resize(self, size):
+        """ Changes the number of summaries per uplink, keeping the newest summaries that fit """
+        if size == self.size:
+            return
+        keep = min(self.count, size)
+        values = array('H', [0] * (3 * size))
+        for s in range(3):
+            for i in range(keep):
+                values[s * size + i] = self.values[s * self.size + self.count - keep + i]
+        if keep < self.count:
+            self.age = self.age * keep // self.count
+        self.values, self.size, self.count = values, size, keep
+
+    def save(self):
+        persist.save(self.key, struct.pack(HEADER, self.count, self.size, self.age, self.has_percentiles)
+            + bytes(self.values) + bytes(self.percentiles))
+
+    def restore(self):
+        """ Loads the batch of the previous wake-ups, a batch of another size is dropped """
+        data = persist.load(self.key)
+        if data is None or len(data) < struct.calcsize(HEADER):
+            return
+        count, size, age, has_percentiles = struct.unpack_from(HEADER, data)
+        if size != self.size:
+            return
+        offset = struct.calcsize(HEADER)
+        values = array('H', data[offset:offset + 6 * size])
+        percentiles = array('H', data[offset + 6 * size:offset + 6 * size + 8])
+        if len(values) != 3 * size or len(percentiles) != 4:
+            return
+        self.values, self.percentiles = values, percentiles
+        self.count, self.age, self.has_percentiles = count, age, bool(has_percentiles)
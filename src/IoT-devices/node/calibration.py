@@ -0,0 +1,65 @@
+""" Precomputed ADC and sound level calibration tables of the ICS-40300/OPA344 front end, stored in flash """
+
+import struct
+from array import array
+
+MAGIC       = b'CAL1'
+HEADER      = '<4sHHhh'                 # magic, number of codes, number of levels, level base and step (centi-dB)
+N_CODES     = 4096                      # 12-bit ADC
+LEVEL_BASE  = 0                         # uncalibrated level of the first level entry (centi-dB re 1 count rms)
+LEVEL_STEP  = 10                        # uncalibrated level step between two level entries (centi-dB)
+N_LEVELS    = 1001                      # 0 - 100 dB re 1 count rms
+
+
+def identity_codes(bias):
+    """ Returns the code table of an ideal ADC: raw code minus the microphone's dc-bias """
+    return array('h', [code - bias for code in range(N_CODES)])
+
+
+class Calibration:
+    """
+    Two dense integer tables: codes maps a raw ADC code to a linearised, bias-free sample
+    (one lookup per sample) and levels maps an uncalibrated level (dB re 1 count rms, 0.1 dB
+    steps) to centi-dB SPL (one lookup per level). Both are built on the host by fit_calibration.py.
+    """
+
+    def __init__(self, codes, levels, level_base=LEVEL_BASE, level_step=LEVEL_STEP):
+        self.codes      = codes                 # array('h'): raw code -> linearised sample (counts)
+        self.levels     = levels                # array('h'): uncalibrated level index -> centi-dB SPL
+        self.level_base = level_base
+        self.level_step = level_step
+
+    def to_db(self, level):
+        """ Returns the calibrated level (dB SPL) of an uncalibrated level (dB re 1 count rms) """
+        i = int((level * 100 - self.level_base) / self.level_step + 0.5)
+        if i < 0:
+            i = 0
+        elif i >= len(self.levels):
+            i = len(self.levels) - 1
+        return self.levels[i] / 100
+
+    def to_bytes(self):
+        return (struct.pack(HEADER, MAGIC, len(self.codes), len(self.levels), self.level_base, self.level_step)
+            + bytes(self.codes) + bytes(self.levels))
+
+    def save(self, path):
+        """ Writes the tables to flash (little-endian int16, as in memory) """
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        """ Reads the tables straight into preallocated arrays, returns None when there is no calibration file """
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return None
+        with f:
+            magic, n_codes, n_levels, base, step = struct.unpack(HEADER, f.read(struct.calcsize(HEADER)))
+            if magic != MAGIC:
+                return None
+            codes = array('h', bytes(2 * n_codes))
+            levels = array('h', bytes(2 * n_levels))
+            f.readinto(memoryview(codes))
+            f.readinto(memoryview(levels))
+        return cls(codes, levels, base, step)
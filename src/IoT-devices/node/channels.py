@@ -0,0 +1,105 @@
+""" Channel selection by Thompson sampling over the per-channel delivery of the uplinks """
+
+import math
+from array import array
+import persist
+
+try:
+    from uos import urandom
+except ImportError:                     # CPython (host tools)
+    from os import urandom
+
+PRIOR       = 1                         # Beta(1, 1) prior: unknown channels are tried
+CAP         = 32                        # counts are halved above this, so the selector follows changing interference
+
+
+def uniform():
+    """ Returns a uniform random number in (0, 1) """
+    b = urandom(3)
+    return ((b[0] << 16 | b[1] << 8 | b[2]) + 1) / 16777218
+
+
+def gamma(shape):
+    """ Gamma(shape, 1) sample of an integer shape, as a sum of exponential samples """
+    x = 0.0
+    for _ in range(shape):
+        x -= math.log(uniform())
+    return x
+
+
+def beta(a, b):
+    """ Beta(a, b) sample of integer a, b """
+    x = gamma(a)
+    return x / (x + gamma(b))
+
+
+class ChannelSelector:
+    """
+    Counts the delivered (acked or answered) and failed uplinks of every channel in NVS. select()
+    draws a delivery ratio of every channel from its Beta(delivered + 1, failed + 1) posterior and
+    returns the channel with the highest draw: channels with the best delivery are chosen most,
+    channels with few observations are still tried now and then. The counts of a channel are halved
+    when they exceed CAP, so older outcomes weigh less.
+
+    Only confirmed uplinks and joins are counted: an unconfirmed uplink without downlink may as well
+    have been delivered, so counting it as failed would punish every channel alike and counting only
+    the answered ones would favour the channels that happened to carry downlinks. With confirmed_tx
+    off the counts thus come from the alerts, retries and joins, and the routine uplinks use them.
+    """
+
+    def __init__(self, frequencies, key='chan_stats'):
+        self.key        = key                           # persistent storage key
+        self.frequencies = list(frequencies)
+        self.delivered  = array('H', [0] * len(self.frequencies))
+        self.failed     = array('H', [0] * len(self.frequencies))
+        self.pending    = None                          # channel of the uplink waiting for its outcome
+
+    def index(self, frequency):
+        return self.frequencies.index(frequency) if frequency in self.frequencies else None
+
+    def ratio(self, frequency):
+        """ Returns the posterior mean delivery ratio of frequency """
+        i = self.index(frequency)
+        return (self.delivered[i] + PRIOR) / (self.delivered[i] + self.failed[i] + 2 * PRIOR)
+
+    def select(self, frequencies=None):
+        """ Returns the channel (of frequencies, default all) with the highest sampled delivery ratio """
+        best, draw = None, -1.0
+        for frequency in (self.frequencies if frequencies is None else frequencies):
+            i = self.index(frequency)
+            if i is None:
+                continue
+            p = beta(self.delivered[i] + PRIOR, self.failed[i] + PRIOR)
+            if p > draw:
+                best, draw = frequency, p
+        return best
+
+    def sent(self, frequency):
+        """ Notes the channel of an uplink, its outcome is recorded by record() """
+        self.pending = frequency
+
+    def record(self, delivered, frequency=None):
+        """ Counts the outcome of the pending uplink (or of frequency), once """
+        if frequency is None:
+            frequency, self.pending = self.pending, None
+        i = None if frequency is None else self.index(frequency)
+        if i is None:
+            return
+        if delivered:
+            self.delivered[i] += 1
+        else:
+            self.failed[i] += 1
+        if self.delivered[i] + self.failed[i] > CAP:
+            self.delivered[i] >>= 1
+            self.failed[i] >>= 1
+
+    def save(self):
+        persist.save(self.key, bytes(self.delivered) + bytes(self.failed))
+
+    def restore(self):
+        data = persist.load(self.key)
+        n = 2 * len(self.frequencies)
+        if data is None or len(data) != 2 * n:
+            return
+        self.delivered = array('H', data[:n])
+        self.failed = array('H', data[n:])
@@ -0,0 +1,157 @@
+""" Delta-of-delta bit-packed payload codec for batches of sound levels (MicroPython node and CPython decoder)
+
+Payload, MSB-first: count (8 bits), mode (2 bits), first value (16 bits, 0.1 dB), then the residual of every
+following value in one of the variable-width classes of the mode's table. The residual is the delta (order 1)
+or the delta-of-delta (order 2) of the values; the encoder picks the order and table of the smallest payload,
+e.g. 1 bit per value of a steady level, 5 bits per value of a noisy one.
+"""
+
+RESOLUTION  = 10                        # values per dB (0.1 dB)
+MAX_COUNT   = 255                       # values per batch
+# residual classes: (prefix, prefix bits, value bits), value range (-2^(n-1), 2^(n-1)], the last class is raw 16 bits
+STEADY      = ((0b0, 1, 0), (0b10, 2, 4), (0b110, 3, 7), (0b1110, 4, 10), (0b1111, 4, 16))
+NOISY       = ((0b00, 2, 3), (0b01, 2, 5), (0b10, 2, 8), (0b110, 3, 11), (0b111, 3, 16))
+MODES       = ((2, STEADY), (2, NOISY), (1, STEADY), (1, NOISY))   # (order, classes) of the 2-bit mode
+
+
+class BitWriter:
+    """ Appends bit fields MSB-first to a preallocated bytearray """
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.reset()
+
+    def reset(self):
+        self.pos = 0                    # bytes written
+        self.acc = 0                    # pending bits
+        self.n = 0                      # number of pending bits
+
+    def write(self, value, width):
+        self.acc = (self.acc << width) | (value & ((1 << width) - 1))
+        self.n += width
+        while self.n >= 8:
+            self.n -= 8
+            self.buf[self.pos] = (self.acc >> self.n) & 0xff
+            self.pos += 1
+        self.acc &= (1 << self.n) - 1
+
+    def flush(self):
+        """ Pads the last byte with zero bits, returns the number of bytes written """
+        if self.n:
+            self.write(0, 8 - self.n)
+        return self.pos
+
+
+class BitReader:
+    """ Reads bit fields MSB-first from a bytes-like object """
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0                    # bytes read
+        self.acc = 0
+        self.n = 0
+
+    def read(self, width):
+        while self.n < width:
+            self.acc = (self.acc << 8) | self.data[self.pos]
+            self.pos += 1
+            self.n += 8
+        self.n -= width
+        value = self.acc >> self.n
+        self.acc &= (1 << self.n) - 1
+        return value
+
+
+def quantise(level):
+    """ Returns the level (dB) in 0.1 dB steps, clipped to 16 bits """
+    value = int(level * RESOLUTION + 0.5)
+    return 0 if value < 0 else 0xffff if value > 0xffff else value
+
+
+def _residual_class(classes, residual):
+    for c in classes:
+        bits = c[2]
+        if bits == 0:
+            if residual == 0:
+                return c
+        elif bits == 16 or -(1 << (bits - 1)) < residual <= 1 << (bits - 1):
+            return c
+
+
+def _residuals(values, order):
+    """ Yields the residuals of values[1:] """
+    prev, delta = values[0], 0
+    for i in range(1, len(values)):
+        d = values[i] - prev
+        yield d - delta if order == 2 else d
+        prev, delta = values[i], d
+
+
+def encoded_size(count):
+    """ Returns the worst-case size (bytes) of a batch of count values """
+    return (26 + count * 19 + 7) // 8
+
+
+def encode(levels, buf=None):
+    """ Encodes the levels (dB) at 0.1 dB resolution, into buf when given, returns a memoryview of the payload """
+    count = len(levels)
+    if count > MAX_COUNT:
+        raise ValueError('at most %i values per batch' % MAX_COUNT)
+    if buf is None:
+        buf = bytearray(encoded_size(count))
+    writer = BitWriter(buf)
+    writer.write(count, 8)
+    if count == 0:
+        return memoryview(buf)[:writer.flush()]
+    values = [quantise(level) for level in levels]
+    best, best_bits = 0, -1
+    for mode in range(len(MODES)):
+        order, classes = MODES[mode]
+        bits = 0
+        for residual in _residuals(values, order):
+            c = _residual_class(classes, residual)
+            bits += c[1] + c[2]
+        if best_bits < 0 or bits < best_bits:
+            best, best_bits = mode, bits
+    order, classes = MODES[best]
+    writer.write(best, 2)
+    writer.write(values[0], 16)
+    for residual in _residuals(values, order):
+        prefix, prefix_bits, value_bits = _residual_class(classes, residual)
+        writer.write(prefix, prefix_bits)
+        if value_bits:
+            writer.write(residual, value_bits)                  # two's complement, modulo 16 bits in the raw class
+    return memoryview(buf)[:writer.flush()]
+
+
+def decode(data):
+    """ Decodes a payload of encode() into a list of levels (dB) """
+    reader = BitReader(data)
+    count = reader.read(8)
+    if count == 0:
+        return []
+    order, classes = MODES[reader.read(2)]
+    value = reader.read(16)
+    levels = [value / RESOLUTION]
+    delta = 0
+    for _ in range(count - 1):
+        prefix, bits = 0, 0
+        for prefix_code, prefix_bits, value_bits in classes:
+            while bits < prefix_bits:
+                prefix = (prefix << 1) | reader.read(1)
+                bits += 1
+            if prefix == prefix_code:
+                break
+        else:
+            raise ValueError('invalid residual prefix')
+        residual = 0
+        if value_bits:
+            residual = reader.read(value_bits)
+            if residual > 1 << (value_bits - 1):
+                residual -= 1 << value_bits
+        d = residual + delta if order == 2 else residual
+        d = ((value + d) & 0xffff) - value                     # the raw class is modulo 16 bits
+        value += d
+        delta = d
+        levels.append(value / RESOLUTION)
+    return levels
@@ -0,0 +1,129 @@
+""" Downlink command protocol: retuning the node's settings over the air, without reflashing """
+
+import struct
+from array import array
+import persist
+
+# frame: sequence number (1 byte), then commands of an opcode (1 byte) and fixed-size big-endian arguments
+SET_INTERVAL    = 0x01                  # uint32: deepsleep time between two measurements (s)
+SET_DR          = 0x02                  # uint8: uplink datarate (DR0..DR5)
+SET_CONFIRMED   = 0x03                  # uint8: confirmed uplinks (0/1)
+SET_BATCH       = 0x04                  # uint8: summaries per batched uplink
+REQ_PROFILE     = 0x05                  # no argument: sending the wake-up profile
+REQ_CONFIG      = 0x06                  # no argument: sending a dump of the settings
+
+# settings, indexed by opcode - 1: (struct format, min, max)
+SETTINGS        = (('>I', 0, 7 * 24 * 3600), ('>B', 0, 5), ('>B', 0, 1), ('>B', 1, 48))
+SIZES           = tuple(struct.calcsize(fmt) for fmt, low, high in SETTINGS)
+UNSET           = -1                    # setting not changed over the air, the config value applies
+CONFIG_DUMP     = '>BIbbb'              # sequence number, settings in use: interval, datarate, confirmed, batch size (0: disabled)
+HEADER          = '>hB'                 # last applied sequence number (-1: none), pending requests
+
+
+class Commands:
+    """
+    Parses the command frames received on the command port and keeps the settings changed over
+    the air in NVS, so they override the config after every deepsleep and reset. A frame is staged
+    first and only applied when all its commands are valid: the settings change all together or not
+    at all. Frames repeating the last sequence number (retransmitted downlinks) are ignored. The
+    requests (profile, config dump) stay pending until the node sends the answer.
+    """
+
+    def __init__(self, key='commands'):
+        self.key        = key                           # persistent storage key
+        self.values     = array('i', [UNSET] * len(SETTINGS))
+        self.staged     = array('i', [UNSET] * len(SETTINGS))
+        self.seq        = -1                            # sequence number of the last applied frame
+        self.requests   = 0                             # bit mask of the pending requests (1 << opcode)
+
+    def get(self, opcode, default):
+        """ Returns the setting of opcode, default when it was not changed over the air """
+        value = self.values[opcode - 1]
+        return default if value == UNSET else value
+
+    def stage(self, frame):
+        """ Parses frame into the staged settings, returns the requests of the frame or None when it is invalid """
+        data = memoryview(frame)
+        if len(data) < 1:
+            return None
+        for i in range(len(SETTINGS)):
+            self.staged[i] = self.values[i]
+        requests = 0
+        offset = 1
+        while offset < len(data):
+            opcode = data[offset]
+            offset += 1
+            if SET_INTERVAL <= opcode <= SET_BATCH:
+                fmt, low, high = SETTINGS[opcode - 1]
+                size = SIZES[opcode - 1]
+                if offset + size > len(data):
+                    return None                         # truncated argument
+                value = struct.unpack_from(fmt, data, offset)[0]
+                if not low <= value <= high:
+                    return None
+                self.staged[opcode - 1] = value
+                offset += size
+            elif opcode == REQ_PROFILE or opcode == REQ_CONFIG:
+                requests |= 1 << opcode
+            else:
+                return None                             # unknown opcode, the argument sizes are unknown from here
+        return requests
+
+    def apply(self, frame):
+        """ Applies and persists a command frame, returns False when it is invalid or a repeated frame """
+        if len(frame) < 1 or frame[0] == self.seq:
+            return False
+        requests = self.stage(frame)
+        if requests is None:
+            return False
+        self.values, self.staged = self.staged, self.values
+        self.requests |= requests
+        self.seq = frame[0]
+        self.save()
+        return True
+
+    def pending(self, opcode):
+        """ True when the request of opcode waits for its answer """
+        return bool(self.requests & (1 << opcode))
+
+    def done(self, opcode):
+        """ Clears the request of opcode once it is answered """
+        if self.pending(opcode):
+            self.requests &= ~(1 << opcode)
+            self.save()
+
+    def config_dump(self, interval, dr, confirmed, batch):
+        """ Returns the payload answering REQ_CONFIG with the settings in use (batch 0: batching disabled) """
+        return struct.pack(CONFIG_DUMP, max(self.seq, 0), interval, dr, confirmed, batch)
+
+    def save(self):
+        persist.save(self.key, struct.pack(HEADER, self.seq, self.requests) + bytes(self.values))
+
+    def restore(self):
+        data = persist.load(self.key)
+        n = struct.calcsize(HEADER)
+        if data is None or len(data) != n + 4 * len(SETTINGS):
+            return
+        self.seq, self.requests = struct.unpack_from(HEADER, data)
+        self.values = array('i', data[n:])
+
+
+def encode(seq, commands):
+    """ Returns the command frame of the (opcode, value) commands, value None for the requests (backend side) """
+    frame = bytearray([seq & 0xff])
+    for opcode, value in commands:
+        frame.append(opcode)
+        if SET_INTERVAL <= opcode <= SET_BATCH:
+            fmt, low, high = SETTINGS[opcode - 1]
+            if not low <= value <= high:
+                raise ValueError('value %s out of range [%s, %s] for opcode %i' % (value, low, high, opcode))
+            frame += struct.pack(fmt, value)
+        elif opcode not in (REQ_PROFILE, REQ_CONFIG):
+            raise ValueError('unknown opcode %i' % opcode)
+    return bytes(frame)
+
+
+def decode_config(payload):
+    """ Returns the settings of a config dump uplink as a dict (backend side) """
+    seq, interval, dr, confirmed, batch = struct.unpack(CONFIG_DUMP, payload)
+    return {'seq': seq, 'interval': interval, 'dr': dr, 'confirmed': bool(confirmed), 'batch': batch}
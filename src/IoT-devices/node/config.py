@@ -8,6 +8,8 @@ DEBUG = True                                 # debug mode (printing the node log
 DEEPSLEEP_TIME = 0                           # time node is sleeping during between transmission,  0 to disable deepsleep
 
 LORA_CHANNELS   = {0:868100000, 1:868300000, 2:868500000, 3:867100000, 4:867300000, 5:867500000, 6:867700000, 7:867900000, 8:868800000}
+GATEWAY_CHANNELS = {0:868100000}             # channels the single-channel NoiseGateway listens on (single-gateway/config_*.py LORA_FREQUENCY)
+PYGATE_CHANNELS = {0:868100000, 1:868300000, 2:868500000, 3:867100000, 4:867300000, 5:867900000}  # LoRa channels of multi-gateway/global_conf.json
 
 # LoRa parameters
 LORA_PARAMETERS = {
@@ -16,15 +18,92 @@ LORA_PARAMETERS = {
     "mode":         LoRa.LORAWAN,             # LoRaWAN as networking protocol (v1.0.2)
     "activation":   'OTAA',                   # activation mode (ABP/OTAA)
     "channel":      LORA_CHANNELS[0],         # channel for transmission (868 MHz sub-channel)
+    "channels":     GATEWAY_CHANNELS,         # channels the uplinks are spread over (only ones the gateway listens on: PYGATE_CHANNELS with the PyGate)
     "cr":           LoRa.CODING_4_5,          # coding rate, In LoRa.LORAWAN mode, only adr, public, tx_retries and device_class are used. All the other params will be ignored as they are handled by the LoRaWAN stack directly.
     "dr":           5,                        # datarate number defining the SF & BW (look-up online for the table) of the uplink messages
-    "join_dr":      0,                        # datarate of the join-request
+    "join_dr":      0,                        # datarate of the join-request after repeated failed attempts (most robust)
+    "join_dr_start": 5,                       # datarate of the first join-requests, stepped down to join_dr every 2 failed attempts
+    "join_backoff": 15,                       # deepsleep after the first failed join (s), doubling with every failed attempt
+    "join_backoff_max": 3600,                 # max. deepsleep between two join attempts (s)
     "join_timeout": 25000,                    # max. time during which the join-procedure can happen
     "adr":          False,                     # adaptive datarate (it is tuning P_tx, SF & BW for transmission optimalisation)
-    "confirmed_tx": False,                     # confirmed transmission (requesting a confirmed-downlink to the network server)
+    "confirmed_tx": False,                     # confirmed transmission of every uplink (else only of the alerts, see UPLINK_PARAMETERS)
+    "fport":        2,                        # LoRaWAN FPort of the sound level uplinks
     "retries":      2                         # number of retries allowed for an confirmed transmission (!! not working, stays at 2or3...)
     }
 
+# Sound sensor parameters (ICS-40300 microphone with OPA344 pre-amplifier on the analog pin)
+SENSOR_PARAMETERS = {
+    "pin":          'P16',                    # analog pin of the pre-amplifier output
+    "sample_rate":  8000,                     # ADC sampling frequency (Hz), the A-weighting is accurate up to ~sample_rate/3
+    "ring_size":    1024,                     # samples buffered between two processing passes
+    "timer_sampling": True,                   # monitoring mode samples with a timer alarm into two alternating buffers
+    "buffer_size":  1024,                     # samples per buffer of the timer-driven sampler
+    "spectrum":     'fft',                    # spectral payload: 'fft' (20 FFT bands) or 'filterbank' (1/3-octave band Leq's)
+    "fft_size":     256,                      # samples per spectrum analysis (power of 2, max. 1024), also the filterbank's sampling chunk
+    "bias":         2048,                     # ADC code of the microphone's dc-bias (half of the 12-bit range)
+    "cal_offset":   77.0,                     # dB SPL of a 1 ADC-count rms signal (-45 dBV/Pa microphone, unity gain, 11dB attenuation), used without calibration file
+    "calibration":  '/flash/cal.bin',         # calibration tables built with host/fit_calibration.py (ADC linearisation & level correction)
+    "interval":     10,                       # measuring time of one LAeq/LAmax/LAmin report (s)
+    "stats_interval": 3600                    # integration time of the statistical levels L10/L50/L90/L95 (s), spanning several wake-ups
+    }
+
+# Monitoring mode (continuous sampling, uplinks at the start and end of noise events and a periodic heartbeat)
+MONITOR_PARAMETERS = {
+    "enabled":      False,                    # monitoring mode instead of measuring, sending and deepsleeping
+    "on_level":     70.0,                     # short-term level starting an event (dB)
+    "off_level":    65.0,                     # short-term level ending an event (dB), on_level minus the hysteresis
+    "attack":       0.5,                      # time above on_level before an event starts (s)
+    "release":      2.0,                      # time below off_level before an event ends (s)
+    "heartbeat":    900,                      # interval of the periodic sound level uplinks (s)
+    "chunk_ms":     250,                      # sampling time between two event checks (ms)
+    "event_port":   3                         # LoRaWAN FPort of the event uplinks
+    }
+
+# Batching mode (summaries of several deepsleep wake-ups sent in one uplink, needs DEEPSLEEP_TIME > 0)
+BATCH_PARAMETERS = {
+    "enabled":      False,                    # batching the summaries instead of sending one uplink per wake-up
+    "size":         6,                        # summaries per uplink (LAeq/LAmax/LAmin of one interval each)
+    "max_latency":  900                       # max. age of the oldest summary when it is sent (s)
+    }
+
+# Wake-up profiler (timing histograms of the radio init, join, sensor, uplink and deepsleep phases kept in NVS)
+PROFILE_PARAMETERS = {
+    "enabled":      False,                    # timing the wake-up phases, costs nothing when disabled
+    "every":        24,                       # wake-up cycles per profile uplink
+    "port":         4                         # LoRaWAN FPort of the profile uplinks
+    }
+
+# Node-side datarate control (used when adr is off): fastest datarate keeping an SNR margin above the demodulation floor
+RATE_PARAMETERS = {
+    "enabled":      False,                    # choosing the uplink datarate from the SNR of the received downlinks
+    "dr_min":       0,                        # slowest datarate (SF12)
+    "dr_max":       5,                        # fastest datarate (SF7)
+    "window":       8,                        # downlinks of the SNR average
+    "margin":       5.0,                      # SNR above the demodulation floor of the datarate (dB)
+    "hysteresis":   3.0,                      # extra margin needed to step up to a faster datarate (dB)
+    "fail_limit":   2                         # consecutive failed (confirmed) uplinks stepping the datarate down
+    }
+
+# Uplink delivery: the uplinks of a high priority (noise events) are confirmed and retried, the routine levels are not
+UPLINK_PARAMETERS = {
+    "confirm_priority": 1,                    # lowest priority sent confirmed (0: every uplink, 1: alerts only)
+    "retries":      2                         # retries of a confirmed uplink without ack, at the next wake-ups
+    }
+
+# Downlink commands (see commands.py): interval, datarate, confirmed uplinks and batch size changed over the air
+COMMAND_PARAMETERS = {
+    "enabled":      True,                     # applying the command frames, the changed settings are kept in NVS
+    "port":         5                         # LoRaWAN FPort of the command downlinks and of the config dump uplinks
+    }
+
+# Unused radios of the FiPy: WLAN and the LTE modem are started by the firmware at every boot and draw their idle current while awake (the modem even in deepsleep)
+RADIO_PARAMETERS = {
+    "deinit":       False,                    # switching the radios off once after a cold boot (timed, kept in NVS), the deepsleep wake-ups skip it
+    "radios":       ('LTE', 'WLAN', 'Bluetooth'),  # radios switched off
+    "currents":     {'cpu': 40.0, 'LTE': 12.0, 'WLAN': 60.0, 'Bluetooth': 15.0}  # mA awake and idle per radio (energy.CURRENTS), for the payback in the log
+    }
+
 # LoRa session keys
 LORA_SESSION_KEYS = {
     # OTAA keys
@@ -0,0 +1,106 @@
+""" EU868 duty-cycle budget of the sub-bands (ETSI EN 300 220), persisted across deepsleep """
+
+import struct
+import persist
+
+try:
+    from utime import time
+except ImportError:                     # CPython (host tools)
+    from time import time
+
+# EU868 sub-bands: (lowest Hz, highest Hz, duty cycle)
+SUB_BANDS   = (
+    (863000000, 868000000, 0.01),       # g: 867.1 - 867.9 MHz channels
+    (868000000, 868600000, 0.01),       # g1: default channels 868.1, 868.3, 868.5 MHz
+    (868700000, 869200000, 0.001),      # g2: 868.8 MHz
+    (869400000, 869650000, 0.1),        # g3: RX2 869.525 MHz
+    (869700000, 870000000, 0.01),       # g4
+    )
+WINDOW      = 3600                      # averaging window of the duty cycle (s), the bucket holds duty * WINDOW airtime
+ENTRY       = '>fL'                     # tokens (ms), end of the off-time (s) of a sub-band
+HEADER      = '>L'                      # time of the last update (s)
+
+
+def sub_band(frequency):
+    """ Returns the index of the sub-band of frequency (Hz), None outside the EU868 band """
+    for i in range(len(SUB_BANDS)):
+        if SUB_BANDS[i][0] <= frequency <= SUB_BANDS[i][1]:
+            return i
+    return None
+
+
+class DutyCycle:
+    """
+    One token bucket of airtime (ms) per sub-band, refilled at the sub-band's duty cycle and charged
+    with the time on air of every uplink. Like the LoRaMAC stack, a sub-band is also closed during
+    the off-time of its last uplink (time on air * (1/duty - 1)), so a send is only attempted when the
+    stack will accept it. The buckets are saved before deepsleep and refilled with the time slept.
+    """
+
+    def __init__(self, key='duty', clock=time):
+        self.key        = key                           # persistent storage key
+        self.clock      = clock                         # seconds, kept by the RTC during deepsleep
+        self.tokens     = [duty * WINDOW * 1000 for _, _, duty in SUB_BANDS]
+        self.off_until  = [0] * len(SUB_BANDS)
+        self.updated    = int(self.clock())
+
+    def update(self):
+        """ Refills the buckets with the airtime earned since the last update """
+        now = int(self.clock())
+        elapsed = now - self.updated
+        if elapsed <= 0:                                # clock set back (e.g. power loss): no credit
+            self.updated = now
+            return now
+        for i in range(len(SUB_BANDS)):
+            duty = SUB_BANDS[i][2]
+            self.tokens[i] = min(duty * WINDOW * 1000, self.tokens[i] + duty * elapsed * 1000)
+        self.updated = now
+        return now
+
+    def wait(self, frequency, airtime):
+        """ Returns the time (s) until an uplink of airtime ms is allowed on frequency, 0 when it is allowed now """
+        now = self.update()
+        i = sub_band(frequency)
+        if i is None:
+            return None
+        wait = max(0, self.off_until[i] - now)
+        missing = airtime - self.tokens[i]
+        if missing > 0:
+            wait = max(wait, int(missing / (SUB_BANDS[i][2] * 1000)) + 1)
+        return wait
+
+    def budget(self, frequency):
+        """ Returns the airtime (ms) an uplink on frequency may take now: the tokens of its sub-band, 0 during the off-time """
+        now = self.update()
+        i = sub_band(frequency)
+        if i is None or self.off_until[i] > now:
+            return 0
+        return max(0, int(self.tokens[i]))
+
+    def next_uplink(self, frequencies, airtime):
+        """ Returns the time (s) until an uplink of airtime ms is allowed on one of the frequencies """
+        waits = [self.wait(frequency, airtime) for frequency in frequencies]
+        return min(w for w in waits if w is not None)
+
+    def charge(self, frequency, airtime):
+        """ Charges an uplink of airtime ms on the sub-band of frequency """
+        now = self.update()
+        i = sub_band(frequency)
+        self.tokens[i] -= airtime
+        self.off_until[i] = now + int(airtime * (1 / SUB_BANDS[i][2] - 1) / 1000 + 0.999)
+
+    def save(self):
+        data = struct.pack(HEADER, self.updated)
+        for i in range(len(SUB_BANDS)):
+            data += struct.pack(ENTRY, self.tokens[i], self.off_until[i])
+        persist.save(self.key, data)
+
+    def restore(self):
+        """ Loads the buckets of the previous wake-up and refills them with the time slept """
+        data = persist.load(self.key)
+        if data is None or len(data) != struct.calcsize(HEADER) + len(SUB_BANDS) * struct.calcsize(ENTRY):
+            return
+        self.updated = struct.unpack_from(HEADER, data)[0]
+        for i in range(len(SUB_BANDS)):
+            self.tokens[i], self.off_until[i] = struct.unpack_from(ENTRY, data, struct.calcsize(HEADER) + i * struct.calcsize(ENTRY))
+        self.update()
@@ -0,0 +1,109 @@
+""" Energy model of the NoiseNode wake-up phases: charge per phase, joules per reported LAeq and battery life """
+
+import airtime
+
+VOLTAGE     = 3.7                       # LiPo cell of the expansion board (V)
+CAPACITY    = 2000                      # battery capacity (mAh)
+SELF_DISCHARGE = 0.03                   # self-discharge of the cell per month (fraction of the capacity)
+
+# supply current of the FiPy per phase (mA), datasheet figures to be replaced by measurements of the board
+CURRENTS    = {
+    'boot':     45.0,                   # firmware boot until main.py runs (ESP32 at 160 MHz)
+    'cpu':      40.0,                   # main.py awake: radio setup, waiting for the join and the receive windows
+    'sample':   48.0,                   # ADC sampling and the A-weighting filter
+    'join':     40.0,                   # awake while joining, the join-requests and their windows are counted as tx and rx
+    'tx':       120.0,                  # SX1272 transmitting at 14 dBm, with the CPU
+    'rx':       55.0,                   # SX1272 receiving (15 mA), with the CPU
+    'sleep':    0.019,                  # deepsleep, LTE modem and WLAN off
+    'LTE':      12.0,                   # idle current of a radio left on, added to any phase (the modem even in deepsleep)
+    'WLAN':     60.0,
+    'Bluetooth': 15.0,
+    }
+RADIOS      = ('LTE', 'WLAN', 'Bluetooth')
+RX_DELAYS   = (1.0, 2.0)                # RECEIVE_DELAY1, RECEIVE_DELAY2 after the end of an uplink (s)
+RX2_DR      = 3                         # datarate of RX2 set by TTN in the join-accept (869.525 MHz, SF9)
+WINDOW_SYMBOLS = 8                      # symbols a receive window stays open without a downlink
+MONTH       = 30 * 24 * 3600
+
+
+def window(dr):
+    """ Returns the time (s) a receive window at dr stays open without a downlink """
+    sf, bw = airtime.EU868_DATARATES[dr]
+    return WINDOW_SYMBOLS * (1 << sf) / bw
+
+
+class Energy:
+    """
+    Charge (mAs) and time (s) accounted per phase of the wake-up cycles. A phase draws its current
+    of CURRENTS plus the idle current of the radios left on; the uplinks are kept per spreading factor
+    ('tx SF7'), so a report shows where the charge of a datarate goes.
+    """
+
+    def __init__(self, currents=CURRENTS):
+        self.currents   = currents
+        self.charge     = {}                # phase -> mAs
+        self.time       = {}                # phase -> s
+        self.cycles     = 0                 # wake-up cycles accounted
+        self.uplinks    = 0                 # uplinks (and join-requests) accounted
+        self.reports    = 0                 # LAeq summaries reported
+
+    def add(self, phase, seconds, radios=()):
+        """ Accounts seconds of phase ('tx' and 'rx' may carry the SF: 'tx SF7') with the radios left on """
+        current = self.currents[phase.split()[0]]
+        for radio in radios:
+            current += self.currents[radio]
+        self.charge[phase] = self.charge.get(phase, 0.0) + current * seconds
+        self.time[phase] = self.time.get(phase, 0.0) + seconds
+
+    def uplink(self, payload, dr, radios=()):
+        """ Accounts an uplink of payload bytes at dr: time on air, the awake wait and both receive windows without downlink """
+        sf = airtime.EU868_DATARATES[dr][0]
+        rx1, rx2 = window(dr), window(RX2_DR)
+        self.add('tx SF%i' % sf, airtime.uplink_time_on_air(payload, dr) / 1000, radios)
+        self.add('rx', rx1 + rx2, radios)
+        self.add('cpu', RX_DELAYS[1] - rx1, radios)
+        self.uplinks += 1
+
+    def wake_up(self, interval, sleep, payload=None, dr=5, boot=0.8, awake=0.5, radios=(), sleep_radios=()):
+        """
+        Accounts one measuring wake-up: boot, awake time outside the phases (radio setup, processing),
+        interval s of sampling, the uplink when there is a payload (None for a batched summary) and
+        sleep s of deepsleep, the radios of sleep_radios staying powered.
+        """
+        self.add('boot', boot, radios)
+        self.add('cpu', awake, radios)
+        self.add('sample', interval, radios)
+        if payload is not None:
+            self.uplink(payload, dr, radios)
+        self.add('sleep', sleep, sleep_radios)
+        self.cycles += 1
+        self.reports += 1
+
+    def total(self):
+        """ Returns the charge (mAs) of all the phases """
+        return sum(self.charge.values())
+
+    def seconds(self):
+        return sum(self.time.values())
+
+    def current(self):
+        """ Returns the average current (mA) """
+        return self.total() / self.seconds() if self.time else 0.0
+
+    def joules(self, voltage=VOLTAGE):
+        return self.total() * voltage / 1000
+
+    def per_report(self, voltage=VOLTAGE):
+        """ Returns the energy (J) per reported LAeq """
+        return self.joules(voltage) / self.reports if self.reports else None
+
+    def battery_life(self, capacity=CAPACITY, self_discharge=SELF_DISCHARGE):
+        """ Returns the days the battery lasts at the average current, with its self-discharge """
+        current = self.current() + capacity * self_discharge * 3600 / MONTH
+        return capacity / current / 24
+
+    def report(self):
+        """ Returns (phase, s, mAs, share of the charge) rows, largest charge first """
+        total = self.total() or 1.0
+        return [(phase, self.time[phase], charge, charge / total)
+            for phase, charge in sorted(self.charge.items(), key=lambda item: -item[1])]
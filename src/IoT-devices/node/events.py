@@ -0,0 +1,77 @@
+""" Noise event detection on the short-term sound levels, with attack/release hysteresis """
+
+import struct
+
+EVENT_NONE  = 0
+EVENT_START = 1
+EVENT_END   = 2
+
+EVENT_FORMAT = '>bbH'                   # event uplink: started (1) or ended (0), peak (dB), duration (s)
+EVENT_SIZE  = 4
+MAX_PEAK    = 127                       # peak and duration are clamped to their fields
+MAX_DURATION = 0xffff                   # 18 h
+
+
+def encode_event(started, peak, duration):
+    """ Returns the payload of an event uplink peak and duration clamped to their fields """
+    return struct.pack(EVENT_FORMAT, 1 if started else 0, min(MAX_PEAK, int(peak + 0.5)), min(MAX_DURATION, int(duration + 0.5)))
+
+
+def decode_event(payload):
+    """ Returns (started, peak dB, duration s) of an event uplink """
+    started, peak, duration = struct.unpack(EVENT_FORMAT, payload)
+    return bool(started), peak, duration
+
+
+class EventDetector:
+    """
+    An event starts when the level stays at or above on_level during attack seconds and ends
+    when it stays below off_level (on_level minus the hysteresis) during release seconds.
+    update() is called with every short-term level and returns EVENT_START/EVENT_END on a transition.
+    """
+
+    def __init__(self, on_level=70.0, off_level=65.0, attack=0.5, release=2.0, block_s=0.125):
+        self.on_level       = on_level
+        self.off_level      = off_level
+        self.attack_blocks  = max(1, int(attack / block_s + 0.5))
+        self.release_blocks = max(1, int(release / block_s + 0.5))
+        self.block_s        = block_s       # time between two levels (s)
+        self.active         = False         # an event is running
+        self.peak           = 0.0           # highest level of the running (or last) event
+        self.blocks         = 0             # length of the running (or last) event in levels
+        self._run           = 0             # consecutive levels beyond the threshold of the next transition
+
+    @property
+    def duration(self):
+        """ Duration of the running (or last) event (s) """
+        return self.blocks * self.block_s
+
+    def update(self, level):
+        """ Feeds one short-term level (dB) """
+        if not self.active:
+            if level >= self.on_level:
+                self._run += 1
+                if self.peak < level or self._run == 1:
+                    self.peak = level
+                if self._run >= self.attack_blocks:
+                    self.active = True
+                    self.blocks = self._run
+                    self._run = 0
+                    return EVENT_START
+            else:
+                self._run = 0
+            return EVENT_NONE
+
+        self.blocks += 1
+        if level > self.peak:
+            self.peak = level
+        if level < self.off_level:
+            self._run += 1
+            if self._run >= self.release_blocks:
+                self.active = False
+                self.blocks -= self._run        # the release time is not part of the event
+                self._run = 0
+                return EVENT_END
+        else:
+            self._run = 0
+        return EVENT_NONE
@@ -0,0 +1,191 @@
+""" Streaming 1/3-octave filterbank with fixed-point biquads, running on MicroPython and CPython
+
+The bands run from 31.5 Hz up to the last band below the Nyquist frequency, f_hi (8 kHz) at most:
+21 bands up to 3.15 kHz at the 8 kHz sample rate of the node, 24 bands up to 6.3 kHz at 16 kHz, 8 kHz from 20 kHz.
+"""
+
+import math
+from array import array
+from soundlevel import biquad_gain
+from calibration import identity_codes
+
+try:
+    from micropython import native
+except ImportError:                     # CPython (host benchmarks), no native code emitter
+    def native(f):
+        return f
+
+
+COEF_SHIFT      = 14                    # filter coefficients in Q14 fixed-point
+INPUT_SHIFT     = 2                     # extra fractional bits of the filtered samples
+BAND_SECTIONS   = 3                     # biquads per band (6th order Butterworth band-pass)
+LP_SECTIONS     = 3                     # biquads of the decimation low-pass (6th order Butterworth)
+LP_CUTOFF       = 0.15                  # decimation low-pass cut-off, relative to the stage rate
+STAGE_EDGE      = 0.25                  # highest upper band edge of a decimated stage, relative to its rate
+MAX_EDGE        = 0.45                  # highest upper band edge of the full-rate stage
+ENERGY_SPILL    = 1 << 29               # band energy is moved to a float before it leaves the small-int range
+NOMINAL         = (31.5, 40, 50, 63, 80, 100, 125, 160, 200, 250, 315, 400, 500, 630, 800,
+                   1000, 1250, 1600, 2000, 2500, 3150, 4000, 5000, 6300, 8000)
+
+
+def _prewarp(freq, rate):
+    return 2 * rate * math.tan(math.pi * freq / rate)
+
+
+def _bilinear(s, rate):
+    return (1 + s / (2 * rate)) / (1 - s / (2 * rate))
+
+
+def _quantise(sections, w):
+    """ Normalises every (b, a1, a2) section to unity gain at angular frequency w and converts it to Q14 """
+    coeffs = []
+    for b, a1, a2 in sections:
+        g = 1 / biquad_gain(b, a1, a2, w)
+        coeffs += [int(round(c * (1 << COEF_SHIFT))) for c in (b[0] * g, b[1] * g, b[2] * g, a1, a2)]
+    return coeffs
+
+
+def bandpass_sections(fc, rate):
+    """ Returns the 1/3-octave Butterworth band-pass around fc as BAND_SECTIONS fixed-point biquads """
+    w1, w2 = _prewarp(fc * 2 ** (-1 / 6), rate), _prewarp(fc * 2 ** (1 / 6), rate)
+    w0sq, bw = w1 * w2, w2 - w1
+    n = BAND_SECTIONS                   # order of the low-pass prototype, every prototype pole gives one biquad
+    sections = []
+    for k in range(n):
+        t = math.pi * (2 * k + n + 1) / (2 * n)
+        p = complex(math.cos(t), math.sin(t)) * bw
+        if p.imag < -1e-9:
+            continue
+        d = (p * p - 4 * w0sq) ** 0.5   # low-pass to band-pass: s^2 - p.s + w0^2 = 0
+        roots = ((p + d) / 2, (p - d) / 2) if p.imag > 1e-9 else ((p + d) / 2,)
+        for r in roots:
+            z = _bilinear(r, rate)
+            sections.append(((1.0, 0.0, -1.0), -2 * z.real, abs(z) ** 2))
+    return _quantise(sections, 2 * math.pi * fc / rate)
+
+
+def lowpass_sections(rate):
+    """ Returns the decimation low-pass (Butterworth, cut-off LP_CUTOFF * rate) as LP_SECTIONS fixed-point biquads """
+    n = 2 * LP_SECTIONS
+    wc = _prewarp(LP_CUTOFF * rate, rate)
+    sections = []
+    for k in range(LP_SECTIONS):
+        t = math.pi * (2 * k + n + 1) / (2 * n)
+        z = _bilinear(complex(math.cos(t), math.sin(t)) * wc, rate)
+        sections.append(((1.0, 2.0, 1.0), -2 * z.real, abs(z) ** 2))
+    return _quantise(sections, 0.0)
+
+
+class FilterBank:
+    """
+    1/3-octave filterbank (IEC 61260 base-2 centre frequencies). Every octave stage runs at half the
+    rate of the one above it, so all bands keep the same relative bandwidth and fixed-point precision.
+    Each sample updates the integer energy accumulators of the bands, nothing is allocated per sample.
+    """
+
+    def __init__(self, sample_rate=8000, bias=2048, cal_offset=0.0, f_lo=31.5, f_hi=8000, calibration=None):
+        self.sample_rate    = sample_rate
+        self.bias           = bias                              # ADC code of the microphone's dc-bias
+        self.cal_offset     = cal_offset                        # dB SPL of a 1 ADC-count rms signal (without calibration tables)
+        self.calibration    = calibration                       # calibration tables of the front end
+        self._codes         = calibration.codes if calibration else identity_codes(bias)
+        self.centers        = []                                # exact centre frequencies (Hz)
+        self.nominal        = []                                # nominal centre frequencies (Hz)
+        stages = []
+        for k in range(-15, 10):
+            fc = 1000 * 2 ** (k / 3)
+            upper = fc * 2 ** (1 / 6)
+            if fc < f_lo * 0.98 or fc > f_hi * 1.02 or upper > MAX_EDGE * sample_rate:
+                continue
+            s = 0
+            while upper <= STAGE_EDGE * sample_rate / 2 ** (s + 1):
+                s += 1
+            self.centers.append(fc)
+            self.nominal.append(NOMINAL[k + 15])
+            stages.append(s)
+        self.n_bands        = len(self.centers)
+        self.n_stages       = max(stages) + 1
+        self.band_stage     = array('B', stages)
+        coeffs = []
+        for b in range(self.n_bands):
+            coeffs += bandpass_sections(self.centers[b], sample_rate / 2 ** stages[b])
+        for s in range(self.n_stages - 1):
+            coeffs += lowpass_sections(sample_rate / 2 ** s)
+        self._coeffs        = array('l', coeffs)
+        self._state         = array('l', [0] * len(coeffs))     # x1, x2, y1, y2, err of every section
+        self._phase         = bytearray(self.n_stages)          # decimation phase of every stage
+        self._energy        = array('l', [0] * self.n_bands)    # band energies (small int part)
+        self._spill         = array('f', [0] * self.n_bands)    # band energies (spilled part)
+        self._samples       = array('l', [0] * self.n_stages)   # samples processed by every stage
+        self._stage_bands   = array('B', [0] * (self.n_stages + 1))
+        for s in stages:
+            self._stage_bands[s + 1] += 1
+        for s in range(self.n_stages):                          # first band of every stage (bands sorted by stage)
+            self._stage_bands[s + 1] += self._stage_bands[s]
+        self._order         = array('B', sorted(range(self.n_bands), key=lambda b: stages[b]))
+
+    def reset(self):
+        """ Starts a new integration interval """
+        for b in range(self.n_bands):
+            self._energy[b] = 0
+            self._spill[b] = 0
+        for s in range(self.n_stages):
+            self._samples[s] = 0
+
+    def levels(self):
+        """ Returns the Leq (dB) of every band over the current interval """
+        result = []
+        for b in range(self.n_bands):
+            n = self._samples[self.band_stage[b]]
+            energy = (self._spill[b] + self._energy[b]) / (n << (2 * INPUT_SHIFT)) if n else 0
+            level = 10 * math.log10(energy) if energy > 0 else -100
+            result.append(self.calibration.to_db(level) if self.calibration else level + self.cal_offset)
+        return result
+
+    @native
+    def process(self, buf, start: int, stop: int):
+        """ Filters buf[start:stop] (raw ADC codes) through all bands and integrates their energy """
+        c, st = self._coeffs, self._state
+        phase, samples = self._phase, self._samples
+        energy, spill = self._energy, self._spill
+        order, stage_bands = self._order, self._stage_bands
+        last = self.n_stages - 1
+        lp_first = self.n_bands * BAND_SECTIONS
+        width = BAND_SECTIONS * 5
+        codes = self._codes
+        for i in range(start, stop):
+            x = codes[buf[i]] << 2                      # linearised sample, INPUT_SHIFT
+            s = 0
+            while True:
+                samples[s] += 1
+                for j in range(stage_bands[s], stage_bands[s + 1]):
+                    b = order[j]
+                    y = x
+                    for k in range(b * width, b * width + width, 5):
+                        acc = c[k] * y + c[k + 1] * st[k] + c[k + 2] * st[k + 1] - c[k + 3] * st[k + 2] - c[k + 4] * st[k + 3] + st[k + 4]
+                        st[k + 1] = st[k]
+                        st[k] = y
+                        y = acc >> 14                   # COEF_SHIFT
+                        st[k + 4] = acc - (y << 14)
+                        st[k + 3] = st[k + 2]
+                        st[k + 2] = y
+                    e = energy[b] + y * y
+                    if e >= 0x20000000:                 # ENERGY_SPILL
+                        spill[b] += e
+                        e = 0
+                    energy[b] = e
+                if s == last:
+                    break
+                first = (lp_first + s * LP_SECTIONS) * 5
+                for k in range(first, first + LP_SECTIONS * 5, 5):
+                    acc = c[k] * x + c[k + 1] * st[k] + c[k + 2] * st[k + 1] - c[k + 3] * st[k + 2] - c[k + 4] * st[k + 3] + st[k + 4]
+                    st[k + 1] = st[k]
+                    st[k] = x
+                    x = acc >> 14
+                    st[k + 4] = acc - (x << 14)
+                    st[k + 3] = st[k + 2]
+                    st[k + 2] = x
+                phase[s] ^= 1
+                if phase[s]:                            # keeping every 2nd sample for the next stage
+                    break
+                s += 1
@@ -0,0 +1,49 @@
+""" OTAA join retries: exponential backoff with jitter between deepsleeps, stepping the join datarate down """
+
+import persist
+
+try:
+    from uos import urandom
+except ImportError:                     # CPython (host tools)
+    from os import urandom
+
+
+class JoinBackoff:
+    """
+    Counts the failed join attempts in NVS, so the backoff continues across the deepsleeps between
+    attempts. The first attempts use the fast datarate dr_start, every dr_step failed attempts
+    step the datarate down to the most robust dr_min. The delay before the next attempt doubles with
+    every failure (base .. cap seconds) and is spread by +-50% jitter, so nodes powered up together
+    do not keep colliding.
+    """
+
+    def __init__(self, dr_start=5, dr_min=0, dr_step=2, base=15, cap=3600, key='join_att'):
+        self.key        = key                           # persistent storage key
+        self.dr_start   = dr_start
+        self.dr_min     = dr_min
+        self.dr_step    = dr_step                       # failed attempts per datarate
+        self.base       = base                          # delay after the first failure (s)
+        self.cap        = cap                           # max. delay between two attempts (s)
+        self.attempts   = persist.load_int(key, 0)      # failed attempts since the last join
+
+    def datarate(self):
+        """ Returns the datarate of the next join-request """
+        return max(self.dr_min, self.dr_start - self.attempts // self.dr_step)
+
+    def delay(self):
+        """ Returns the time (s) to sleep before the next attempt """
+        delay = min(self.cap, self.base << min(self.attempts - 1, 16)) if self.attempts else 0
+        jitter = urandom(1)[0] / 255 + 0.5              # 0.5 .. 1.5
+        return int(delay * jitter)
+
+    def failed(self):
+        """ Counts a failed attempt, returns the delay (s) before the next one """
+        self.attempts += 1
+        persist.save_int(self.key, self.attempts)
+        return self.delay()
+
+    def joined(self):
+        """ Resets the backoff after a successful join """
+        if self.attempts:
+            self.attempts = 0
+            persist.save_int(self.key, 0)
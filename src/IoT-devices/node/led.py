@@ -0,0 +1,89 @@
+""" Non-blocking RGB led pattern engine driven by a Timer.Alarm """
+
+try:
+    import pycom
+    from machine import Timer, disable_irq, enable_irq
+except ImportError:                     # CPython (host tools), the led is not driven
+    pycom = None
+    Timer = None
+
+TICK_MS     = 50                        # resolution of the pattern steps
+OFF         = 0x000000
+
+# patterns: (color, ticks) steps, played one after the other
+PATTERNS    = {
+    'joining':              ((0xff0000, 4), (OFF, 4)),
+    'joined':               ((0x00ff00, 20), (OFF, 20)),
+    'sending':              ((0x0000ff, 4), (OFF, 4)) * 3,
+    'confirmed_downlink':   ((0x00ff00, 10), (OFF, 10)),
+    'reception':            ((0x7f7f00, 4), (OFF, 4)) * 3,
+    }
+
+
+class Led:
+    """
+    Queues led patterns and plays them from a periodic alarm, so showing a status returns
+    immediately. The alarm only runs while patterns are queued and its handler does not
+    allocate: the patterns are preallocated tuples and the queue a fixed-size ring.
+    """
+
+    def __init__(self, queue_size=8):
+        self.queue  = [None] * queue_size   # ring of queued patterns
+        self.head   = 0                     # next pattern to play
+        self.tail   = 0                     # next free slot
+        self.steps  = None                  # pattern being played
+        self.step   = 0
+        self.ticks  = 0                     # ticks left of the current step
+        self.alarm  = None
+        self.dropped = 0                    # patterns not queued because the queue was full
+
+    def show(self, status):
+        """ Queues the pattern of status, returns immediately """
+        if pycom is None:
+            return
+        tail = (self.tail + 1) % len(self.queue)
+        if tail == self.head:
+            self.dropped += 1
+            return
+        self.queue[self.tail] = PATTERNS[status]
+        state = disable_irq()               # the alarm must not stop between queueing and the check below
+        self.tail = tail
+        start = self.alarm is None
+        if start:
+            self.alarm = Timer.Alarm(handler=self._tick, ms=TICK_MS, periodic=True)
+        enable_irq(state)
+        if start:
+            self._tick()
+
+    def _tick(self, alarm=None):
+        """ Alarm handler: advances the current pattern, starting the next queued one when it ends """
+        if self.ticks > 0:
+            self.ticks -= 1
+            if self.ticks > 0:
+                return
+            self.step += 1
+        if self.steps is None or self.step == len(self.steps):
+            if self.head == self.tail:      # queue empty: led off, alarm stopped
+                self.steps = None
+                pycom.rgbled(OFF)
+                if self.alarm is not None:
+                    self.alarm.cancel()
+                    self.alarm = None
+                return
+            self.steps = self.queue[self.head]
+            self.queue[self.head] = None
+            self.head = (self.head + 1) % len(self.queue)
+            self.step = 0
+        color, self.ticks = self.steps[self.step]
+        pycom.rgbled(color)
+
+    def stop(self):
+        """ Clears the queue and turns the led off (before deepsleep) """
+        if self.alarm is not None:
+            self.alarm.cancel()
+            self.alarm = None
+        self.head = self.tail = 0
+        self.steps = None
+        self.ticks = 0
+        if pycom is not None:
+            pycom.rgbled(OFF)
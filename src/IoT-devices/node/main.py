@@ -9,18 +9,39 @@ if __name__ == '__main__':
         lora_params       = config.LORA_PARAMETERS,
         lora_session_keys = config.LORA_SESSION_KEYS,
         deepsleep_time    = config.DEEPSLEEP_TIME,
+        sensor_params     = config.SENSOR_PARAMETERS,
+        monitor_params    = config.MONITOR_PARAMETERS,
+        batch_params      = config.BATCH_PARAMETERS,
+        profile_params    = config.PROFILE_PARAMETERS,
+        rate_params       = config.RATE_PARAMETERS,
+        command_params    = config.COMMAND_PARAMETERS,
+        uplink_params     = config.UPLINK_PARAMETERS,
+        radio_params      = config.RADIO_PARAMETERS,
         )
 
     # starting the LoRaWAN Noise Node
-    noisenode._log("Starting Noise Node with id: %s" % noisenode.lora_session_keys['dev_eui'])
-    noisenode.init_lora_radio()
-    noisenode.join_network_server()
+    noisenode.mark('init')
+    noisenode.disable_radios()      # once after a cold boot, nothing to do after deepsleep
+    noisenode._log("Starting Noise Node with id: %s", args=(noisenode.lora_session_keys['dev_eui'],))
+    if not noisenode.resume():      # fast path after deepsleep: session and channel plan restored from nvram
+        noisenode.init_lora_radio()
+        noisenode.join_network_server()
+    noisenode.flush_log()
 
     if noisenode.debug:
-        # Entering RPL (Read Evaluate Print Loop, interactive MicroPython prompt)
+        # Entering RPL (Read Evaluate Print Loop, interactive MicroPython prompt), the callback logs keep being printed
+        noisenode.print_log()
         input('Press ENTER to enter the REPL')
 
+    elif config.MONITOR_PARAMETERS["enabled"]:
+        # Sampling continuously, sending noise events as they happen and the noise level on a long interval
+        noisenode.monitor()
+
     else:
         # Sending noise level on regular interval via LoRa
-        noisenode.collect_sensor_data() # analog reads
+        noisenode.send_retry()          # the last confirmed uplink, when it was not acked
+        noisenode.collect_sensor_data() # measuring the sound levels
         noisenode.send_sensor_data()    # sending data, then entering deepsleep
+        noisenode.send_profile()        # every N wake-ups (or on request): sending the phase timings, then entering deepsleep
+        noisenode.send_config()         # on request of a command frame: sending the settings in use, then entering deepsleep
+        noisenode.flush_log()
@@ -0,0 +1,53 @@
+""" Allocation-free uplink builder: signed bytes written into a preallocated buffer, returned as a memoryview
+
+Not used by NoiseNode yet: its byte-array uplinks keep struct.pack (array2packet) until bench_payload
+shows a heap and GC gain on the MicroPython unix port; on CPython the builder is no faster than struct.
+"""
+
+MAX_SIZE    = 64                        # largest payload of the builder (20 FFT bands, 25 filterbank bands, events)
+
+
+class PayloadBuilder:
+    """
+    Packs sequences of signed bytes (the '>%ib' payloads of the event, spectrum and test uplinks) into
+    one bytearray allocated once. The values are written one by one, so there is no format string, no
+    argument tuple and no bytes object per uplink, and the memoryview slices of the buffer are cached
+    per length: pack() allocates nothing once a length was seen. The view stays valid until the next
+    pack() (a caller keeping the payload must copy it).
+    """
+
+    def __init__(self, size=MAX_SIZE):
+        self.buf    = bytearray(size)
+        self.views  = {}                                # length -> memoryview slice of buf
+
+    def view(self, n):
+        """ Returns the memoryview of the first n bytes of the buffer, created once per length """
+        view = self.views.get(n)
+        if view is None:
+            view = self.views[n] = memoryview(self.buf)[:n]
+        return view
+
+    def pack(self, values):
+        """ Packs the values (-128..127, a list, tuple or array) like struct.pack('>%ib'), returns a memoryview """
+        n = len(values)
+        if n > len(self.buf):
+            raise ValueError('payload of %i bytes, the builder holds %i' % (n, len(self.buf)))
+        buf = self.buf
+        for i in range(n):
+            value = values[i]
+            if value < -128 or value > 127:
+                raise ValueError('byte format requires -128 <= number <= 127')
+            buf[i] = value & 0xff
+        return self.view(n)
+
+    def pack_one(self, value):
+        """ Packs a single value (-128..127) like pack((value,)), without the tuple of the call """
+        self.byte(0, value)
+        return self.view(1)
+
+    def byte(self, i, value):
+        """ Writes a signed byte (-128..127) at offset i, like struct.pack_into('b') """
+        if value < -128 or value > 127:
+            raise ValueError('byte format requires -128 <= number <= 127')
+        self.buf[i] = value & 0xff
+
@@ -0,0 +1,97 @@
+""" Constant-memory statistical sound levels (L10, L50, L90, L95) from a 0.1 dB level histogram """
+
+import struct
+from array import array
+import persist
+
+
+LEVEL_MIN   = 20.0                      # lowest level of the histogram (dB), lower levels are counted in the first bin
+LEVEL_MAX   = 140.0                     # highest level of the histogram (dB), higher levels are counted in the last bin
+RESOLUTION  = 10                        # bins per dB (0.1 dB)
+N_BINS      = int((LEVEL_MAX - LEVEL_MIN) * RESOLUTION)
+BIN_MAX     = 0xffff                    # a full bin halves all bins, keeping the distribution (and the memory) constant
+HEADER      = '>HHLL'                   # first bin, last bin, count, seconds of the serialised histogram
+
+
+class LevelHistogram:
+    """
+    Histogram of the short-term (125 ms) sound levels of an integration interval spanning any
+    number of wake-ups. Updates are O(1), percentiles O(bins) and memory is constant.
+    """
+
+    def __init__(self, key='lvl_hist'):
+        self.key        = key                           # persistent storage key
+        self.bins       = array('H', [0] * N_BINS)
+        self.count      = 0                             # levels counted in the histogram
+        self.seconds    = 0                             # measuring time of the interval
+
+    def reset(self):
+        """ Starts a new integration interval """
+        bins = self.bins
+        for i in range(N_BINS):
+            bins[i] = 0
+        self.count = 0
+        self.seconds = 0
+
+    def add(self, level):
+        """ Counts one short-term level (dB) """
+        i = int((level - LEVEL_MIN) * RESOLUTION)
+        if i < 0:
+            i = 0
+        elif i >= N_BINS:
+            i = N_BINS - 1
+        if self.bins[i] == BIN_MAX:
+            self._halve()
+        self.bins[i] += 1
+        self.count += 1
+
+    def percentiles(self, exceeded=(10, 50, 90, 95)):
+        """ Returns the levels (dB) exceeded during the given percentages of the interval, in one pass from the top """
+        result = [None] * len(exceeded)
+        if self.count == 0:
+            return result
+        targets = [self.count * n / 100 for n in exceeded]
+        bins = self.bins
+        total = 0
+        for i in range(N_BINS - 1, -1, -1):
+            total += bins[i]
+            for j in range(len(targets)):
+                if result[j] is None and total >= targets[j] and total > 0:
+                    result[j] = LEVEL_MIN + i / RESOLUTION
+        return result
+
+    def to_bytes(self):
+        """ Serialises the non-empty span of the histogram """
+        bins = self.bins
+        first, last = 0, N_BINS - 1
+        while first < last and bins[first] == 0:
+            first += 1
+        while last > first and bins[last] == 0:
+            last -= 1
+        return struct.pack(HEADER, first, last, self.count, self.seconds) + struct.pack('>%iH' % (last - first + 1), *bins[first:last + 1])
+
+    def from_bytes(self, data):
+        """ Restores a histogram serialised by to_bytes """
+        self.reset()
+        first, last, self.count, self.seconds = struct.unpack_from(HEADER, data)
+        offset = struct.calcsize(HEADER)
+        for i in range(first, last + 1):
+            self.bins[i] = struct.unpack_from('>H', data, offset + 2 * (i - first))[0]
+
+    def save(self):
+        """ Stores the histogram in NVS (or flash) before deepsleep """
+        persist.save(self.key, self.to_bytes())
+
+    def restore(self):
+        """ Restores the histogram stored before deepsleep, returns False when there was none """
+        data = persist.load(self.key)
+        if not data:
+            return False
+        self.from_bytes(data)
+        return True
+
+    def _halve(self):
+        bins = self.bins
+        for i in range(N_BINS):
+            bins[i] >>= 1
+        self.count = sum(bins)
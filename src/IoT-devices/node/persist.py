@@ -0,0 +1,83 @@
+""" Small key/value store surviving deepsleep and resets: pycom NVS with a flash-file fallback """
+
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+
+try:
+    from uos import remove
+except ImportError:
+    from os import remove
+
+try:
+    import pycom
+except ImportError:                     # CPython (host tools), files only
+    pycom = None
+
+FILE_DIR = '/flash'                     # directory of the fallback files (overwritten by host tools)
+
+
+def _path(key):
+    return '%s/%s.nvs' % (FILE_DIR, key)
+
+
+def save(key: str, data):
+    """ Stores bytes under key (max. 15 characters), NVS strings are hex-encoded """
+    if pycom is not None:
+        try:
+            pycom.nvs_set(key, binascii.hexlify(data).decode())
+            return
+        except Exception:               # firmware without string support or value too large
+            pass
+    with open(_path(key), 'wb') as f:
+        f.write(data)
+
+
+def load(key: str, default=None):
+    """ Returns the bytes stored under key, default when nothing was stored """
+    if pycom is not None:
+        try:
+            value = pycom.nvs_get(key)
+            if isinstance(value, str):
+                return binascii.unhexlify(value)
+        except Exception:
+            pass
+    try:
+        with open(_path(key), 'rb') as f:
+            return f.read()
+    except OSError:
+        return default
+
+
+def save_int(key: str, value: int):
+    """ Stores a 32-bit integer under key """
+    if pycom is not None:
+        pycom.nvs_set(key, value)
+    else:
+        save(key, str(value).encode())
+
+
+def load_int(key: str, default=0):
+    """ Returns the integer stored under key, default when nothing was stored """
+    if pycom is not None:
+        try:
+            value = pycom.nvs_get(key)
+        except Exception:
+            return default
+        return default if value is None else value
+    data = load(key)
+    return default if data is None else int(data)
+
+
+def erase(key: str):
+    """ Removes key from NVS and from flash """
+    if pycom is not None:
+        try:
+            pycom.nvs_erase(key)
+        except Exception:
+            pass
+    try:
+        remove(_path(key))
+    except OSError:
+        pass
@@ -0,0 +1,118 @@
+""" Wake-up phase profiler: fixed-bucket timing histograms kept in NVS and sent as a compact profile uplink """
+
+import struct
+from array import array
+import persist
+
+try:
+    from utime import ticks_us, ticks_diff
+except ImportError:                     # CPython (host decoder)
+    from soundlevel import ticks_us, ticks_diff
+
+PHASES      = ('radio', 'join', 'sensor', 'uplink', 'sleep', 'radios')   # radios: the one-time deinit of LTE/WLAN/Bluetooth
+EDGES_MS    = (2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)  # upper bucket edges
+N_BUCKETS   = len(EDGES_MS) + 1         # the last bucket is open (>= 100 s), a bucket index fits in 4 bits
+HEADER      = '>H'                      # wake-up cycles of the histograms
+PAYLOAD     = '>HB'                     # cycles, number of phases, then per phase: count, p50 << 4 | p90, min << 4 | max
+
+
+def bucket(us):
+    """ Returns the bucket of a duration (us) """
+    ms = us // 1000
+    for i in range(len(EDGES_MS)):
+        if ms < EDGES_MS[i]:
+            return i
+    return N_BUCKETS - 1
+
+
+class Profiler:
+    """
+    One histogram of N_BUCKETS log-spaced buckets per phase, updated in O(buckets) without allocation.
+    The phases are timed by wrapping the node's methods (wrap), so nothing is timed, nor allocated,
+    when the profiler is disabled and not created.
+    """
+
+    def __init__(self, every=24, key='profile'):
+        self.key    = key                                   # persistent storage key
+        self.every  = every                                 # wake-up cycles per profile uplink
+        self.bins   = array('H', [0] * (len(PHASES) * N_BUCKETS))
+        self.cycles = 0
+        self.restore()
+
+    def wrap(self, phase, function):
+        """ Returns function, timing every call in the histogram of phase """
+        base = PHASES.index(phase) * N_BUCKETS
+
+        def timed(*args, **kwargs):
+            start = ticks_us()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(base, ticks_diff(ticks_us(), start))
+        return timed
+
+    def add(self, base, us):
+        """ Counts a duration (us) in the histogram starting at bins[base] """
+        i = base + bucket(us)
+        if self.bins[i] < 0xffff:
+            self.bins[i] += 1
+
+    def add_phase(self, phase, us):
+        self.add(PHASES.index(phase) * N_BUCKETS, us)
+
+    def due(self):
+        """ True when the profile uplink must be sent """
+        return self.cycles >= self.every
+
+    def payload(self):
+        """ Returns the profile uplink: per phase the count and the buckets of the median, 90th percentile, min and max """
+        pkt = bytearray(struct.pack(PAYLOAD, min(self.cycles, 0xffff), len(PHASES)))
+        for p in range(len(PHASES)):
+            hist = self.bins[p * N_BUCKETS:(p + 1) * N_BUCKETS]
+            count = sum(hist)
+            p50 = p90 = low = high = 0
+            if count:
+                low = min(i for i in range(N_BUCKETS) if hist[i])
+                high = max(i for i in range(N_BUCKETS) if hist[i])
+                total = 0
+                p50 = p90 = -1
+                for i in range(N_BUCKETS):
+                    total += hist[i]
+                    if p50 < 0 and 2 * total >= count:
+                        p50 = i
+                    if p90 < 0 and 10 * total >= 9 * count:
+                        p90 = i
+            pkt += bytes((min(count, 255), p50 << 4 | p90, low << 4 | high))
+        return pkt
+
+    def reset(self):
+        """ Starts new histograms after the profile uplink """
+        for i in range(len(self.bins)):
+            self.bins[i] = 0
+        self.cycles = 0
+
+    def save(self):
+        persist.save(self.key, struct.pack(HEADER, min(self.cycles, 0xffff)) + bytes(self.bins))
+
+    def restore(self):
+        data = persist.load(self.key)
+        if data is None or len(data) != struct.calcsize(HEADER) + 2 * len(self.bins):
+            return
+        self.cycles = struct.unpack_from(HEADER, data)[0]
+        self.bins = array('H', data[struct.calcsize(HEADER):])
+
+
+def bucket_range(i):
+    """ Returns the (lowest, highest) duration (ms) of bucket i, highest is None for the open bucket """
+    return (EDGES_MS[i - 1] if i else 0, EDGES_MS[i] if i < len(EDGES_MS) else None)
+
+
+def decode(payload):
+    """ Decodes a profile uplink into (cycles, {phase: (count, p50, p90, min, max)}) with bucket indexes """
+    cycles, n = struct.unpack_from(PAYLOAD, payload)
+    offset = struct.calcsize(PAYLOAD)
+    phases = {}
+    for p in range(n):
+        count, pct, extremes = payload[offset + 3 * p:offset + 3 * p + 3]
+        phases[PHASES[p] if p < len(PHASES) else 'phase%i' % p] = (count, pct >> 4, pct & 15, extremes >> 4, extremes & 15)
+    return cycles, phases
@@ -0,0 +1,77 @@
+""" The unused radios of the FiPy (LTE modem, WLAN, Bluetooth) switched off once after a cold boot, kept off across deepsleep """
+
+import struct
+import persist
+
+try:
+    import pycom
+    from network import LTE, WLAN, Bluetooth
+    from utime import ticks_us, ticks_diff
+except ImportError:                     # CPython (host tools), the records of NVS only
+    pycom = None
+
+RADIOS      = ('LTE', 'WLAN', 'Bluetooth')
+ENTRY       = '>BLLL'                   # radios switched off (a bit per RADIOS entry), time their deinit took (us)
+
+
+class RadioPower:
+    """
+    Switches the radios off after a cold boot and records them in NVS, with the time each deinit
+    took. WLAN and the LTE modem are also taken out of the boot settings of the firmware
+    (pycom.wifi_on_boot, pycom.lte_modem_en_on_boot), so they stay off after every following boot;
+    the firmware does not start Bluetooth by itself. Only the cold boots create a RadioPower, they
+    check the boot settings (a firmware update resets them) and redo what is missing.
+    """
+
+    def __init__(self, radios=RADIOS, key='radios_off'):
+        self.key    = key                               # persistent storage key
+        self.radios = radios                            # names of the radios to switch off
+        self.off    = 0                                 # radios switched off, bit per RADIOS entry
+        self.costs  = [0] * len(RADIOS)                 # time the deinit of each radio took (us)
+        data = persist.load(key)
+        if data is not None and len(data) == struct.calcsize(ENTRY):
+            entry = struct.unpack(ENTRY, data)
+            self.off, self.costs = entry[0], list(entry[1:])
+        if pycom is not None and pycom.lte_modem_en_on_boot():
+            self.off &= ~1
+        if pycom is not None and pycom.wifi_on_boot():
+            self.off &= ~2
+
+    def disable(self):
+        """ Switches off the radios still on, returns the time it took (us), 0 when there was nothing to do """
+        total = 0
+        for name in self.radios:
+            i = RADIOS.index(name)
+            if self.off & (1 << i):
+                continue
+            start = ticks_us()
+            if name == 'LTE':
+                pycom.lte_modem_en_on_boot(False)
+                LTE().deinit()                          # the modem answers slowly over its UART (seconds)
+            elif name == 'WLAN':
+                pycom.wifi_on_boot(False)
+                WLAN().deinit()
+            else:
+                Bluetooth().deinit()
+            self.costs[i] = ticks_diff(ticks_us(), start)
+            self.off |= 1 << i
+            total += self.costs[i]
+        if total:
+            persist.save(self.key, struct.pack(ENTRY, self.off, *self.costs))
+        return total
+
+    def payback(self, awake, currents):
+        """
+        Returns the time (s) after which the idle current saved pays the one-time cost of the deinits
+        back, awake being the fraction of the time the node is awake (the LTE modem draws in deepsleep too)
+        and currents the idle current (mA) of every radio and of the awake CPU ('cpu')
+        """
+        saved = 0.0
+        for name in self.radios:
+            saved += currents[name] * (1.0 if name == 'LTE' else awake)
+        cost = sum(self.costs) / 1e6 * currents['cpu']
+        return cost / saved if saved else None
+
+    def report(self):
+        """ Returns the deinit time (ms) of every radio switched off """
+        return ', '.join('%s %i ms' % (RADIOS[i], self.costs[i] // 1000) for i in range(len(RADIOS)) if self.off & (1 << i))
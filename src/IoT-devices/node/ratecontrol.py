@@ -0,0 +1,88 @@
+""" Node-side datarate controller driven by the link quality (SNR) of the received downlinks """
+
+import struct
+from array import array
+import persist
+
+# SX1276 demodulation floor (dB SNR) of the EU868 datarates (DR0: SF12 .. DR5: SF7)
+SNR_FLOOR   = (-20.0, -17.5, -15.0, -12.5, -10.0, -7.5)
+HEADER      = '>BBBB'                   # datarate, consecutive failed uplinks, samples, next sample
+
+
+class RateControl:
+    """
+    Keeps the SNR (and RSSI) of the last window downlinks and picks the fastest datarate whose
+    demodulation floor stays margin dB below the mean SNR. Stepping up to a faster datarate needs
+    hysteresis dB more, so the datarate does not flap around a threshold. After fail_limit
+    consecutive failed uplinks the datarate steps down and the window is cleared.
+    """
+
+    def __init__(self, dr=5, dr_min=0, dr_max=5, window=8, margin=5.0, hysteresis=3.0, fail_limit=2, key='rate'):
+        self.key        = key                           # persistent storage key
+        self.dr         = dr
+        self.dr_min     = dr_min
+        self.dr_max     = dr_max
+        self.margin     = margin                        # SNR above the demodulation floor (dB)
+        self.hysteresis = hysteresis                    # extra margin needed to step up (dB)
+        self.fail_limit = fail_limit
+        self.snr        = array('f', [0.0] * window)
+        self.rssi       = array('f', [0.0] * window)
+        self.reset_window()
+        self.fails      = 0
+        self.last_rx    = None                          # rx_timestamp of the last recorded downlink
+
+    def reset_window(self):
+        self.count = 0
+        self.next = 0
+
+    def record(self, stats):
+        """ Records the link quality of the last downlink from lora.stats(), once per downlink """
+        if stats.rx_timestamp == self.last_rx:
+            return
+        self.last_rx = stats.rx_timestamp
+        self.snr[self.next] = stats.snr
+        self.rssi[self.next] = stats.rssi
+        self.next = (self.next + 1) % len(self.snr)
+        if self.count < len(self.snr):
+            self.count += 1
+        self.fails = 0
+
+    def failed(self):
+        """ Counts a failed uplink (TX_FAILED_EVENT), stepping the datarate down after fail_limit in a row """
+        self.fails += 1
+        if self.fails >= self.fail_limit and self.dr > self.dr_min:
+            self.dr -= 1
+            self.fails = 0
+            self.reset_window()                         # the link quality measured at the faster datarate is stale
+
+    def mean_snr(self):
+        return sum(self.snr[i] for i in range(self.count)) / self.count if self.count else None
+
+    def datarate(self):
+        """ Returns the datarate of the next uplink """
+        snr = self.mean_snr()
+        if snr is None:
+            return self.dr
+        dr = self.dr_min
+        for candidate in range(self.dr_max, self.dr_min - 1, -1):
+            required = SNR_FLOOR[candidate] + self.margin + (self.hysteresis if candidate > self.dr else 0)
+            if snr >= required:
+                dr = candidate
+                break
+        if dr != self.dr:
+            self.dr = dr
+            self.reset_window()                         # a new datarate starts a new measurement window
+        return dr
+
+    def save(self):
+        persist.save(self.key, struct.pack(HEADER, self.dr, self.fails, self.count, self.next)
+            + bytes(self.snr) + bytes(self.rssi))
+
+    def restore(self):
+        data = persist.load(self.key)
+        n = struct.calcsize(HEADER)
+        if data is None or len(data) != n + 8 * len(self.snr):
+            return
+        self.dr, self.fails, self.count, self.next = struct.unpack_from(HEADER, data)
+        self.snr = array('f', data[n:n + 4 * len(self.snr)])
+        self.rssi = array('f', data[n + 4 * len(self.rssi):])
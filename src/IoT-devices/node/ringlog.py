@@ -0,0 +1,105 @@
+""" In-RAM ring-buffer logger: O(1) logging from callbacks, formatting deferred to flush() or dump() """
+
+from array import array
+from _thread import allocate_lock
+
+try:
+    from utime import ticks_ms
+except ImportError:                     # CPython (host tools)
+    from time import perf_counter
+
+    def ticks_ms():
+        return int(perf_counter() * 1000) & 0x3fffffff
+
+DEBUG       = 0
+INFO        = 1
+WARNING     = 2
+ERROR       = 3
+LEVELS      = ('D', 'I', 'W', 'E')
+
+
+class RingLog:
+    """
+    Keeps the last size records (level, tick, template, args) in preallocated slots. log() only
+    stores references, the template is formatted with its args ('%' or '{}' style) when the records
+    are flushed to the console from the main loop, or dumped in bulk to a flash file. When the ring
+    is full the oldest records are overwritten and counted as dropped. The callbacks, alarms and
+    threads logging and flushing concurrently update the ring under a lock, held for the slot update
+    only: the formatting and the writes happen outside of it.
+    """
+
+    def __init__(self, size=64, style='%', level=DEBUG, write=print):
+        self.size       = size
+        self.style      = style                         # '%': template % args, '{}': template.format(*args)
+        self.level      = level                         # records below this level are ignored
+        self.write      = write                         # output of flush()
+        self.levels     = array('B', [0] * size)
+        self.ticks      = array('L', [0] * size)
+        self.templates  = [None] * size
+        self.args       = [None] * size
+        self.head       = 0                             # next record to flush
+        self.count      = 0                             # records waiting
+        self.dropped    = 0                             # records overwritten before they were flushed
+        self.lock       = allocate_lock()               # guards head, count, dropped and the slots
+
+    def log(self, level, template, args=None):
+        """ Stores a record, safe to call from callbacks and alarms """
+        if level < self.level:
+            return
+        tick = ticks_ms()
+        with self.lock:
+            i = (self.head + self.count) % self.size
+            if self.count == self.size:
+                self.head = (self.head + 1) % self.size
+                self.dropped += 1
+            else:
+                self.count += 1
+            self.levels[i] = level
+            self.ticks[i] = tick
+            self.templates[i] = template
+            self.args[i] = args
+
+    def format(self, level, tick, template, args):
+        """ Formats a record """
+        if args is None:
+            message = str(template)
+        elif self.style == '%':
+            message = template % args
+        else:
+            message = template.format(*args)
+        return '[%10.3f] %s %s' % (tick / 1000, LEVELS[level], message)
+
+    def pop(self):
+        """ Removes the oldest record from the ring, returns (level, tick, template, args), None when empty """
+        with self.lock:
+            if not self.count:
+                return None
+            i = self.head
+            record = (self.levels[i], self.ticks[i], self.templates[i], self.args[i])
+            self.templates[i] = self.args[i] = None     # releasing the references
+            self.head = (self.head + 1) % self.size
+            self.count -= 1
+            return record
+
+    def records(self):
+        """ Yields the formatted records in order, removing them from the ring """
+        with self.lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            yield '[%10s] W %i log records dropped' % ('', dropped)
+        while True:
+            record = self.pop()
+            if record is None:
+                return
+            yield self.format(*record)
+
+    def flush(self):
+        """ Writes the waiting records to the console (main loop, REPL) """
+        for line in self.records():
+            self.write(line)
+
+    def dump(self, path):
+        """ Appends the waiting records to a file in flash, in one write """
+        if self.count or self.dropped:
+            with open(path, 'a') as f:
+                f.write('\n'.join(self.records()) + '\n')
@@ -0,0 +1,87 @@
+""" Timer-driven double-buffered ADC sampler, keeps sampling while the main loop processes and transmits """
+
+from array import array
+
+try:
+    from machine import Timer
+    from utime import ticks_us, ticks_diff
+except ImportError:                     # CPython (host tools), driven by calling tick()
+    Timer = None
+    from soundlevel import ticks_us, ticks_diff
+
+
+class Sampler:
+    """
+    A Timer.Alarm reads one sample per period into the active buffer. When it is full the buffers are
+    swapped and the full one is handed to the main loop (poll/release). If the main loop did not release
+    the previous buffer in time the active buffer is overwritten and an overrun is counted.
+    The alarm handler only does integer work on preallocated buffers.
+    """
+
+    def __init__(self, read, sample_rate=8000, buffer_size=512):
+        self.read           = read                          # read() callable of the ADC channel
+        self.sample_rate    = sample_rate
+        self.period         = 1000000 // sample_rate        # alarm period (us)
+        self.buffers        = (array('H', [0] * buffer_size), array('H', [0] * buffer_size))
+        self.alarm          = None
+        self._active        = 0                             # buffer written by the alarm
+        self._index         = 0                             # next sample of the active buffer
+        self._full          = -1                            # buffer waiting for the main loop, -1 if none
+        self._last          = ticks_us()                    # tick of the previous sample
+        self.reset_stats()
+
+    def reset_stats(self):
+        """ Clears the instrumentation counters """
+        self.samples        = 0                             # samples read
+        self.overruns       = 0                             # buffers lost because the main loop was too slow
+        self.jitter_max     = 0                             # largest deviation of the sampling period (us)
+        self.jitter_sum     = 0                             # sum of the absolute deviations (us)
+
+    def start(self):
+        """ Starts the periodic sampling alarm """
+        self._last = ticks_us()
+        self.alarm = Timer.Alarm(handler=self.tick, us=self.period, periodic=True)
+
+    def stop(self):
+        """ Cancels the sampling alarm """
+        if self.alarm is not None:
+            self.alarm.cancel()
+            self.alarm = None
+
+    def tick(self, alarm=None):
+        """ Alarm handler: reads one sample and swaps the buffers when the active one is full """
+        now = ticks_us()
+        jitter = ticks_diff(now, self._last) - self.period
+        self._last = now
+        if jitter < 0:
+            jitter = -jitter
+        if jitter > self.jitter_max:
+            self.jitter_max = jitter
+        self.jitter_sum += jitter
+        buf = self.buffers[self._active]
+        buf[self._index] = self.read()
+        self._index += 1
+        self.samples += 1
+        if self._index == len(buf):
+            self._index = 0
+            if self._full == -1:
+                self._full = self._active
+                self._active ^= 1
+            else:
+                self.overruns += 1                          # previous buffer not released, overwriting this one
+
+    def poll(self):
+        """ Returns the full buffer waiting to be processed, None if there is none """
+        if self._full == -1:
+            return None
+        return self.buffers[self._full]
+
+    def release(self):
+        """ Hands the processed buffer back to the alarm """
+        self._full = -1
+
+    def stats(self):
+        """ Returns (samples, overruns, max jitter us, mean jitter us) and clears the counters """
+        result = (self.samples, self.overruns, self.jitter_max, self.jitter_sum // self.samples if self.samples else 0)
+        self.reset_stats()
+        return result
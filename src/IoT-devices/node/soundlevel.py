@@ -0,0 +1,231 @@
+""" Streaming A-weighted sound level meter (LAeq, LAmax, LAmin) running on MicroPython and CPython
+
+Accuracy of the fixed-point A-weighting cascade at the 8 kHz sample rate, against IEC 61672: within
+0.5 dB from 50 Hz to 2.5 kHz and within 1 dB from 40 Hz to 2.7 kHz. Above, the bilinear transform
+compresses the response towards Nyquist (-2.1 dB at 3150 Hz, nothing is measured above 4 kHz); below,
+the Q14 rounding of the poles near DC lets the weighting rise (+1.5 dB at 31.5 Hz, +3.9 dB at 20 Hz).
+A higher sample rate widens the upper end (within 0.5 dB up to 4 kHz at 16 kHz) but worsens the lower one.
+"""
+
+import math
+from array import array
+from calibration import identity_codes
+
+try:
+    from micropython import native
+except ImportError:                     # CPython (host benchmarks), no native code emitter
+    def native(f):
+        return f
+
+try:
+    from utime import ticks_us, ticks_diff
+except ImportError:                     # CPython (host benchmarks)
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1000000)
+
+    def ticks_diff(new, old):
+        return new - old
+
+
+A_POLES_HZ   = (20.598997, 107.65265, 737.86223, 12194.217)  # IEC 61672 A-weighting pole frequencies
+COEF_SHIFT   = 14                       # filter coefficients in Q14 fixed-point
+INPUT_SHIFT  = 2                        # extra fractional bits of the filtered samples
+ENERGY_SPILL = 1 << 29                  # block energy is moved to a float before it leaves the small-int range
+BLOCK_MS     = 125                      # block length of the level detector (Fast time-weighting)
+
+
+def _bilinear_pole(freq, sample_rate):
+    """ Maps an analog real pole (Hz) to the z-plane with the bilinear transform """
+    k = 2 * math.pi * freq / (2.0 * sample_rate)
+    return (1 - k) / (1 + k)
+
+
+def biquad_gain(b, a1, a2, w):
+    """ Magnitude response of a biquad at normalised angular frequency w """
+    c1, s1, c2, s2 = math.cos(w), math.sin(w), math.cos(2 * w), math.sin(2 * w)
+    num = math.sqrt((b[0] + b[1] * c1 + b[2] * c2) ** 2 + (b[1] * s1 + b[2] * s2) ** 2)
+    den = math.sqrt((1 + a1 * c1 + a2 * c2) ** 2 + (a1 * s1 + a2 * s2) ** 2)
+    return num / den
+
+
+def a_weighting_sections(sample_rate):
+    """ Returns the A-weighting filter as 3 fixed-point biquads (b0, b1, b2, a1, a2), each with unity gain at 1 kHz """
+    p1, p2, p3, p4 = [_bilinear_pole(f, sample_rate) for f in A_POLES_HZ]
+    sections = (
+        ((1.0, -2.0, 1.0), p1, p1),     # double zero at DC, double pole at 20.6 Hz
+        ((1.0, -2.0, 1.0), p2, p3),     # double zero at DC, poles at 107.7 Hz and 737.9 Hz
+        ((1.0, 2.0, 1.0), p4, p4),      # double zero at Nyquist, double pole at 12.2 kHz
+    )
+    w = 2 * math.pi * 1000 / sample_rate
+    coeffs = []
+    for b, pa, pb in sections:
+        a1, a2 = -(pa + pb), pa * pb
+        g = 1 / biquad_gain(b, a1, a2, w)
+        coeffs += [int(round(c * (1 << COEF_SHIFT))) for c in (b[0] * g, b[1] * g, b[2] * g, a1, a2)]
+    return coeffs
+
+
+def sample_into(buf, read, sample_rate, start=0, stop=None):
+    """ Fills buf[start:stop] with values of the read() callable (ADC channel), paced at sample_rate """
+    if stop is None:
+        stop = len(buf)
+    period = 1000000 // sample_rate
+    t0 = ticks_us()
+    for i in range(start, stop):
+        while ticks_diff(ticks_us(), t0) < (i - start) * period:
+            pass
+        buf[i] = read()
+
+
+class SoundLevelMeter:
+    """
+    A-weighted sound level meter. Raw ADC codes are written in a preallocated ring buffer,
+    linearised by the calibration code table, filtered with a fixed-point A-weighting cascade and integrated per 125 ms block into
+    the LAeq, LAmax and LAmin of the reporting interval. Nothing is allocated per sample.
+    """
+
+    def __init__(self, sample_rate=8000, ring_size=1024, bias=2048, cal_offset=0.0, calibration=None):
+        self.sample_rate    = sample_rate
+        self.bias           = bias                              # ADC code of the microphone's dc-bias
+        self.cal_offset     = cal_offset                        # dB SPL of a 1 ADC-count rms signal (without calibration tables)
+        self.calibration    = calibration                       # calibration tables of the front end
+        self._codes         = calibration.codes if calibration else identity_codes(bias)
+        self.block_len      = sample_rate * BLOCK_MS // 1000    # samples per level block
+        self.listener       = None                              # optional callback receiving every block level (dB)
+        self._coeffs        = array('l', a_weighting_sections(sample_rate))
+        self._state         = array('l', [0] * 15)              # x1, x2, y1, y2, err for each of the 3 sections
+        self._ring          = array('H', [0] * ring_size)       # raw ADC codes
+        self._head          = 0                                 # next write position
+        self._tail          = 0                                 # next position to process
+        self._block_energy  = 0                                 # energy of the running block (small int part)
+        self._block_spill   = 0.0                               # energy of the running block (spilled part)
+        self._block_fill    = 0                                 # samples in the running block
+        self.reset()
+        self._settle        = 2                                 # blocks discarded while the filter settles
+
+    def reset(self):
+        """ Starts a new reporting interval """
+        self.energy     = 0.0           # sum of the linear block energies
+        self.blocks     = 0             # number of blocks integrated
+        self.lmax       = None
+        self.lmin       = None
+
+    def acquire(self, read, count):
+        """ Reads count samples at sample_rate from the read() callable (ADC channel), processing the ring whenever it fills """
+        size = len(self._ring)
+        while count > 0:
+            n = min(count, size - 1 - self._pending(), size - self._head)
+            sample_into(self._ring, read, self.sample_rate, self._head, self._head + n)
+            self._head = (self._head + n) % size
+            count -= n
+            self.process()
+
+    def feed(self, samples):
+        """ Writes already sampled ADC codes (e.g. a recorded trace) into the ring and processes them """
+        ring = self._ring
+        size = len(ring)
+        i, total = 0, len(samples)
+        while i < total:
+            n = min(total - i, size - 1 - self._pending())
+            head = self._head
+            for j in range(i, i + n):
+                ring[head] = samples[j]
+                head += 1
+                if head == size:
+                    head = 0
+            self._head = head
+            i += n
+            self.process()
+
+    def process(self):
+        """ Filters and integrates all pending samples of the ring buffer """
+        head, tail = self._head, self._tail
+        if head < tail:
+            self._filter(self._ring, tail, len(self._ring))
+            tail = 0
+        if tail < head:
+            self._filter(self._ring, tail, head)
+        self._tail = head
+
+    def integrate(self, buf, start=0, stop=None):
+        """ Filters and integrates samples of an external buffer (e.g. a full buffer of the timer-driven sampler) """
+        self._filter(buf, start, len(buf) if stop is None else stop)
+
+    def levels(self):
+        """ Returns (LAeq, LAmax, LAmin) in dB over the current interval, None when no block was completed """
+        if self.blocks == 0:
+            return None, None, None
+        return self._to_db(self.energy / self.blocks), self.lmax, self.lmin
+
+    def _pending(self):
+        return (self._head - self._tail) % len(self._ring)
+
+    def _to_db(self, energy):
+        level = 10 * math.log10(energy) if energy > 0 else -100
+        if self.calibration is not None:
+            return self.calibration.to_db(level)
+        return level + self.cal_offset
+
+    def _end_block(self, energy):
+        """ Closes a level block, called once per BLOCK_MS """
+        energy = (self._block_spill + energy) / (self.block_len << (2 * INPUT_SHIFT))
+        self._block_spill = 0.0
+        if self._settle > 0:
+            self._settle -= 1
+            return
+        level = self._to_db(energy)
+        self.energy += energy
+        self.blocks += 1
+        if self.lmax is None or level > self.lmax:
+            self.lmax = level
+        if self.lmin is None or level < self.lmin:
+            self.lmin = level
+        if self.listener is not None:
+            self.listener(level)
+
+    @native
+    def _filter(self, buf, start: int, stop: int):
+        c, s = self._coeffs, self._state
+        b10, b11, b12, a11, a12 = c[0], c[1], c[2], c[3], c[4]
+        b20, b21, b22, a21, a22 = c[5], c[6], c[7], c[8], c[9]
+        b30, b31, b32, a31, a32 = c[10], c[11], c[12], c[13], c[14]
+        x11, x12, y11, y12, e1 = s[0], s[1], s[2], s[3], s[4]
+        x21, x22, y21, y22, e2 = s[5], s[6], s[7], s[8], s[9]
+        x31, x32, y31, y32, e3 = s[10], s[11], s[12], s[13], s[14]
+        codes = self._codes
+        block = self.block_len
+        energy = self._block_energy
+        fill = self._block_fill
+        for i in range(start, stop):
+            x = codes[buf[i]] << 2          # linearised sample, INPUT_SHIFT
+            # direct-form I sections with first order error feedback (the truncated fraction is carried to the next sample)
+            acc = b10 * x + b11 * x11 + b12 * x12 - a11 * y11 - a12 * y12 + e1
+            y = acc >> 14
+            e1 = acc - (y << 14)
+            x12, x11, y12, y11 = x11, x, y11, y
+            acc = b20 * y + b21 * x21 + b22 * x22 - a21 * y21 - a22 * y22 + e2
+            x22, x21 = x21, y
+            y = acc >> 14
+            e2 = acc - (y << 14)
+            y22, y21 = y21, y
+            acc = b30 * y + b31 * x31 + b32 * x32 - a31 * y31 - a32 * y32 + e3
+            x32, x31 = x31, y
+            y = acc >> 14
+            e3 = acc - (y << 14)
+            y32, y31 = y31, y
+            energy += y * y
+            if energy >= 0x20000000:        # ENERGY_SPILL
+                self._block_spill += energy
+                energy = 0
+            fill += 1
+            if fill == block:
+                self._end_block(energy)
+                energy = 0
+                fill = 0
+        s[0], s[1], s[2], s[3], s[4] = x11, x12, y11, y12, e1
+        s[5], s[6], s[7], s[8], s[9] = x21, x22, y21, y22, e2
+        s[10], s[11], s[12], s[13], s[14] = x31, x32, y31, y32, e3
+        self._block_energy = energy
+        self._block_fill = fill
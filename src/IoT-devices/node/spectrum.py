@@ -0,0 +1,122 @@
+""" Fixed-point radix-2 FFT and band spectrum of the microphone signal, running on MicroPython and CPython """
+
+import math
+from array import array
+from calibration import identity_codes
+
+try:
+    from micropython import native
+except ImportError:                     # CPython (host benchmarks), no native code emitter
+    def native(f):
+        return f
+
+
+MAX_N       = 1024                      # largest transform, smaller powers of 2 reuse the tables with a stride
+LOG2_MAX_N  = 10
+TWIDDLE_Q   = 14                        # twiddle factors in Q14 fixed-point
+WINDOW_Q    = 15                        # window in Q15 fixed-point
+INPUT_SHIFT = 3                         # windowed 12-bit samples are scaled to 15 bits
+N_BANDS     = 20                        # bands of the spectral payload
+
+# tables computed once at import: cos/sin of the twiddle factors, periodic Hann window and bit-reversed indices
+COS     = array('h', [int(round(math.cos(2 * math.pi * k / MAX_N) * (1 << TWIDDLE_Q))) for k in range(MAX_N // 2)])
+SIN     = array('h', [int(round(math.sin(2 * math.pi * k / MAX_N) * (1 << TWIDDLE_Q))) for k in range(MAX_N // 2)])
+HANN    = array('H', [int(round((0.5 - 0.5 * math.cos(2 * math.pi * k / MAX_N)) * (1 << WINDOW_Q))) for k in range(MAX_N)])
+BITREV  = array('H', [int('{:010b}'.format(k)[::-1], 2) for k in range(MAX_N)])
+
+
+def log2(n):
+    """ Returns log2 of a power of 2 not larger than MAX_N """
+    bits = 0
+    while (1 << bits) < n:
+        bits += 1
+    if (1 << bits) != n or bits > LOG2_MAX_N:
+        raise ValueError('FFT size must be a power of 2 <= %i' % MAX_N)
+    return bits
+
+
+@native
+def fft(re, im, n: int):
+    """ In-place scaled FFT of n points on array('l') buffers, every stage halves the values (output is DFT/n) """
+    shift = LOG2_MAX_N - log2(n)
+    cos, sin = COS, SIN
+    for i in range(n):                  # bit-reversal permutation
+        j = BITREV[i] >> shift
+        if j > i:
+            re[i], re[j] = re[j], re[i]
+            im[i], im[j] = im[j], im[i]
+    size = 2
+    while size <= n:
+        half = size >> 1
+        step = MAX_N // size            # twiddle stride in the MAX_N tables
+        for k in range(half):
+            c = cos[k * step]
+            s = sin[k * step]
+            for j in range(k, n, size):
+                m = j + half
+                tr = (re[m] * c + im[m] * s + 8192) >> 14   # TWIDDLE_Q, (re + j.im) * (cos - j.sin), rounded
+                ti = (im[m] * c - re[m] * s + 8192) >> 14
+                re[m] = (re[j] - tr + 1) >> 1
+                im[m] = (im[j] - ti + 1) >> 1
+                re[j] = (re[j] + tr + 1) >> 1
+                im[j] = (im[j] + ti + 1) >> 1
+        size <<= 1
+
+
+class Spectrum:
+    """
+    Band spectrum of n raw ADC codes: Hann window, fixed-point FFT and log-spaced binning
+    into N_BANDS band levels (dB SPL, unweighted). All buffers are allocated once.
+    """
+
+    def __init__(self, n=256, sample_rate=8000, bias=2048, cal_offset=0.0, calibration=None):
+        log2(n)
+        self.n           = n
+        self.sample_rate = sample_rate
+        self.bias        = bias                              # ADC code of the microphone's dc-bias
+        self.cal_offset  = cal_offset                        # dB SPL of a 1 ADC-count rms signal (without calibration tables)
+        self.calibration = calibration                       # calibration tables of the front end
+        self._codes      = calibration.codes if calibration else identity_codes(bias)
+        self.re          = array('l', [0] * n)
+        self.im          = array('l', [0] * n)
+        self.power       = array('f', [0] * N_BANDS)         # mean-square counts per band
+        self.levels      = bytearray(N_BANDS)                # band levels in whole dB (0-127)
+        self.edges       = self.band_edges(n)
+        # one-sided spectrum, window power and input scaling correction (Parseval)
+        self._scale      = 2 / (0.375 * (1 << (2 * INPUT_SHIFT)))
+
+    @staticmethod
+    def band_edges(n):
+        """ Returns the first FFT bin of every band (and the end bin), log-spaced between bin 1 and n/2 """
+        edges = array('H', [0] * (N_BANDS + 1))
+        edges[0] = 1
+        for b in range(1, N_BANDS + 1):
+            edges[b] = max(edges[b - 1] + 1, int(round((n // 2) ** (b / N_BANDS))))
+        return edges
+
+    def band_frequencies(self):
+        """ Returns the lower edge frequency (Hz) of every band """
+        return [self.edges[b] * self.sample_rate / self.n for b in range(N_BANDS)]
+
+    def analyse(self, samples):
+        """ Computes the band levels of the first n samples (raw ADC codes), returns the levels bytearray """
+        re, im, n = self.re, self.im, self.n
+        step = MAX_N // n
+        codes = self._codes
+        for i in range(n):
+            re[i] = (codes[samples[i]] * HANN[i * step]) >> (WINDOW_Q - INPUT_SHIFT)
+            im[i] = 0
+        fft(re, im, n)
+        edges, power, levels = self.edges, self.power, self.levels
+        for b in range(N_BANDS):
+            acc = 0
+            for k in range(edges[b], min(edges[b + 1], n // 2)):
+                acc += re[k] * re[k] + im[k] * im[k]
+            power[b] = acc * self._scale
+            if power[b] > 0:
+                level = 10 * math.log10(power[b])
+                level = self.calibration.to_db(level) if self.calibration else level + self.cal_offset
+                levels[b] = max(0, min(127, int(level + 0.5)))
+            else:
+                levels[b] = 0
+        return levels
@@ -0,0 +1,161 @@
+""" Per-uplink delivery tracking: frame counter, acks, round-trip time and node-level retries of confirmed uplinks """
+
+import struct
+import persist
+
+try:
+    from utime import ticks_ms, ticks_diff
+except ImportError:                     # CPython (host tools)
+    from time import perf_counter
+
+    def ticks_ms():
+        return int(perf_counter() * 1000) & 0x3fffffff
+
+    def ticks_diff(end, start):
+        return end - start
+
+# priorities: the uplinks at or above the confirm priority are confirmed and retried
+ROUTINE     = 0                         # sound levels, profiles, config dumps
+ALERT       = 1                         # noise events
+
+# states of the last uplink
+IDLE        = 0                         # nothing sent yet
+PENDING     = 1                         # sent, waiting for the end of the TX/RX windows
+SENT        = 2                         # unconfirmed uplink sent
+ACKED       = 3                         # confirmed uplink acked by the network server
+FAILED      = 4                         # confirmed uplink without ack
+STATES      = ('idle', 'pending', 'sent', 'acked', 'failed')
+
+STALE_FAILS = 2                         # consecutive confirmed uplinks without ack after which the session is joined anew
+HEADER      = '>BBBBBiHHHHHH'           # state, retry port, retry priority, attempts, fails, frame counter, rtt, counters (5)
+
+
+class UplinkTracker:
+    """
+    Follows every uplink from send() to the end of its TX/RX windows. A confirmed uplink is acked
+    only when a downlink was received after it was sent (rx_timestamp of lora.stats() changed),
+    the time from send() to the end of the windows is its round-trip time. Only the uplinks of
+    confirm_priority and above (alerts) are confirmed, unless every uplink must be (confirmed_tx),
+    so the network server sends an ack for the few uplinks that matter. A confirmed uplink without
+    ack is kept in NVS and retried up to retries times, e.g. at the next wake-up.
+    """
+
+    def __init__(self, confirm_priority=ALERT, retries=2, key='uplinks'):
+        self.key                = key                   # persistent storage key
+        self.confirm_priority   = confirm_priority
+        self.retries            = retries               # node-level retries of an uplink without ack
+        self.state              = IDLE
+        self.confirmed          = False                 # the pending uplink is confirmed
+        self.attempts           = 0                     # transmissions of the payload to retry
+        self.payload            = None                  # payload of the last confirmed uplink, until it is acked or given up
+        self.port               = 0                     # FPort of payload
+        self.priority           = ROUTINE               # priority of payload
+        self.retry              = False                 # the pending uplink is a retry, new data follows
+        self.fails              = 0                     # consecutive confirmed uplinks without ack
+        self.fcnt               = -1                    # LoRaWAN frame counter of the last uplink (-1: unknown)
+        self.rtt                = 0                     # round-trip time of the last ack (ms)
+        self.sent_count         = 0
+        self.confirmed_count    = 0
+        self.acked              = 0
+        self.failed             = 0
+        self.retried            = 0
+        self.start              = 0                     # ticks_ms of send()
+        self.rx_mark            = None                  # rx_timestamp before send()
+        self.before             = IDLE                  # state before sent(), restored by unsent()
+
+    def confirm(self, priority, always=False):
+        """ True when an uplink of priority is sent confirmed """
+        return always or priority >= self.confirm_priority
+
+    def sent(self, payload, port, priority, confirmed, stats, retry=False):
+        """ Notes an uplink handed to the stack, stats being lora.stats() before the transmission """
+        self.before = self.state
+        self.state = PENDING
+        self.confirmed = confirmed
+        self.retry = retry
+        if confirmed and not retry:                     # a newer confirmed uplink replaces the one to retry
+            self.payload = bytes(payload)               # the encoding buffer is reused
+            self.port = port
+            self.priority = priority
+            self.attempts = 0
+        if confirmed:
+            self.attempts += 1
+        self.rx_mark = stats.rx_timestamp
+        self.start = ticks_ms()
+        self.sent_count += 1
+        if confirmed:
+            self.confirmed_count += 1
+        if retry:
+            self.retried += 1
+
+    def unsent(self):
+        """ The stack refused the uplink noted by sent() (EAGAIN): back to the state before, not counted """
+        if self.state != PENDING:
+            return
+        self.state = self.before
+        self.sent_count -= 1
+        if self.confirmed:
+            self.attempts -= 1
+            self.confirmed_count -= 1
+        if self.retry:
+            self.retried -= 1
+        self.retry = False
+
+    def tx_done(self, stats):
+        """ TX_PACKET_EVENT: returns the new state (SENT, ACKED or FAILED), None when no uplink was pending """
+        if self.state != PENDING:
+            return None
+        self.fcnt = getattr(stats, 'tx_counter', self.fcnt)
+        if not self.confirmed:
+            self.state = SENT
+        elif stats.rx_timestamp != self.rx_mark:        # a downlink (the ack) was received in the RX windows
+            self.rtt = min(0xffff, ticks_diff(ticks_ms(), self.start))
+            self.state = ACKED
+            self.acked += 1
+            self.fails = 0
+            self.payload = None
+        else:
+            return self.tx_failed()
+        return self.state
+
+    def tx_failed(self):
+        """ TX_FAILED_EVENT (or no ack): returns FAILED, None when no uplink was pending """
+        if self.state != PENDING:
+            return None
+        self.state = FAILED
+        self.failed += 1
+        self.fails += 1
+        if self.attempts > self.retries:
+            self.payload = None                         # given up
+        return self.state
+
+    def stale(self):
+        """ True when the session is considered stale: STALE_FAILS confirmed uplinks in a row were not acked """
+        return self.fails >= STALE_FAILS
+
+    def pending_retry(self):
+        """ Returns (payload, port, priority) of the uplink to retry, None when there is none """
+        if self.payload is None or self.state == PENDING:
+            return None
+        return self.payload, self.port, self.priority
+
+    def summary(self):
+        return '%s fcnt %i, %i/%i confirmed acked, %i retries, %i consecutive fails, rtt %i ms' % (
+            STATES[self.state], self.fcnt, self.acked, self.confirmed_count, self.retried, self.fails, self.rtt)
+
+    def save(self):
+        data = struct.pack(HEADER, self.state, self.port, self.priority, self.attempts, min(self.fails, 0xff),
+            self.fcnt, self.rtt, self.sent_count & 0xffff, self.confirmed_count & 0xffff, self.acked & 0xffff,
+            self.failed & 0xffff, self.retried & 0xffff)
+        persist.save(self.key, data + (self.payload or b''))
+
+    def restore(self):
+        data = persist.load(self.key)
+        n = struct.calcsize(HEADER)
+        if data is None or len(data) < n:
+            return
+        (self.state, self.port, self.priority, self.attempts, self.fails, self.fcnt, self.rtt, self.sent_count,
+            self.confirmed_count, self.acked, self.failed, self.retried) = struct.unpack_from(HEADER, data)
+        self.payload = bytes(data[n:]) if len(data) > n else None
+        if self.state == PENDING:                       # the TX/RX windows did not end before the deepsleep
+            self.state = FAILED if self.payload is not None else SENT
@@ -13,6 +13,7 @@ from micropython import const
 from network import LoRa
 from network import WLAN
 from machine import Timer
+from ringlog import RingLog, INFO
 
 
 PROTOCOL_VERSION = const(2)
@@ -84,6 +85,7 @@ class NoiseGateway:
 
     def __init__(self, debug, id, frequency, datarate, ssid, password, server, port, ntp_server='pool.ntp.org', ntp_period=3600):
         self.debug = debug
+        self.logger = RingLog(size=128, style='{}')    # log records, printed from the UDP thread
 
         self.id = id
         self.server = server
@@ -415,7 +417,7 @@ class NoiseGateway:
                         if t_us < 0:
                             t_us += 0xFFFFFFFF
                         if t_us < 20000000:
-    					    self.uplink_alarm = Timer.Alarm(
+                            self.uplink_alarm = Timer.Alarm(
                                 handler=lambda x: self._send_down_link(
                                     ubinascii.a2b_base64(tx_pk["txpk"]["data"]),
                                     tx_pk["txpk"]["tmst"] - 50, tx_pk["txpk"]["datr"],
@@ -445,20 +447,26 @@ class NoiseGateway:
             except Exception as ex:
                 self._log('UDP recv Exception: {}', ex)
 
-            # wait before trying to receive again
+            # print the log messages of the callbacks, then wait before trying to receive again
+            self.flush_log()
             utime.sleep_ms(UDP_THREAD_CYCLE_MS)
 
         # we are to close the socket
         self.sock.close()
         self.udp_stop = False
         self._log('UDP thread stopped')
+        self.flush_log()
 
     def _log(self, message, *args):
         """
-        Outputs a log message to stdout.
+        Stores a log message in the ring logger, formatted and printed later by flush_log.
         """
         if self.debug==True:
-            print('[{:>10.3f}] {}'.format(
-                utime.ticks_ms() / 1000,
-                str(message).format(*args)
-                ))
+            self.logger.log(INFO, message, args if args else None)
+
+    def flush_log(self):
+        """
+        Prints the waiting log messages (UDP thread, REPL).
+        """
+        if self.debug==True:
+            self.logger.flush()
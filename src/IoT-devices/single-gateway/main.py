@@ -19,4 +19,5 @@ if __name__ == '__main__':
 
     noisegw.start()
     noisegw._log('You may now press ENTER to enter the REPL')
+    noisegw.flush_log()
     input() # REPL inputs
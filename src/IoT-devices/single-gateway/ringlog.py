@@ -0,0 +1 @@
+../node/ringlog.py
\ No newline at end of file
@@ -0,0 +1,176 @@
+""" NoiseNode.lora_callback: a confirmed uplink without ack is counted as one failure, whatever events the stack raises;
+NoiseNode.send_uplink: a send refused by the busy stack is deferred, not a reset; NoiseNode.resume: a stale session is joined anew """
+
+import builtins
+import os
+import random
+import sys
+from collections import namedtuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'node'))
+sys.path.insert(0, os.path.join(HERE, '..', 'host'))
+
+import emulator
+
+# the pycom modules of the emulator, only while NoiseNode is imported (they replace print, open and time)
+_saved = builtins.print, builtins.open, {name: sys.modules.get(name) for name in emulator.MODULES + tuple(emulator.ALIASES)}
+kernel = emulator.Kernel()
+kernel.context = namedtuple('Board', 'rng')(random.Random(1))  # uos.urandom of the channel selector
+emulator.install(kernel)
+try:
+    from NoiseNode import NoiseNode
+    from network import LoRa
+    import machine
+finally:
+    builtins.print, builtins.open = _saved[0], _saved[1]
+    for name, module in _saved[2].items():
+        if name in emulator.ALIASES:
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+from channels import ChannelSelector
+from dutycycle import DutyCycle
+from uplinks import UplinkTracker, ALERT, PENDING, FAILED
+
+CHANNEL = 868100000
+Stats = namedtuple('Stats', ('rx_timestamp', 'tx_counter'))
+
+
+class Radio:
+    """ lora of the node: the events of one callback and the stats of the last uplink """
+
+    def __init__(self):
+        self.pending = 0
+
+    def events(self):
+        events, self.pending = self.pending, 0
+        return events
+
+    def stats(self):
+        return Stats(rx_timestamp=0, tx_counter=1)
+
+
+class Rate:
+    def __init__(self):
+        self.failures = 0
+
+    def failed(self):
+        self.failures += 1
+
+
+def confirmed_node():
+    """ A node whose confirmed alert uplink waits for the end of its RX windows (no ack will come) """
+    node = NoiseNode.__new__(NoiseNode)
+    node.debug          = False
+    node.lora           = Radio()
+    node.lora_socket    = None
+    node.rate           = Rate()
+    node.channels       = ChannelSelector([CHANNEL], key='test_chan')
+    node.uplinks        = UplinkTracker(key='test_upl')
+    node.commands       = None
+    node.profiler       = None
+    node.deepsleep_time = 0
+    node.phases         = []
+    node.channels.sent(CHANNEL)
+    node.uplinks.sent(b'\x01', 3, ALERT, True, node.lora.stats())
+    return node
+
+
+def check_single_failure(node):
+    assert node.rate.failures == 1
+    assert node.uplinks.failed == 1 and node.uplinks.fails == 1
+    assert node.channels.failed[0] == 1 and node.channels.delivered[0] == 0
+
+
+def test_both_events_in_one_callback():
+    node = confirmed_node()
+    node.lora.pending = LoRa.TX_PACKET_EVENT | LoRa.TX_FAILED_EVENT
+    node.lora_callback(node.lora)
+    check_single_failure(node)
+
+
+def test_events_in_two_callbacks():
+    node = confirmed_node()
+    for event in (LoRa.TX_PACKET_EVENT, LoRa.TX_FAILED_EVENT):
+        node.lora.pending = event
+        node.lora_callback(node.lora)
+    check_single_failure(node)
+
+
+def test_failed_event_without_pending_uplink():
+    node = confirmed_node()
+    node.lora.pending = LoRa.TX_FAILED_EVENT
+    node.lora_callback(node.lora)
+    node.lora.pending = LoRa.TX_FAILED_EVENT     # nothing pending anymore
+    node.lora_callback(node.lora)
+    check_single_failure(node)
+
+
+class BusySocket:
+    """ Non-blocking LoRa socket of the stack still running the RX windows of the previous uplink """
+
+    def __init__(self):
+        self.sends = 0
+
+    def bind(self, port):
+        pass
+
+    def setsockopt(self, *args):
+        pass
+
+    def send(self, pkt):
+        self.sends += 1
+        raise OSError(11)
+
+
+def no_reset():
+    raise AssertionError('the node was reset')
+
+
+def busy_node():
+    """ A monitoring node whose previous confirmed uplink is still handled by the stack """
+    node = confirmed_node()
+    node.uplinks.tx_failed()                    # the tracker saw the end of the uplink before the stack is done
+    node.channels.pending = None
+    node.rate               = None
+    node.lora_socket        = BusySocket()
+    node.lora_params        = {"fport": 2, "confirmed_tx": False, "channels": {0: CHANNEL}}
+    node.fport              = 2
+    node.socket_confirmed   = False
+    node.socket_blocking    = False
+    node.channel            = CHANNEL
+    node.datarate           = 5
+    node.dutycycle          = DutyCycle(key='test_duty')
+    node.reset              = no_reset
+    return node
+
+
+def test_eagain_defers_the_uplink():
+    node = busy_node()
+    sent = node.uplinks.sent_count
+    assert node.send_uplink(b'\x01\x02', priority=ALERT) is False
+    assert node.lora_socket.sends == 1
+    assert node.uplinks.state == FAILED and node.uplinks.sent_count == sent
+    assert node.channels.pending is None
+
+
+def test_pending_uplink_defers_without_sending():
+    node = busy_node()
+    node.uplinks.state = PENDING
+    assert node.send_uplink(b'\x01\x02') is False
+    assert node.lora_socket.sends == 0
+
+
+def test_stale_session_is_not_resumed():
+    node = confirmed_node()
+    node.join_backoff = namedtuple('Backoff', 'attempts')(0)
+    node.create_lora = no_reset                 # resume must give up before touching the radio
+    node.uplinks.fails = 2
+    reset_cause, machine.reset_cause = machine.reset_cause, lambda: machine.DEEPSLEEP_RESET
+    try:
+        assert node.resume() is False
+    finally:
+        machine.reset_cause = reset_cause